@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Apply confirmed client_matches in bulk
+Links legacy_clients.company_id and companies.legacy_client_id for every
+confirmed match with two set-based UPDATEs inside one transaction.
+Safe to re-run: rows already linked are left untouched.
+"""
+import argparse
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION
+from refresh_companies_with_legacy import refresh_companies_with_legacy
+
+CONFIRMED_LINKS_SQL = """
+    CREATE TEMP TABLE confirmed_links ON COMMIT DROP AS
+    SELECT DISTINCT company_id, legacy_client_id
+    FROM public.client_matches
+    WHERE status = 'confirmed'
+      AND company_id IS NOT NULL
+      AND legacy_client_id IS NOT NULL
+"""
+
+# A link is ambiguous when either side appears in more than one confirmed
+# match, or when it contradicts a link that already exists in the tables
+CONFLICTS_SQL = """
+    CREATE TEMP TABLE link_conflicts ON COMMIT DROP AS
+    SELECT l.company_id, l.legacy_client_id, reasons.reason
+    FROM confirmed_links AS l
+    CROSS JOIN LATERAL (
+        SELECT 'company matched to several legacy clients' AS reason
+        WHERE (SELECT COUNT(*) FROM confirmed_links AS o WHERE o.company_id = l.company_id) > 1
+        UNION ALL
+        SELECT 'legacy client matched to several companies'
+        WHERE (SELECT COUNT(*) FROM confirmed_links AS o WHERE o.legacy_client_id = l.legacy_client_id) > 1
+        UNION ALL
+        -- Either side of a link may have been set on its own, so check both columns
+        SELECT 'company already linked to another legacy client'
+        WHERE EXISTS (
+            SELECT 1 FROM public.companies AS c
+            WHERE c.id = l.company_id
+              AND c.legacy_client_id IS NOT NULL
+              AND c.legacy_client_id <> l.legacy_client_id
+        ) OR EXISTS (
+            SELECT 1 FROM public.legacy_clients AS lc
+            WHERE lc.company_id = l.company_id
+              AND lc.legacy_client_id <> l.legacy_client_id
+        )
+        UNION ALL
+        SELECT 'legacy client already linked to another company'
+        WHERE EXISTS (
+            SELECT 1 FROM public.legacy_clients AS lc
+            WHERE lc.legacy_client_id = l.legacy_client_id
+              AND lc.company_id IS NOT NULL
+              AND lc.company_id <> l.company_id
+        ) OR EXISTS (
+            SELECT 1 FROM public.companies AS c
+            WHERE c.legacy_client_id = l.legacy_client_id
+              AND c.id <> l.company_id
+        )
+        UNION ALL
+        SELECT 'legacy client does not exist'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM public.legacy_clients AS lc WHERE lc.legacy_client_id = l.legacy_client_id
+        )
+        UNION ALL
+        SELECT 'company does not exist'
+        WHERE NOT EXISTS (SELECT 1 FROM public.companies AS c WHERE c.id = l.company_id)
+    ) AS reasons
+"""
+
+LINK_LEGACY_CLIENTS_SQL = """
+    UPDATE public.legacy_clients AS lc
+    SET company_id = l.company_id,
+        updated_at = NOW()
+    FROM confirmed_links AS l
+    WHERE lc.legacy_client_id = l.legacy_client_id
+      AND lc.company_id IS DISTINCT FROM l.company_id
+      AND NOT EXISTS (
+          SELECT 1 FROM link_conflicts AS x
+          WHERE x.company_id = l.company_id AND x.legacy_client_id = l.legacy_client_id
+      )
+"""
+
+LINK_COMPANIES_SQL = """
+    UPDATE public.companies AS c
+    SET legacy_client_id = l.legacy_client_id,
+        updated_at = NOW()
+    FROM confirmed_links AS l
+    WHERE c.id = l.company_id
+      AND c.legacy_client_id IS DISTINCT FROM l.legacy_client_id
+      AND NOT EXISTS (
+          SELECT 1 FROM link_conflicts AS x
+          WHERE x.company_id = l.company_id AND x.legacy_client_id = l.legacy_client_id
+      )
+"""
+
+
+def apply_confirmed_matches(dry_run=False, sample_size=20):
+    """Link every unambiguous confirmed match in a single transaction"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CONFIRMED_LINKS_SQL)
+        cursor.execute("SELECT COUNT(*) FROM confirmed_links")
+        confirmed_count = cursor.fetchone()[0]
+
+        cursor.execute(CONFLICTS_SQL)
+        cursor.execute("SELECT COUNT(DISTINCT (company_id, legacy_client_id)) FROM link_conflicts")
+        conflict_count = cursor.fetchone()[0]
+
+        cursor.execute("SELECT reason, COUNT(*) FROM link_conflicts GROUP BY reason ORDER BY COUNT(*) DESC")
+        conflicts_by_reason = cursor.fetchall()
+
+        cursor.execute(
+            "SELECT company_id, legacy_client_id, reason FROM link_conflicts "
+            "ORDER BY legacy_client_id, company_id LIMIT %s",
+            (sample_size,)
+        )
+        conflict_samples = cursor.fetchall()
+
+        cursor.execute(LINK_LEGACY_CLIENTS_SQL)
+        legacy_updated = cursor.rowcount
+
+        cursor.execute(LINK_COMPANIES_SQL)
+        companies_updated = cursor.rowcount
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error applying matches, nothing was changed: {e}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"\n=== Confirmed Match Summary{' (dry run)' if dry_run else ''} ===")
+    print(f"📊 Confirmed links: {confirmed_count}")
+    print(f"🔗 legacy_clients.company_id updated: {legacy_updated}")
+    print(f"🏢 companies.legacy_client_id updated: {companies_updated}")
+    print(f"⚠️  Conflicting links skipped: {conflict_count}")
+    for reason, count in conflicts_by_reason:
+        print(f"    {reason}: {count}")
+    if conflict_samples:
+        print("\nSample conflicts:")
+        for company_id, legacy_client_id, reason in conflict_samples:
+            print(f"  company {company_id} <-> legacy client {legacy_client_id}: {reason}")
+
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply all confirmed client_matches in one transaction')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change and roll back')
+    parser.add_argument('--samples', type=int, default=20, help='conflicts to list')
+    args = parser.parse_args()
+
+    if apply_confirmed_matches(args.dry_run, args.samples):
+        print("🎉 Matches applied successfully!" if not args.dry_run else "Dry run finished, no changes kept")
+        if not args.dry_run:
+            refresh_companies_with_legacy()
+    else:
+        print("💥 Applying matches failed!")
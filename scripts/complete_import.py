@@ -2,107 +2,69 @@
 """
 Complete import of all legacy clients using direct SQL execution
 """
-import csv
+import os
 import time
 
-def create_complete_insert_statements():
-    """Create individual INSERT statements for all remaining records"""
-    
-    csv_file = "/Users/danielwolthers/Documents/GitHub/wolthers-travel-app/supabase/clients.csv"
+from legacy_clients_common import (
+    DEFAULT_CSV_FILE, INSERT_COLUMNS_SQL, SUPABASE_DIR, convert_row, read_csv_rows, sql_literal
+)
+from legacy_clients_external_sort import ExternalSort
+
+OUTPUT_FILE = os.path.join(SUPABASE_DIR, 'individual_inserts.sql')
+PREVIEW_STATEMENTS = 5
+
+def insert_statement(row):
+    """Individual INSERT statement for one converted legacy_clients tuple, three values per line"""
+    values = [sql_literal(value) for value in row]
+    lines = ',\n    '.join(', '.join(values[i:i + 3]) for i in range(0, len(values), 3))
+    return f"""INSERT INTO public.legacy_clients (
+    {INSERT_COLUMNS_SQL}
+) VALUES (
+    {lines}
+);"""
+
+def create_complete_insert_statements(csv_file=DEFAULT_CSV_FILE, output_file=OUTPUT_FILE):
+    """Write individual INSERT statements for all remaining records; returns (count, first statements)"""
     
     # Get already imported IDs - check what we have so far
     imported_ids = {1742, 1860, 1567, 1781, 1354, 1717, 1564, 1221, 1246, 1223, 1330, 1198, 1196}
     
-    def clean_value(value):
-        if not value or value.strip() == '':
-            return 'NULL'
-        escaped = value.strip().replace("'", "''")
-        return f"'{escaped}'"
-    
-    def parse_boolean(value):
-        if not value or value.strip() == '':
-            return 'NULL'
-        return 'true' if value.upper() == 'T' else 'false'
-    
-    def parse_integer(value):
-        if not value or value.strip() == '':
-            return 'NULL'
-        try:
-            return str(int(value))
-        except ValueError:
-            return 'NULL'
-    
-    statements = []
+    preview = []
     processed = 0
     
     try:
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                try:
-                    legacy_id = parse_integer(row.get('idCLIENTES'))
-                    if legacy_id == 'NULL':
-                        continue
-                    
-                    # Skip already imported IDs
-                    if int(legacy_id) in imported_ids:
-                        continue
-                    
-                    # Create individual INSERT statement
-                    insert_stmt = f"""INSERT INTO public.legacy_clients (
-    legacy_client_id, descricao, descricao_fantasia, endereco, numero, complemento,
-    bairro, cidade, pais, uf, cep, telefone1, telefone2, telefone3, telefone4,
-    email, email_contratos, pessoa, grupo1, grupo2, referencias, obs,
-    documento1, documento2, documento3, ativo, id_usuario, id_usuario_ultimo,
-    logo, logo_altura, logo_largura, auto_size
-) VALUES (
-    {legacy_id}, {clean_value(row.get('DESCRICAO'))}, {clean_value(row.get('DESCRICAOFANTASIA'))}, 
-    {clean_value(row.get('ENDERECO'))}, {clean_value(row.get('NUMERO'))}, {clean_value(row.get('COMPLEMENTO'))}, 
-    {clean_value(row.get('BAIRRO'))}, {clean_value(row.get('CIDADE'))}, {clean_value(row.get('PAIS'))}, 
-    {clean_value(row.get('UF'))}, {clean_value(row.get('CEP'))}, {clean_value(row.get('TELEFONE1'))}, 
-    {clean_value(row.get('TELEFONE2'))}, {clean_value(row.get('TELEFONE3'))}, {clean_value(row.get('TELEFONE4'))}, 
-    {clean_value(row.get('EMAIL'))}, {clean_value(row.get('EMAILCONTRATOS'))}, {clean_value(row.get('PESSOA'))}, 
-    {clean_value(row.get('GRUPO1'))}, {clean_value(row.get('GRUPO2'))}, {clean_value(row.get('REFERENCIAS'))}, 
-    {clean_value(row.get('OBS'))}, {clean_value(row.get('DOCUMENTO1'))}, {clean_value(row.get('DOCUMENTO2'))}, 
-    {clean_value(row.get('DOCUMENTO3'))}, {parse_boolean(row.get('ATIVO'))}, {parse_integer(row.get('IDUSUARIO'))}, 
-    {parse_integer(row.get('IDUSUARIOULTIMO'))}, {clean_value(row.get('LOGO'))}, {parse_integer(row.get('LOGOALTURA'))}, 
-    {parse_integer(row.get('LOGOLARGURA'))}, {parse_boolean(row.get('AUTOSIZE'))}
-);"""
-                    
-                    statements.append((int(legacy_id), insert_stmt))
-                    processed += 1
-                
-                except Exception as e:
-                    print(f"Error processing row: {e}")
-                    continue
-        
-        # Sort by ID for consistent ordering
-        statements.sort(key=lambda x: x[0])
-        
-        # Save to file for reference
-        output_file = "/Users/danielwolthers/Documents/GitHub/wolthers-travel-app/supabase/individual_inserts.sql"
+        rows = (
+            row for row in (convert_row(raw) for raw in read_csv_rows(csv_file))
+            # Skip rows without id and already imported IDs
+            if row[0] is not None and row[0] not in imported_ids
+        )
         
+        # Sort by ID for consistent ordering; the external sort streams the rows
+        # back in id order without holding the whole export
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write("-- Individual INSERT statements for all remaining legacy clients\n\n")
-            for _, stmt in statements:
-                f.write(stmt + "\n\n")
+            for row in ExternalSort(rows):
+                insert_stmt = insert_statement(row)
+                f.write(insert_stmt + "\n\n")
+                if len(preview) < PREVIEW_STATEMENTS:
+                    preview.append(insert_stmt)
+                processed += 1
         
         print(f"Created {processed} individual INSERT statements")
         print(f"SQL file saved: {output_file}")
         
-        return [stmt for _, stmt in statements]
+        return processed, preview
     
     except Exception as e:
         print(f"Error: {e}")
-        return []
+        return 0, []
 
 def show_sample_records():
     """Show first 10 records to be imported"""
-    statements = create_complete_insert_statements()
+    count, statements = create_complete_insert_statements()
     
     if statements:
-        print(f"\nTotal statements to execute: {len(statements)}")
+        print(f"\nTotal statements to execute: {count}")
         print("\nFirst few records to be imported:")
         
         for i, stmt in enumerate(statements[:5]):
@@ -117,11 +79,11 @@ def show_sample_records():
             
             print(f"{i+1}. ID {client_id}: {client_name}")
         
-        print(f"... and {len(statements) - 5} more records")
+        print(f"... and {count - len(statements)} more records")
     
-    return statements
+    return count
 
 if __name__ == "__main__":
-    statements = show_sample_records()
-    print(f"\nReady to import {len(statements)} records")
+    statement_count = show_sample_records()
+    print(f"\nReady to import {statement_count} records")
     print("Statements saved to individual_inserts.sql")
\ No newline at end of file
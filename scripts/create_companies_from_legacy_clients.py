@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Create companies for unlinked legacy clients in bulk
+Selects legacy_clients without a company (by id list, group, city or all),
+inserts one companies row per client with a single INSERT ... SELECT and
+links legacy_clients.company_id back with a single UPDATE ... FROM, all in
+one transaction. Company ids are generated up front in a temp table, so
+both statements join on it instead of on names.
+
+    descricao            -> name (descricao_fantasia when empty)
+    descricao_fantasia   -> fantasy_name
+    grupo1 / grupo2      -> category ("GRUPO1 / GRUPO2", or GRUPO1 when equal)
+    legacy_client_id     -> legacy_client_id
+"""
+import argparse
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION
+from refresh_companies_with_legacy import refresh_companies_with_legacy
+
+# Clients already linked from either side, or with a confirmed match that
+# apply_client_matches.py will link to an existing company, are never selected
+SELECTED_CLIENTS_SQL = """
+    CREATE TEMP TABLE new_companies ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS company_id,
+           lc.legacy_client_id,
+           COALESCE(NULLIF(btrim(lc.descricao), ''), NULLIF(btrim(lc.descricao_fantasia), '')) AS name,
+           NULLIF(btrim(lc.descricao_fantasia), '') AS fantasy_name,
+           NULLIF(concat_ws(' / ', NULLIF(btrim(lc.grupo1), ''),
+                            NULLIF(NULLIF(btrim(lc.grupo2), ''), btrim(lc.grupo1))), '') AS category
+    FROM public.legacy_clients AS lc
+    WHERE lc.company_id IS NULL
+      AND NOT EXISTS (SELECT 1 FROM public.companies AS c WHERE c.legacy_client_id = lc.legacy_client_id)
+      AND NOT EXISTS (
+          SELECT 1 FROM public.client_matches AS m
+          WHERE m.legacy_client_id = lc.legacy_client_id AND m.status = 'confirmed'
+      )
+      AND {filters}
+    ORDER BY lc.legacy_client_id
+    LIMIT %(limit)s
+"""
+
+INSERT_COMPANIES_SQL = """
+    INSERT INTO public.companies (id, name, fantasy_name, category, legacy_client_id)
+    SELECT company_id, name, fantasy_name, category, legacy_client_id
+    FROM new_companies
+    WHERE name IS NOT NULL
+"""
+
+LINK_LEGACY_CLIENTS_SQL = """
+    UPDATE public.legacy_clients AS lc
+    SET company_id = n.company_id,
+        updated_at = NOW()
+    FROM new_companies AS n
+    WHERE lc.legacy_client_id = n.legacy_client_id
+      AND n.name IS NOT NULL
+      AND lc.company_id IS NULL
+"""
+
+
+def selection_filters(legacy_ids=None, groups=None, cities=None, active_only=False):
+    """WHERE fragments and parameters for the selected legacy clients"""
+    filters, params = [], {}
+    if legacy_ids:
+        filters.append("lc.legacy_client_id = ANY(%(legacy_ids)s)")
+        params['legacy_ids'] = list(legacy_ids)
+    if groups:
+        filters.append("upper(btrim(lc.grupo1)) = ANY(%(groups)s)")
+        params['groups'] = [group.strip().upper() for group in groups]
+    if cities:
+        filters.append("upper(btrim(lc.cidade)) = ANY(%(cities)s)")
+        params['cities'] = [city.strip().upper() for city in cities]
+    if active_only:
+        filters.append("lc.ativo IS TRUE")
+    return ' AND '.join(filters) or 'TRUE', params
+
+
+def create_companies(legacy_ids=None, groups=None, cities=None, active_only=False, limit=None,
+                     dry_run=False, sample_size=10):
+    """Create and link companies for the selected unlinked legacy clients in a single transaction"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return False
+
+    filters, params = selection_filters(legacy_ids, groups, cities, active_only)
+    params['limit'] = limit
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SELECTED_CLIENTS_SQL.format(filters=filters), params)
+        selected_count = cursor.rowcount
+
+        cursor.execute("SELECT COUNT(*) FROM new_companies WHERE name IS NULL")
+        unnamed_count = cursor.fetchone()[0]
+
+        cursor.execute(
+            "SELECT legacy_client_id, name, fantasy_name, category FROM new_companies "
+            "WHERE name IS NOT NULL ORDER BY legacy_client_id LIMIT %s",
+            (sample_size,)
+        )
+        samples = cursor.fetchall()
+
+        cursor.execute(INSERT_COMPANIES_SQL)
+        companies_created = cursor.rowcount
+
+        cursor.execute(LINK_LEGACY_CLIENTS_SQL)
+        legacy_linked = cursor.rowcount
+
+        # A concurrent link between the selection and the UPDATE would leave a
+        # company without its legacy client pointing back; keep nothing then
+        if legacy_linked != companies_created:
+            raise RuntimeError(
+                f"created {companies_created} companies but linked {legacy_linked} legacy clients"
+            )
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error creating companies, nothing was changed: {e}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"\n=== Company Creation Summary{' (dry run)' if dry_run else ''} ===")
+    print(f"📊 Unlinked legacy clients selected: {selected_count}")
+    print(f"🏢 Companies created: {companies_created}")
+    print(f"🔗 legacy_clients.company_id linked: {legacy_linked}")
+    print(f"⚠️  Skipped without descricao or descricao_fantasia: {unnamed_count}")
+    if samples:
+        print("\nSample companies:")
+        for legacy_client_id, name, fantasy_name, category in samples:
+            print(f"  {legacy_client_id}: {name}"
+                  f"{f' ({fantasy_name})' if fantasy_name else ''}{f' [{category}]' if category else ''}")
+
+    return True
+
+
+def read_ids_file(path):
+    """One legacy_client_id per line (blank lines and # comments ignored)"""
+    with open(path, encoding='utf-8') as ids_file:
+        return [int(line.split('#')[0]) for line in ids_file if line.split('#')[0].strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create companies for unlinked legacy clients in one transaction')
+    parser.add_argument('--ids', help='comma separated legacy_client_ids')
+    parser.add_argument('--ids-file', help='file with one legacy_client_id per line')
+    parser.add_argument('--group', action='append', help='only clients with this GRUPO1 (repeatable)')
+    parser.add_argument('--city', action='append', help='only clients in this city (repeatable)')
+    parser.add_argument('--active-only', action='store_true', help='only clients with ATIVO set')
+    parser.add_argument('--all', action='store_true', help='select every unlinked legacy client')
+    parser.add_argument('--limit', type=int, help='create at most this many companies')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be created and roll back')
+    parser.add_argument('--samples', type=int, default=10, help='companies to list')
+    args = parser.parse_args()
+
+    selected_ids = [int(value) for value in args.ids.split(',') if value.strip()] if args.ids else []
+    if args.ids_file:
+        selected_ids += read_ids_file(args.ids_file)
+    if not (selected_ids or args.group or args.city or args.active_only or args.all):
+        parser.error('select clients with --ids, --ids-file, --group, --city, --active-only or --all')
+
+    if create_companies(selected_ids, args.group, args.city, args.active_only, args.limit,
+                        args.dry_run, args.samples):
+        print("🎉 Companies created successfully!" if not args.dry_run else "Dry run finished, no changes kept")
+        if not args.dry_run:
+            refresh_companies_with_legacy()
+    else:
+        print("💥 Creating companies failed!")
@@ -2,18 +2,37 @@
 """
 Direct PostgreSQL import using psycopg2
 """
+import argparse
 import csv
+import os
+import sys
+import time
 import psycopg2
 import psycopg2.extras
 
-# Database connection details from Supabase startup
-DB_CONNECTION = {
-    'host': '127.0.0.1',
-    'port': '54322',
-    'database': 'postgres',
-    'user': 'postgres',
-    'password': 'postgres'
-}
+from legacy_clients_common import (
+    COLUMN_NAMES,
+    DB_CONNECTION,
+    DEFAULT_CSV_FILE,
+    column_definitions_sql,
+    convert_row,
+    copy_rows,
+    read_csv_rows
+)
+from legacy_clients_batch import RowBatch
+from legacy_clients_external_sort import ExternalSort, dedupe_sorted
+from legacy_clients_parallel_reader import read_rows_parallel
+from validate_legacy_clients import print_report, validate_csv
+from import_profiling import enable_profiling, profile_stage, profiling_modes
+from import_run_history import ImportRun, record_run
+from legacy_client_changes import set_change_source
+from legacy_clients_indexes import (
+    analyze_table,
+    drop_indexes,
+    find_secondary_indexes,
+    rebuild_indexes,
+    write_recovery_file
+)
 
 def clean_value(value):
     if not value or value.strip() == '':
@@ -33,15 +52,15 @@ def parse_integer(value):
     except ValueError:
         return None
 
-def import_via_postgres():
+def import_via_postgres(csv_file=DEFAULT_CSV_FILE, run=None):
     """Import directly via PostgreSQL connection"""
     
-    csv_file = "/Users/danielwolthers/Documents/GitHub/wolthers-travel-app/supabase/clients.csv"
-    
+    run = run or ImportRun('direct_psql:insert')
     try:
         # Connect to database
         conn = psycopg2.connect(**DB_CONNECTION)
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        set_change_source(cursor, run.backend)
         
         print("Connected to PostgreSQL successfully")
         
@@ -50,17 +69,20 @@ def import_via_postgres():
         start_count = cursor.fetchone()['count']
         print(f"Starting with {start_count} records in database")
         
-        # Prepare batch insert
-        records_to_insert = []
+        # Prepare batch insert (columnar, sliced back into tuples per batch)
+        records_to_insert = RowBatch()
         processed_count = 0
+        parse_started = time.perf_counter()
         
         with open(csv_file, 'r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
             
             for row in reader:
                 try:
+                    run.count(read=1)
                     legacy_id = parse_integer(row.get('idCLIENTES'))
                     if not legacy_id:
+                        run.count(skipped=1)
                         continue
                     
                     record = (
@@ -106,8 +128,10 @@ def import_via_postgres():
                 
                 except Exception as e:
                     print(f"Error processing record {row.get('idCLIENTES', 'unknown')}: {e}")
+                    run.count(rejected=1)
                     continue
         
+        run.add_stage('parse_convert', time.perf_counter() - parse_started)
         print(f"Total records prepared for import: {len(records_to_insert)}")
         
         # Perform batch insert
@@ -126,18 +150,23 @@ def import_via_postgres():
         batch_size = 100
         successful_batches = 0
         failed_batches = 0
+        insert_started = time.perf_counter()
         
         for i in range(0, len(records_to_insert), batch_size):
             batch = records_to_insert[i:i+batch_size]
             try:
-                psycopg2.extras.execute_values(cursor, insert_sql, batch)
+                psycopg2.extras.execute_values(cursor, insert_sql, batch, page_size=batch_size)
                 conn.commit()
                 successful_batches += 1
+                # ids already in the table are not inserted (ON CONFLICT DO NOTHING)
+                run.count(imported=cursor.rowcount, existing=len(batch) - cursor.rowcount)
                 print(f"✅ Imported batch {successful_batches} ({len(batch)} records)")
             except Exception as e:
                 print(f"❌ Error importing batch starting at {i}: {e}")
                 conn.rollback()
                 failed_batches += 1
+                run.count(rejected=len(batch))
+        run.add_stage('insert', time.perf_counter() - insert_started)
         
         # Final count
         cursor.execute("SELECT COUNT(*) as count FROM legacy_clients")
@@ -159,9 +188,220 @@ def import_via_postgres():
         print(f"Database connection error: {e}")
         return False
 
+def load_staging_rows(csv_file, parse_workers=1, sort_rows=False):
+    """Converted CSV rows for staging, the last occurrence of each legacy id, and their dropped counts
+
+    Returns (rows, {'duplicates': n, 'skipped': n}). In file order the rows are
+    a RowBatch. Sorted, they are a lazy stream from the external sort through
+    an adjacent-id dedupe, so the whole file is never held; the counts are
+    complete once the stream has been consumed.
+    """
+    if parse_workers > 1:
+        # file order is kept, so "last occurrence wins" still holds
+        records = read_rows_parallel(csv_file, parse_workers)
+    else:
+        records = (convert_row(row) for row in read_csv_rows(csv_file))
+    if sort_rows:
+        # stable external sort: staging (and the INSERT that reads it) follow the unique index order
+        dropped = {}
+        return dedupe_sorted(ExternalSort(records), dropped), dropped
+    
+    batch = RowBatch(records)
+    duplicate_count, skipped_count = batch.keep_last_per_id()
+    return batch, {'duplicates': duplicate_count, 'skipped': skipped_count}
+
+
+def merge_via_postgres(csv_file=DEFAULT_CSV_FILE, skip_columns=(), parse_workers=1, sort_rows=False, run=None):
+    """Merge CSV into legacy_clients via a staging table, rewriting only rows that changed"""
+    
+    run = run or ImportRun('direct_psql:merge')
+    merge_columns = [c for c in COLUMN_NAMES[1:] if c not in skip_columns]
+    set_clause = ',\n                '.join(f"{c} = s.{c}" for c in merge_columns)
+    current_row = ', '.join(f"lc.{c}" for c in merge_columns)
+    staged_row = ', '.join(f"s.{c}" for c in merge_columns)
+    
+    try:
+        with run.stage('parse_convert'), profile_stage('parse_convert', trace_memory=True):
+            records, dropped = load_staging_rows(csv_file, parse_workers, sort_rows)
+        
+        conn = psycopg2.connect(**DB_CONNECTION)
+        cursor = conn.cursor()
+        
+        with run.stage('merge_sql'), profile_stage('merge_sql'):
+            try:
+                set_change_source(cursor, run.backend)
+                cursor.execute(f"""
+                    CREATE TEMP TABLE legacy_clients_staging (
+                        {column_definitions_sql()}
+                    ) ON COMMIT DROP
+                """)
+                staged_count = copy_rows(cursor, 'legacy_clients_staging', records)
+                duplicate_count, skipped_count = dropped['duplicates'], dropped['skipped']
+                print(f"Staged {staged_count} records for merge")
+                cursor.execute("ANALYZE legacy_clients_staging")
+            
+                # Only rows whose content differs get a new tuple and a new updated_at
+                cursor.execute(f"""
+                    UPDATE public.legacy_clients AS lc
+                    SET {set_clause},
+                        updated_at = NOW()
+                    FROM legacy_clients_staging AS s
+                    WHERE lc.legacy_client_id = s.legacy_client_id
+                      AND ({current_row}) IS DISTINCT FROM ({staged_row})
+                """)
+                updated_count = cursor.rowcount
+            
+                cursor.execute(f"""
+                    INSERT INTO public.legacy_clients ({', '.join(COLUMN_NAMES)})
+                    SELECT {', '.join(COLUMN_NAMES)}
+                    FROM legacy_clients_staging AS s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM public.legacy_clients AS lc
+                        WHERE lc.legacy_client_id = s.legacy_client_id
+                    )
+                    ON CONFLICT (legacy_client_id) DO NOTHING
+                """)
+                inserted_count = cursor.rowcount
+            
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                conn.close()
+        
+        run.count(read=staged_count + duplicate_count + skipped_count, imported=inserted_count,
+                  updated=updated_count, skipped=skipped_count, duplicates=duplicate_count,
+                  unchanged=staged_count - inserted_count - updated_count)
+        
+        print(f"\n=== Merge Summary ===")
+        print(f"📊 Records staged: {staged_count}")
+        print(f"🆕 Inserted: {inserted_count}")
+        print(f"✏️  Updated: {updated_count}")
+        print(f"⏭️  Unchanged: {staged_count - inserted_count - updated_count}")
+        print(f"🔁 Duplicate ids in CSV (last kept): {duplicate_count}")
+        print(f"🚫 Skipped (missing id): {skipped_count}")
+        
+        return True
+    
+    except Exception as e:
+        print(f"Merge error: {e}")
+        return False
+
+def full_load_via_postgres(csv_file=DEFAULT_CSV_FILE, skip_columns=(), concurrently=True,
+                           drop_redundant=False, workers=4, parse_workers=1, sort_rows=False, run=None):
+    """Full load with secondary indexes dropped during the merge and rebuilt afterwards"""
+    
+    run = run or ImportRun('direct_psql:full')
+    drop_started = time.perf_counter()
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+        cursor = conn.cursor()
+        secondary, redundant = find_secondary_indexes(cursor)
+        
+        for index in redundant:
+            print(f"⚠️  {index['name']} duplicates a unique index on ({', '.join(index['columns'])})")
+        
+        recovery_file = write_recovery_file(secondary)
+        print(f"Dropping {len(secondary)} secondary indexes (definitions saved to {recovery_file})")
+        drop_indexes(cursor, secondary)
+        conn.commit()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return False
+    run.add_stage('drop_indexes', time.perf_counter() - drop_started)
+    
+    to_rebuild = [index for index in secondary if not (drop_redundant and index in redundant)]
+    try:
+        succeeded = merge_via_postgres(csv_file, skip_columns, parse_workers, sort_rows, run)
+    finally:
+        mode = 'concurrently' if concurrently else f'in parallel ({workers} connections)'
+        print(f"\nRebuilding {len(to_rebuild)} indexes {mode}...")
+        with run.stage('rebuild_indexes'), profile_stage('rebuild_indexes'):
+            failed = rebuild_indexes(to_rebuild, concurrently=concurrently, workers=workers)
+            if drop_redundant and redundant:
+                print(f"Left out redundant indexes: {', '.join(index['name'] for index in redundant)}")
+            analyze_table()
+        print("📈 ANALYZE public.legacy_clients done")
+    
+    if failed:
+        print(f"❌ {len(failed)} indexes failed to rebuild, see {recovery_file}")
+        return False
+    
+    os.remove(recovery_file)
+    return succeeded
+
 if __name__ == "__main__":
-    print("Starting direct PostgreSQL import...")
-    if import_via_postgres():
+    parser = argparse.ArgumentParser(description='Import legacy clients directly into PostgreSQL')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--mode', choices=['insert', 'merge', 'full', 'validate'], default='insert',
+                        help='insert: add new ids only; merge: also update rows whose content changed; '
+                             'full: merge with secondary indexes dropped and rebuilt afterwards; '
+                             'validate: check the CSV only, never connect to the database')
+    parser.add_argument('--skip-columns', default='',
+                        help='comma separated columns merge must not overwrite (e.g. logo,logo_altura,logo_largura)')
+    parser.add_argument('--parallel-rebuild', action='store_true',
+                        help='full mode: rebuild indexes with plain CREATE INDEX in parallel (blocks writes)')
+    parser.add_argument('--rebuild-workers', type=int, default=4, help='connections for --parallel-rebuild')
+    parser.add_argument('--drop-redundant', action='store_true',
+                        help='full mode: do not rebuild indexes already covered by a unique index')
+    parser.add_argument('--parse-workers', type=int, default=1,
+                        help='merge/full mode: parse the CSV on this many processes (also reads .gz/.zst exports)')
+    parser.add_argument('--sorted', action='store_true',
+                        help='merge/full mode: stream rows in legacy_client_id order through an external sort '
+                             'instead of holding the file (bounded memory with --parse-workers 1)')
+    parser.add_argument('--profile', nargs='?', const='all', metavar='MODES',
+                        help='profile parse/convert, merge SQL and index rebuild into supabase/profiles/<run>: '
+                             'all (default) or a comma list of cprofile, memory, stacks; '
+                             'same as setting LEGACY_IMPORT_PROFILE')
+    parser.add_argument('--no-history', action='store_true', help='do not record this run in public.import_runs')
+    args = parser.parse_args()
+    if args.profile:
+        print(f"📈 Profiling ({args.profile}) into {enable_profiling(args.profile)}")
+    skip_columns = {c.strip() for c in args.skip_columns.split(',') if c.strip()}
+    
+    if args.mode == 'validate':
+        started = time.perf_counter()
+        report, record_count = validate_csv(args.csv)
+        print_report(report, record_count, time.perf_counter() - started)
+        sys.exit(1 if report.has_errors() else 0)
+    
+    import_run = ImportRun(f"direct_psql:{args.mode}", args.csv, {
+        'skip_columns': sorted(skip_columns),
+        'parse_workers': args.parse_workers,
+        'sorted': args.sorted,
+        'rebuild': None if args.mode != 'full' else {
+            'parallel': args.parallel_rebuild,
+            'workers': args.rebuild_workers if args.parallel_rebuild else None,
+            'drop_redundant': args.drop_redundant
+        }
+    })
+    if profiling_modes():
+        # profiled runs are slower by design; keep them out of the unprofiled baseline
+        import_run.config['profile'] = list(profiling_modes())
+    if args.mode == 'full':
+        print("Starting full PostgreSQL load with deferred indexes...")
+        succeeded = full_load_via_postgres(args.csv, skip_columns, not args.parallel_rebuild,
+                                           args.drop_redundant, args.rebuild_workers, args.parse_workers,
+                                           args.sorted, import_run)
+    elif args.mode == 'merge':
+        print("Starting PostgreSQL merge from staging table...")
+        succeeded = merge_via_postgres(args.csv, skip_columns, args.parse_workers, args.sorted, import_run)
+    else:
+        print("Starting direct PostgreSQL import...")
+        succeeded = import_via_postgres(args.csv, import_run)
+    
+    import_run.finish(succeeded)
+    if not args.no_history:
+        recorded_id = record_run(import_run)
+        if recorded_id:
+            print(f"🗂️  Recorded import run #{recorded_id} ({import_run.rows_per_second() or 0:,.0f} rows/s); "
+                  f"compare with: import_run_history.py report --run {recorded_id}")
+    
+    if succeeded:
         print("🎉 Import completed successfully!")
     else:
-        print("💥 Import failed!")
\ No newline at end of file
+        print("💥 Import failed!")
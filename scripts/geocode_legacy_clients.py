@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Offline geocoder for legacy client addresses
+Resolves coordinates without any Maps API calls, in order of precision:
+  cep   - longest matching CEP prefix from a local CEP table
+  city  - accent-folded city + UF from a local gazetteer or the app's
+          src/lib/brazilian-locations.ts coordinates
+  state - centroid of the known coffee-region / major-city coordinates in the UF
+Lookups are memoized because thousands of rows share a few hundred cities.
+Writes a set-based UPDATE of latitude, longitude and geo_precision.
+"""
+import argparse
+import csv
+import os
+import re
+from functools import lru_cache
+
+from legacy_clients_common import (
+    DEFAULT_CSV_FILE,
+    REPO_ROOT,
+    SUPABASE_DIR,
+    clean_value,
+    fold_text,
+    parse_integer,
+    read_csv_rows
+)
+
+LOCATIONS_TS_FILE = os.path.join(REPO_ROOT, 'src', 'lib', 'brazilian-locations.ts')
+DEFAULT_OUTPUT_SQL = os.path.join(SUPABASE_DIR, 'legacy_client_coordinates.sql')
+BRAZILIAN_UFS = {
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
+}
+MIN_CEP_PREFIX = 5
+
+LOCATION_PATTERN = re.compile(
+    r"city:\s*'(?P<city>[^']+)'.*?stateCode:\s*'(?P<uf>[A-Z]{2})'.*?"
+    r"coordinates:\s*\{\s*lat:\s*(?P<lat>-?\d+(?:\.\d+)?),\s*lng:\s*(?P<lng>-?\d+(?:\.\d+)?)"
+)
+
+
+def load_app_locations(ts_file=LOCATIONS_TS_FILE):
+    """Read the city coordinates the app already ships (BRAZILIAN_COFFEE_REGIONS and MAJOR_BRAZILIAN_CITIES)"""
+    locations = []
+    with open(ts_file, 'r', encoding='utf-8') as handle:
+        for line in handle:
+            match = LOCATION_PATTERN.search(line)
+            if match:
+                locations.append((match['city'], match['uf'], float(match['lat']), float(match['lng'])))
+    return locations
+
+
+def load_gazetteer(gazetteer_file):
+    """Load a city gazetteer CSV with city, uf, lat, lng columns (e.g. an IBGE municipality export)"""
+    locations = []
+    with open(gazetteer_file, 'r', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            locations.append((row['city'], row['uf'].strip().upper(), float(row['lat']), float(row['lng'])))
+    return locations
+
+
+def load_cep_table(cep_file):
+    """Load a CEP table CSV with cep (full or prefix), lat, lng columns"""
+    table = {}
+    with open(cep_file, 'r', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            digits = re.sub(r'\D', '', row['cep'])
+            if len(digits) >= MIN_CEP_PREFIX:
+                table[digits] = (float(row['lat']), float(row['lng']))
+    return table
+
+
+class OfflineGeocoder:
+    """Memoized CEP -> city+UF -> state resolution over local tables"""
+
+    def __init__(self, city_locations, cep_table=None):
+        self.cep_table = cep_table or {}
+        self.cep_lengths = sorted({len(key) for key in self.cep_table}, reverse=True)
+        self.cities = {}
+        by_state = {}
+        for city, uf, lat, lng in city_locations:
+            self.cities.setdefault((fold_text(city), uf), (lat, lng))
+            by_state.setdefault(uf, []).append((lat, lng))
+        self.states = {
+            uf: (sum(lat for lat, _ in points) / len(points), sum(lng for _, lng in points) / len(points))
+            for uf, points in by_state.items()
+        }
+        self.resolve_cep = lru_cache(maxsize=None)(self._resolve_cep)
+        self.resolve_place = lru_cache(maxsize=None)(self._resolve_place)
+
+    def _resolve_cep(self, cep):
+        cep_digits = re.sub(r'\D', '', cep)
+        for length in self.cep_lengths:
+            if len(cep_digits) >= length and cep_digits[:length] in self.cep_table:
+                lat, lng = self.cep_table[cep_digits[:length]]
+                return lat, lng, 'cep'
+        return None
+
+    def _resolve_place(self, city, uf):
+        city_key = fold_text(city)
+        if city_key and (city_key, uf) in self.cities:
+            lat, lng = self.cities[(city_key, uf)]
+            return lat, lng, 'city'
+        if uf in self.states:
+            lat, lng = self.states[uf]
+            return lat, lng, 'state'
+        return None
+
+    def geocode(self, cep, city, uf):
+        """Resolve one address; returns (lat, lng, precision) or None"""
+        result = self.resolve_cep(cep) if cep and self.cep_table else None
+        return result or self.resolve_place(city or '', uf)
+
+
+def write_update_sql(output_sql_file, results):
+    """Write one set-based UPDATE for the resolved coordinates"""
+    with open(output_sql_file, 'w', encoding='utf-8') as output:
+        output.write("-- Legacy client coordinates resolved offline\n")
+        output.write("-- Generated by scripts/geocode_legacy_clients.py\n")
+        if not results:
+            output.write("-- No coordinates resolved\n")
+            return
+        output.write("BEGIN;\n\n")
+        output.write("UPDATE public.legacy_clients AS lc\n")
+        output.write("SET latitude = v.latitude, longitude = v.longitude, geo_precision = v.geo_precision, geocoded_at = NOW()\n")
+        output.write("FROM (VALUES\n")
+        output.write(",\n".join(
+            f"    ({legacy_id}, {lat:.6f}, {lng:.6f}, '{precision}')"
+            for legacy_id, (lat, lng, precision) in sorted(results.items())
+        ))
+        output.write("\n) AS v(legacy_client_id, latitude, longitude, geo_precision)\n")
+        output.write("WHERE lc.legacy_client_id = v.legacy_client_id\n")
+        output.write("  AND (lc.latitude, lc.longitude, lc.geo_precision)\n")
+        output.write("      IS DISTINCT FROM (v.latitude::double precision, v.longitude::double precision, v.geo_precision);\n\n")
+        output.write("COMMIT;\n")
+
+
+def geocode_legacy_clients(csv_file_path, output_sql_file, gazetteer_file=None, cep_file=None):
+    """Geocode every Brazilian legacy client and write the UPDATE script"""
+    city_locations = load_gazetteer(gazetteer_file) if gazetteer_file else []
+    city_locations += load_app_locations()
+    cep_table = load_cep_table(cep_file) if cep_file else {}
+    geocoder = OfflineGeocoder(city_locations, cep_table)
+
+    results = {}
+    counts = {'cep': 0, 'city': 0, 'state': 0, 'unresolved': 0, 'foreign': 0}
+
+    for row in read_csv_rows(csv_file_path):
+        legacy_id = parse_integer(row.get('idCLIENTES'))
+        if legacy_id is None:
+            continue
+
+        # PAIS is unreliable in the export (it often holds the city); the UF decides
+        uf = (row.get('UF') or '').strip().upper()
+        if uf not in BRAZILIAN_UFS:
+            counts['foreign' if uf else 'unresolved'] += 1
+            continue
+
+        result = geocoder.geocode(clean_value(row.get('CEP')), clean_value(row.get('CIDADE')), uf)
+        if result is None:
+            counts['unresolved'] += 1
+            continue
+
+        results[legacy_id] = result
+        counts[result[2]] += 1
+
+    write_update_sql(output_sql_file, results)
+
+    cep_cache = geocoder.resolve_cep.cache_info()
+    place_cache = geocoder.resolve_place.cache_info()
+    print(f"Geocoding completed:")
+    print(f"  By CEP prefix: {counts['cep']}")
+    print(f"  By city + UF: {counts['city']}")
+    print(f"  By state fallback: {counts['state']}")
+    print(f"  Unresolved: {counts['unresolved']}")
+    print(f"  Outside Brazil: {counts['foreign']}")
+    print(f"  City lookups: {place_cache.hits} cached, {place_cache.misses} distinct cities")
+    print(f"  CEP lookups: {cep_cache.hits} cached, {cep_cache.misses} distinct CEPs")
+    print(f"  Update SQL: {output_sql_file}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Geocode legacy clients offline')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--gazetteer', help='CSV with city, uf, lat, lng columns')
+    parser.add_argument('--cep-table', help='CSV with cep, lat, lng columns (full CEPs or prefixes)')
+    parser.add_argument('--output-sql', default=DEFAULT_OUTPUT_SQL, help='where to write the UPDATE script')
+    args = parser.parse_args()
+
+    geocode_legacy_clients(args.csv, args.output_sql, args.gazetteer, args.cep_table)
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Legacy clients import pipeline
+One entry point for the old manual chain (import_legacy_clients_sql.py ->
+create_sample_import.py -> bulk_import_remaining.py -> chunk_bulk_import.py
+-> smart_bulk_import.sh), modelled as a DAG of stages:
+
+    parse ----------+--> generate_sql
+      |             +--> chunk --+
+      |                          +--> load --> verify --+--> warm_cache
+    validate --------------------+                      +--> refresh_companies
+                                                        +--> contacts
+
+Each stage writes its outputs to a content-addressed artifact directory
+keyed by the hash of its inputs (the CSV bytes or the upstream artifact
+digests), its configuration and the code of the scripts it runs. A re-run
+reuses every artifact whose key already exists and only executes the stages
+downstream of what changed; stages whose dependencies are done run in
+parallel in a process pool. verify, warm_cache, refresh_companies and contacts
+work on the live database, so they always run; warm_cache publishes the
+precomputed admin listing, refresh_companies updates
+companies_with_legacy_materialized and contacts brings the normalized
+email / phone lookup table up to date from the legacy_clients change feed
+(a full reload when it has never been built or the feed asks for one).
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from itertools import chain, islice
+
+import psycopg2
+
+from legacy_clients_common import (
+    DB_CONNECTION,
+    DEFAULT_CSV_FILE,
+    INSERT_COLUMNS_SQL,
+    SCRIPTS_DIR,
+    SUPABASE_DIR,
+    hash_file,
+    sql_literal
+)
+from import_profiling import PROFILE_ENV, enable_profiling, parse_modes, profile_stage
+from import_run_history import ImportRun, record_run
+from legacy_client_changes import set_change_source
+from legacy_clients_batch import RowBatch
+from legacy_clients_contacts import load_contacts, sync_contacts
+from legacy_clients_external_sort import ExternalSort
+from legacy_clients_parallel_reader import read_rows_parallel
+from refresh_companies_with_legacy import refresh_companies_with_legacy
+from validate_legacy_clients import validate_csv
+from warm_legacy_clients_cache import warm_listing_cache
+
+DEFAULT_ARTIFACTS_DIR = os.path.join(SUPABASE_DIR, 'import_artifacts')
+ARTIFACT_META = 'artifact.json'
+ROWS_FILE = 'rows.pickle'
+ROWS_FILE_BATCH = 10000
+PICKLE_PROTOCOL = 4
+
+
+class Stage:
+    """One pipeline step: its dependencies, the config keys it reads and the scripts its output depends on"""
+
+    def __init__(self, name, function, deps=(), config_keys=(), code=(), reads_csv=False, cacheable=True):
+        self.name = name
+        self.function = function
+        self.deps = tuple(deps)
+        self.config_keys = tuple(config_keys)
+        self.code = ('import_pipeline.py', 'legacy_clients_common.py') + tuple(code)
+        self.reads_csv = reads_csv
+        self.cacheable = cacheable
+
+
+# --- stage functions: run in worker processes, write into output_dir, return a summary dict ---
+
+def parse_stage(csv_file, inputs, config, output_dir):
+    # The artifact is a sequence of pickled RowBatches, written as the rows stream
+    # in, so neither the external sort nor this stage holds the whole file
+    rows = read_rows_parallel(csv_file, config['parse_workers'])
+    if config['order'] == 'id':
+        rows = ExternalSort(rows)
+    rows = (row for row in rows if row[0] is not None)
+    row_count = 0
+    distinct_ids = set()
+    with open(os.path.join(output_dir, ROWS_FILE), 'wb') as handle:
+        while True:
+            batch = RowBatch(islice(rows, ROWS_FILE_BATCH))
+            if not len(batch):
+                break
+            pickle.dump(batch, handle, protocol=PICKLE_PROTOCOL)
+            row_count += len(batch)
+            distinct_ids.update(batch.legacy_ids())
+    return {'rows': row_count, 'distinct_ids': len(distinct_ids)}
+
+
+def validate_stage(csv_file, inputs, config, output_dir):
+    report, record_count = validate_csv(csv_file)
+    with open(os.path.join(output_dir, 'report.json'), 'w', encoding='utf-8') as handle:
+        json.dump({'records': record_count, 'rules': report.to_dict()}, handle, indent=2, sort_keys=True)
+    return {
+        'records': record_count,
+        'has_errors': report.has_errors(),
+        'findings': {rule: count for rule, count in report.counts.items() if count}
+    }
+
+
+def load_batches(artifact_dir):
+    """RowBatches of a parse artifact, one at a time"""
+    with open(os.path.join(artifact_dir, ROWS_FILE), 'rb') as handle:
+        while True:
+            try:
+                yield pickle.load(handle)
+            except EOFError:
+                return
+
+
+def load_rows(artifact_dir):
+    return chain.from_iterable(load_batches(artifact_dir))
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, size)), [])
+
+
+def insert_statement(rows):
+    values = ',\n'.join('(' + ', '.join(sql_literal(value) for value in row) + ')' for row in rows)
+    return (f"INSERT INTO public.legacy_clients (\n    {INSERT_COLUMNS_SQL}\n) VALUES\n{values}\n"
+            f"ON CONFLICT (legacy_client_id) DO NOTHING;\n")
+
+
+def generate_sql_stage(csv_file, inputs, config, output_dir):
+    row_count = statement_count = 0
+    with open(os.path.join(output_dir, 'import_legacy_clients.sql'), 'w', encoding='utf-8') as output:
+        output.write("-- Legacy Clients Import SQL\n-- Generated by scripts/import_pipeline.py\nBEGIN;\n\n")
+        for rows in batched(load_rows(inputs['parse']), config['batch_size']):
+            output.write(insert_statement(rows))
+            output.write("\n")
+            row_count += len(rows)
+            statement_count += 1
+        output.write("COMMIT;\n")
+    return {'rows': row_count, 'statements': statement_count}
+
+
+def chunk_stage(csv_file, inputs, config, output_dir):
+    row_count = chunk_count = 0
+    for rows in batched(load_rows(inputs['parse']), config['chunk_size']):
+        chunk_count += 1
+        row_count += len(rows)
+        with open(os.path.join(output_dir, f"chunk_{chunk_count:03d}.sql"), 'w', encoding='utf-8') as output:
+            output.write(insert_statement(rows))
+    return {'rows': row_count, 'chunks': chunk_count}
+
+
+def chunk_files(artifact_dir):
+    return sorted(name for name in os.listdir(artifact_dir) if name.startswith('chunk_') and name.endswith('.sql'))
+
+
+def load_stage(csv_file, inputs, config, output_dir):
+    with open(os.path.join(inputs['validate'], ARTIFACT_META), 'r', encoding='utf-8') as handle:
+        validation = json.load(handle)['summary']
+    if config['strict'] and validation['has_errors']:
+        raise RuntimeError(f"validation reported errors {validation['findings']}; run without --strict to load anyway")
+
+    conn = psycopg2.connect(**DB_CONNECTION)
+    cursor = conn.cursor()
+    try:
+        set_change_source(cursor, 'pipeline:load')
+        cursor.execute("SELECT COUNT(*) FROM public.legacy_clients")
+        before_count = cursor.fetchone()[0]
+        inserted = 0
+        for name in chunk_files(inputs['chunk']):
+            with open(os.path.join(inputs['chunk'], name), 'r', encoding='utf-8') as handle:
+                cursor.execute(handle.read())
+            inserted += cursor.rowcount
+            conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM public.legacy_clients")
+        after_count = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+    summary = {'before': before_count, 'after': after_count, 'inserted': inserted}
+    with open(os.path.join(output_dir, 'load.json'), 'w', encoding='utf-8') as handle:
+        json.dump(summary, handle)
+    return summary
+
+
+def verify_stage(csv_file, inputs, config, output_dir):
+    expected_ids = sorted({legacy_id for batch in load_batches(inputs['parse']) for legacy_id in batch.legacy_ids()})
+    conn = psycopg2.connect(**DB_CONNECTION)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT e.legacy_id FROM unnest(%s::integer[]) AS e(legacy_id) "
+            "WHERE NOT EXISTS (SELECT 1 FROM public.legacy_clients AS lc WHERE lc.legacy_client_id = e.legacy_id) "
+            "ORDER BY e.legacy_id",
+            (expected_ids,)
+        )
+        missing = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT COUNT(*) FROM public.legacy_clients")
+        table_count = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+    with open(os.path.join(output_dir, 'missing_ids.json'), 'w', encoding='utf-8') as handle:
+        json.dump(missing, handle)
+    if missing:
+        raise RuntimeError(f"{len(missing)} legacy ids missing from the database (first: {missing[:10]}); "
+                           f"if the database was reset, re-run with --force load")
+    return {'expected': len(expected_ids), 'in_table': table_count, 'missing': 0}
+
+
+def warm_cache_stage(csv_file, inputs, config, output_dir):
+    warm = config['warm_cache']
+    published = warm_listing_cache(hash_file(csv_file), warm['pages'], warm['limit'],
+                                   warm['facet_pages'], warm['top_cities'])
+    if published is None:
+        raise RuntimeError("listing cache was not published")
+    version, snapshot_count = published
+    return {'version': version, 'snapshots': snapshot_count}
+
+
+def refresh_companies_stage(csv_file, inputs, config, output_dir):
+    refreshed = refresh_companies_with_legacy(quiet=True)
+    if refreshed is None:
+        raise RuntimeError("companies_with_legacy_materialized was not refreshed")
+    mode, claimed, deleted, inserted = refreshed
+    return {'mode': mode, 'queued': claimed, 'removed': deleted, 'written': inserted}
+
+
+def contacts_stage(csv_file, inputs, config, output_dir):
+    counts = sync_contacts()
+    if counts is not None:
+        return dict(counts, mode='sync')
+    counts = load_contacts()
+    if counts is None:
+        raise RuntimeError("legacy_client_contacts was not reloaded")
+    return dict(counts, mode='build')
+
+
+STAGES = {stage.name: stage for stage in [
+    # parse_workers changes speed, not output, so it is not part of the key
+    Stage('parse', parse_stage, config_keys=('order',),
+          code=('legacy_clients_parallel_reader.py', 'legacy_clients_external_sort.py', 'legacy_clients_batch.py'),
+          reads_csv=True),
+    Stage('validate', validate_stage, code=('validate_legacy_clients.py',), reads_csv=True),
+    Stage('generate_sql', generate_sql_stage, deps=('parse',), config_keys=('batch_size',)),
+    Stage('chunk', chunk_stage, deps=('parse',), config_keys=('chunk_size',)),
+    Stage('load', load_stage, deps=('chunk', 'validate'), config_keys=('strict', 'database')),
+    Stage('verify', verify_stage, deps=('parse', 'load'), config_keys=('database',), cacheable=False),
+    Stage('warm_cache', warm_cache_stage, deps=('verify',), config_keys=('database', 'warm_cache'),
+          code=('warm_legacy_clients_cache.py',), cacheable=False),
+    Stage('refresh_companies', refresh_companies_stage, deps=('verify',), config_keys=('database',),
+          code=('refresh_companies_with_legacy.py',), cacheable=False),
+    Stage('contacts', contacts_stage, deps=('verify',), config_keys=('database',),
+          code=('legacy_clients_contacts.py', 'legacy_client_changes.py'), cacheable=False)
+]}
+
+
+def run_stage(stage_name, csv_file, inputs, config, output_dir):
+    """Worker entry point: run one stage and time it"""
+    started = time.perf_counter()
+    with profile_stage(stage_name, trace_memory=stage_name == 'parse'):
+        summary = STAGES[stage_name].function(csv_file, inputs, config, output_dir)
+    return summary, time.perf_counter() - started
+
+
+# --- artifact store ---
+
+def digest_of(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def stage_key(stage, csv_digest, upstream_digests, config):
+    """Hash of everything a stage's output depends on"""
+    return digest_of({
+        'stage': stage.name,
+        'csv': csv_digest if stage.reads_csv else None,
+        'upstream': {dep: upstream_digests[dep] for dep in stage.deps},
+        'config': {key: config[key] for key in stage.config_keys},
+        'code': {name: hash_file(os.path.join(SCRIPTS_DIR, name)) for name in stage.code}
+    })
+
+
+def artifact_path(artifacts_dir, stage_name, key):
+    return os.path.join(artifacts_dir, stage_name, key)
+
+
+def read_artifact(path):
+    """Metadata of a finished artifact, or None when it does not exist"""
+    meta_path = os.path.join(path, ARTIFACT_META)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def seal_artifact(work_dir, final_dir, stage_name, key, summary, elapsed):
+    """Hash the produced files, write the metadata last and move the directory into place"""
+    files = {name: hash_file(os.path.join(work_dir, name)) for name in sorted(os.listdir(work_dir))}
+    meta = {
+        'stage': stage_name,
+        'key': key,
+        'digest': digest_of(files),
+        'files': files,
+        'summary': summary,
+        'seconds': round(elapsed, 3),
+        'created_at': datetime.now().isoformat(timespec='seconds')
+    }
+    with open(os.path.join(work_dir, ARTIFACT_META), 'w', encoding='utf-8') as handle:
+        json.dump(meta, handle, indent=2)
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+    os.replace(work_dir, final_dir)
+    return meta
+
+
+def stages_for(targets):
+    """Targets plus everything they depend on, in dependency order"""
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        for dep in STAGES[name].deps:
+            visit(dep)
+        ordered.append(name)
+
+    for target in targets:
+        visit(target)
+    return ordered
+
+
+# --- scheduler ---
+
+def run_pipeline(csv_file, targets, config, artifacts_dir=DEFAULT_ARTIFACTS_DIR, force=(), workers=None,
+                 profile=None):
+    """Run the targets and their dependencies, reusing cached artifacts; returns the run record"""
+    wanted = stages_for(targets)
+    csv_digest = hash_file(csv_file)
+    run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    run_dir = os.path.join(artifacts_dir, 'runs', run_id)
+    # Set before the pool starts so every stage process writes to the same directory
+    profile = profile or os.environ.get(PROFILE_ENV)
+    profile_dir = enable_profiling(profile, os.path.join(run_dir, 'profile')) if parse_modes(profile) else None
+    work_root = os.path.join(artifacts_dir, 'tmp', run_id)
+    os.makedirs(work_root, exist_ok=True)
+
+    digests, paths, results = {}, {}, {}
+    pending = list(wanted)
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for name in list(pending):
+                stage = STAGES[name]
+                if any(results.get(dep, {}).get('status') in ('failed', 'blocked') for dep in stage.deps):
+                    pending.remove(name)
+                    results[name] = {'status': 'blocked'}
+                    continue
+                if not all(dep in digests for dep in stage.deps):
+                    continue
+                pending.remove(name)
+
+                key = stage_key(stage, csv_digest, digests, config)
+                final_dir = (artifact_path(artifacts_dir, name, key) if stage.cacheable
+                             else os.path.join(run_dir, name))
+                cached = read_artifact(final_dir) if stage.cacheable and name not in force else None
+                if cached:
+                    digests[name], paths[name] = cached['digest'], final_dir
+                    results[name] = {'status': 'cached', 'key': key, 'summary': cached['summary'],
+                                     'seconds': 0.0, 'path': final_dir}
+                    print(f"⏭️  {name}: unchanged ({key[:12]})")
+                    continue
+
+                work_dir = os.path.join(work_root, name)
+                os.makedirs(work_dir)
+                inputs = {dep: paths[dep] for dep in stage.deps}
+                future = executor.submit(run_stage, name, csv_file, inputs, config, work_dir)
+                running[future] = (name, key, work_dir, final_dir)
+                print(f"▶️  {name}: running ({key[:12]})")
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key, work_dir, final_dir = running.pop(future)
+                try:
+                    summary, elapsed = future.result()
+                except Exception as e:
+                    results[name] = {'status': 'failed', 'key': key, 'error': str(e)}
+                    print(f"❌ {name}: {e}")
+                    continue
+                meta = seal_artifact(work_dir, final_dir, name, key, summary, elapsed)
+                digests[name], paths[name] = meta['digest'], final_dir
+                results[name] = {'status': 'ran', 'key': key, 'summary': summary,
+                                 'seconds': round(elapsed, 3), 'path': final_dir}
+                print(f"✅ {name}: done in {elapsed:.2f}s")
+
+    shutil.rmtree(work_root, ignore_errors=True)
+    run = {'run_id': run_id, 'csv': csv_file, 'csv_sha256': csv_digest, 'config': config,
+           'stages': {name: results[name] for name in wanted}}
+    if profile_dir:
+        run['profile_dir'] = profile_dir
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, 'run.json'), 'w', encoding='utf-8') as handle:
+        json.dump(run, handle, indent=2)
+    return run
+
+
+def history_run(run, import_run):
+    """Fill an ImportRun from a pipeline run record: stages that ran, parse / load counts"""
+    stages = run['stages']
+    for name, result in stages.items():
+        if result['status'] == 'ran':
+            import_run.add_stage(name, result['seconds'])
+    # Cached stages did no work in this run, so only stages that ran count
+    ran = {name: result['summary'] for name, result in stages.items() if result['status'] == 'ran'}
+    import_run.count(read=ran.get('parse', {}).get('rows', 0),
+                     imported=ran.get('load', {}).get('inserted', 0),
+                     cached=sum(1 for result in stages.values() if result['status'] == 'cached'))
+    if 'parse' in ran and 'validate' in ran:
+        # records without a legacy id are dropped by parse
+        import_run.count(skipped=ran['validate']['records'] - ran['parse']['rows'])
+    import_run.throughput_measured = 'parse' in ran
+    return import_run.finish(all(result['status'] in ('ran', 'cached') for result in stages.values()))
+
+
+def print_run(run):
+    print(f"\n=== Import Pipeline Summary ({run['run_id']}) ===")
+    for name, result in run['stages'].items():
+        icon = {'ran': '✅', 'cached': '⏭️ ', 'failed': '❌', 'blocked': '🚫'}[result['status']]
+        detail = result.get('error') or ', '.join(f"{k}={v}" for k, v in result.get('summary', {}).items())
+        print(f"{icon} {name:<17} {result['status']:<8} {result.get('seconds', 0):>7.2f}s  {detail}")
+        if result.get('path') and result['status'] != 'blocked':
+            print(f"   {result['path']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the legacy clients import as a cached stage DAG')
+    parser.add_argument('targets', nargs='*', default=list(STAGES),
+                        help=f"stages to bring up to date: {', '.join(STAGES)} (default: all)")
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--artifacts-dir', default=DEFAULT_ARTIFACTS_DIR, help='content-addressed artifact store')
+    parser.add_argument('--force', action='append', default=[], choices=list(STAGES),
+                        help='re-run this stage even if its artifact exists (repeatable)')
+    parser.add_argument('--workers', type=int, default=None, help='stages run at the same time')
+    parser.add_argument('--parse-workers', type=int, default=1, help='processes used by the parse stage')
+    parser.add_argument('--order', choices=['file', 'id'], default='file',
+                        help='row order for generated SQL and chunks: CSV order or legacy_client_id '
+                             '(external sort, streamed into the parse artifact)')
+    parser.add_argument('--batch-size', type=int, default=100, help='rows per INSERT in the generated SQL')
+    parser.add_argument('--chunk-size', type=int, default=50, help='rows per chunk file')
+    parser.add_argument('--warm-pages', type=int, default=5, help='default listing pages warm_cache precomputes')
+    parser.add_argument('--strict', action='store_true', help='refuse to load when validation reports errors')
+    parser.add_argument('--profile', nargs='?', const='all', metavar='MODES',
+                        help='profile every stage that runs into runs/<run>/profile: all (default) or a comma '
+                             'list of cprofile, memory, stacks; same as setting LEGACY_IMPORT_PROFILE')
+    parser.add_argument('--no-history', action='store_true', help='do not record this run in public.import_runs')
+    args = parser.parse_args()
+    unknown = [target for target in args.targets if target not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    pipeline_config = {
+        'parse_workers': args.parse_workers,
+        'order': args.order,
+        'batch_size': args.batch_size,
+        'chunk_size': args.chunk_size,
+        'strict': args.strict,
+        'warm_cache': {'pages': args.warm_pages, 'limit': 100, 'facet_pages': 1, 'top_cities': 50},
+        'database': {key: DB_CONNECTION[key] for key in ('host', 'port', 'database', 'user')}
+    }
+    pipeline_import_run = ImportRun('pipeline', args.csv, dict(
+        {key: value for key, value in pipeline_config.items() if key != 'database'},
+        targets=sorted(args.targets)
+    ))
+    profile_modes = parse_modes(args.profile or os.environ.get(PROFILE_ENV))
+    if profile_modes:
+        # profiled runs are slower by design; keep them out of the unprofiled baseline
+        pipeline_import_run.config['profile'] = list(profile_modes)
+    pipeline_run = run_pipeline(args.csv, args.targets, pipeline_config, args.artifacts_dir,
+                                set(args.force), args.workers, args.profile)
+    print_run(pipeline_run)
+    if not args.no_history:
+        recorded_id = record_run(history_run(pipeline_run, pipeline_import_run))
+        if recorded_id:
+            print(f"🗂️  Recorded import run #{recorded_id}; compare with: import_run_history.py report --run {recorded_id}")
+    sys.exit(0 if all(r['status'] in ('ran', 'cached') for r in pipeline_run['stages'].values()) else 1)
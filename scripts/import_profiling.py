@@ -0,0 +1,183 @@
+"""
+Opt-in profiling hooks for the legacy clients import entry points
+Off unless LEGACY_IMPORT_PROFILE is set (the --profile flags of
+direct_psql_import.py and import_pipeline.py set it). When off,
+profile_stage() returns a nullcontext: one environment lookup per stage and
+nothing in the row loops. When on, each wrapped stage writes to the run
+directory (LEGACY_IMPORT_PROFILE_DIR, else supabase/profiles/<run id>):
+
+    cprofile  <stage>.prof (pstats / snakeviz) and <stage>.txt, top functions
+    memory    <stage>.memory.txt, tracemalloc peak and top allocation sites,
+              only for stages wrapped with trace_memory=True (parse / convert)
+    stacks    <stage>.collapsed, wall-clock stack samples of the stage's thread
+              in collapsed format ("frame;frame;frame count") for flamegraph.pl
+              or speedscope
+
+plus <stage>.json with the timings. LEGACY_IMPORT_PROFILE=all (or 1) turns
+every mode on, or name them: LEGACY_IMPORT_PROFILE=cprofile,stacks.
+Only the current process is profiled; parse worker processes are not.
+cprofile and memory slow the profiled code down, so compare their timings
+only with each other; stacks alone keeps close to normal speed.
+"""
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from legacy_clients_common import SUPABASE_DIR
+
+PROFILE_ENV = 'LEGACY_IMPORT_PROFILE'
+PROFILE_DIR_ENV = 'LEGACY_IMPORT_PROFILE_DIR'
+INTERVAL_ENV = 'LEGACY_IMPORT_PROFILE_INTERVAL'
+MODES = ('cprofile', 'memory', 'stacks')
+DEFAULT_PROFILES_DIR = os.path.join(SUPABASE_DIR, 'profiles')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+TOP_ENTRIES = 30
+TRACEBACK_DEPTH = 25
+
+
+def parse_modes(value):
+    """Profiling modes named by an env / flag value: '' -> (), 'all' or '1' -> every mode"""
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'off', 'false', 'no'):
+        return ()
+    if value in ('1', 'all', 'on', 'true', 'yes'):
+        return MODES
+    modes = tuple(mode.strip() for mode in value.split(',') if mode.strip())
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise ValueError(f"unknown profiling mode(s) {', '.join(unknown)}; expected all or {', '.join(MODES)}")
+    return modes
+
+
+def profiling_modes():
+    """Modes profiling is on for in this process, () when it is off"""
+    return parse_modes(os.environ.get(PROFILE_ENV))
+
+
+def enable_profiling(modes='all', profile_dir=None):
+    """Turn profiling on for this process and the processes it starts from now on"""
+    parse_modes(modes)
+    os.environ[PROFILE_ENV] = modes
+    os.environ.setdefault(PROFILE_DIR_ENV, profile_dir or os.path.join(
+        DEFAULT_PROFILES_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    ))
+    return os.environ[PROFILE_DIR_ENV]
+
+
+def profile_dir():
+    """Run directory for profiles, created on first use"""
+    if PROFILE_DIR_ENV not in os.environ:
+        enable_profiling(os.environ[PROFILE_ENV])
+    path = os.environ[PROFILE_DIR_ENV]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='import-stack-sampler', daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def _profiled_stage(name, modes, trace_memory):
+    output_dir = profile_dir()
+    summary = {'stage': name, 'modes': list(modes), 'pid': os.getpid()}
+
+    started_tracing = False
+    if 'memory' in modes and trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_DEPTH)
+            started_tracing = True
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    sampler = None
+    if 'stacks' in modes:
+        interval = float(os.environ.get(INTERVAL_ENV, DEFAULT_SAMPLE_INTERVAL))
+        sampler = StackSampler(threading.get_ident(), interval).start()
+
+    profiler = cProfile.Profile() if 'cprofile' in modes else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        summary['seconds'] = round(time.perf_counter() - started, 4)
+
+        if sampler:
+            sampler.stop()
+            sampler.write(os.path.join(output_dir, f"{name}.collapsed"))
+            summary['stack_samples'] = sum(sampler.stacks.values())
+
+        if profiler:
+            profiler.dump_stats(os.path.join(output_dir, f"{name}.prof"))
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(TOP_ENTRIES)
+            with open(os.path.join(output_dir, f"{name}.txt"), 'w', encoding='utf-8') as output:
+                output.write(report.getvalue())
+
+        if 'memory' in modes and trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            summary['memory_peak_bytes'] = peak - memory_before
+            summary['memory_retained_bytes'] = current - memory_before
+            with open(os.path.join(output_dir, f"{name}.memory.txt"), 'w', encoding='utf-8') as output:
+                output.write(f"peak above stage start: {(peak - memory_before) / 1048576:.1f} MiB\n")
+                output.write(f"retained at stage end: {(current - memory_before) / 1048576:.1f} MiB\n\n")
+                for statistic in snapshot.statistics('lineno')[:TOP_ENTRIES]:
+                    output.write(f"{statistic}\n")
+
+        with open(os.path.join(output_dir, f"{name}.json"), 'w', encoding='utf-8') as output:
+            json.dump(summary, output, indent=2)
+
+
+def profile_stage(name, trace_memory=False):
+    """Context manager profiling one import stage when LEGACY_IMPORT_PROFILE is set, a no-op otherwise"""
+    modes = profiling_modes()
+    if not modes:
+        return contextlib.nullcontext()
+    return _profiled_stage(name, modes, trace_memory)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Import run history and throughput regression report
+Import entry points collect their counts and stage timings in an ImportRun
+and write it to public.import_runs when they finish (best effort: an import
+never fails because its history could not be written).
+
+The report compares a run with the trailing median of the earlier
+successful runs of the same backend and configuration, and flags:
+
+    throughput  rows/s more than THROUGHPUT_DROP below the median
+    stage       a stage more than STAGE_SLOWDOWN_FACTOR slower than its median
+    error rate  rejected / read more than ERROR_RATE_INCREASE above the median
+    failed      the run itself failed
+
+Runs made with --profile / LEGACY_IMPORT_PROFILE carry their profiling
+modes in the config, so they never skew the baseline of normal runs.
+
+Usage:
+  import_run_history.py list [--backend direct_psql:merge] [--limit 20]
+  import_run_history.py report [--backend ...] [--run ID] [--fail-on-regression]
+"""
+import argparse
+import contextlib
+import json
+import socket
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import psycopg2
+import psycopg2.extras
+
+from legacy_clients_common import DB_CONNECTION, hash_file
+
+HISTORY_WINDOW = 10
+MIN_HISTORY = 3
+THROUGHPUT_DROP = 0.2
+STAGE_SLOWDOWN_FACTOR = 1.5
+STAGE_SLOWDOWN_MIN_SECONDS = 1.0
+ERROR_RATE_INCREASE = 0.01
+
+# ImportRun.counts keys with their own import_runs column; the rest go to counts
+COUNT_COLUMNS = {'read': 'rows_read', 'imported': 'rows_imported', 'updated': 'rows_updated',
+                 'skipped': 'rows_skipped', 'rejected': 'rows_rejected'}
+
+RUN_COLUMNS = ['id', 'started_at', 'finished_at', 'backend', 'status', 'input_file', 'input_sha256', 'config',
+               'rows_read', 'rows_imported', 'rows_updated', 'rows_skipped', 'rows_rejected', 'counts',
+               'stage_seconds', 'duration_seconds', 'rows_per_second', 'host']
+
+
+class ImportRun:
+    """Counts and stage timings of one import, written to public.import_runs by record_run()"""
+
+    def __init__(self, backend, input_file=None, config=None):
+        self.backend = backend
+        self.input_file = input_file
+        self.config = config or {}
+        self.counts = Counter()
+        self.stage_seconds = {}
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.duration = None
+        self.succeeded = None
+        self.throughput_measured = True
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a stage; repeated stages add up"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def add_stage(self, name, seconds):
+        self.stage_seconds[name] = round(self.stage_seconds.get(name, 0) + seconds, 4)
+
+    def count(self, **counts):
+        """Add to the run's counters: read, imported, updated, skipped, rejected or any other name"""
+        self.counts.update(counts)
+
+    def finish(self, succeeded, duration=None):
+        self.succeeded = bool(succeeded)
+        self.duration = duration if duration is not None else time.perf_counter() - self.started
+        return self
+
+    def rows_per_second(self):
+        if not self.throughput_measured or not self.duration:
+            return None
+        return round(self.counts['read'] / self.duration, 1)
+
+
+def record_run(run):
+    """Insert a finished ImportRun into public.import_runs; returns its id or None"""
+    if run.duration is None:
+        run.finish(run.succeeded)
+    columns = {column: run.counts.get(key, 0) for key, column in COUNT_COLUMNS.items()}
+    extra_counts = {key: value for key, value in run.counts.items() if key not in COUNT_COLUMNS}
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"⚠️  Import run not recorded, database connection error: {e}")
+        return None
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO public.import_runs (
+                started_at, backend, status, input_file, input_sha256, config,
+                rows_read, rows_imported, rows_updated, rows_skipped, rows_rejected,
+                counts, stage_seconds, duration_seconds, rows_per_second, host
+            ) VALUES (
+                %(started_at)s, %(backend)s, %(status)s, %(input_file)s, %(input_sha256)s, %(config)s,
+                %(rows_read)s, %(rows_imported)s, %(rows_updated)s, %(rows_skipped)s, %(rows_rejected)s,
+                %(counts)s, %(stage_seconds)s, %(duration_seconds)s, %(rows_per_second)s, %(host)s
+            )
+            RETURNING id
+            """,
+            dict(
+                columns,
+                started_at=run.started_at,
+                backend=run.backend,
+                status='succeeded' if run.succeeded else 'failed',
+                input_file=run.input_file,
+                input_sha256=hash_file(run.input_file) if run.input_file else None,
+                config=psycopg2.extras.Json(run.config),
+                counts=psycopg2.extras.Json(extra_counts),
+                stage_seconds=psycopg2.extras.Json(run.stage_seconds),
+                duration_seconds=round(run.duration, 3),
+                rows_per_second=run.rows_per_second(),
+                host=socket.gethostname()
+            )
+        )
+        run_id = cursor.fetchone()[0]
+        conn.commit()
+        return run_id
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️  Import run not recorded: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_runs(cursor, backend=None, limit=None):
+    """import_runs rows as dicts, newest first"""
+    cursor.execute(
+        f"""
+        SELECT {', '.join(RUN_COLUMNS)} FROM public.import_runs
+        WHERE %(backend)s::text IS NULL OR backend = %(backend)s
+        ORDER BY started_at DESC, id DESC
+        LIMIT %(limit)s
+        """,
+        {'backend': backend, 'limit': limit}
+    )
+    return [dict(zip(RUN_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def error_rate(run):
+    return run['rows_rejected'] / run['rows_read'] if run['rows_read'] else 0.0
+
+
+def baseline_runs(cursor, run, any_config=False, window=HISTORY_WINDOW):
+    """Up to window earlier successful runs of the same backend (and configuration)
+
+    Profiled runs (config 'profile') are only ever compared with each other,
+    even with any_config: the profilers slow every stage down.
+    """
+    cursor.execute(
+        f"""
+        SELECT {', '.join(RUN_COLUMNS)} FROM public.import_runs
+        WHERE backend = %(backend)s AND status = 'succeeded' AND id <> %(id)s
+          AND started_at <= %(started_at)s
+          AND (%(any_config)s OR config = %(config)s)
+          AND (config ? 'profile') = (%(config)s::jsonb ? 'profile')
+        ORDER BY started_at DESC, id DESC
+        LIMIT %(window)s
+        """,
+        {'backend': run['backend'], 'id': run['id'], 'started_at': run['started_at'], 'any_config': any_config,
+         'config': psycopg2.extras.Json(run['config']), 'window': window}
+    )
+    return [dict(zip(RUN_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def compare_with_baseline(run, baseline):
+    """(medians, regressions) of a run against its baseline runs"""
+    regressions = []
+    if run['status'] != 'succeeded':
+        regressions.append("run failed")
+    if len(baseline) < MIN_HISTORY:
+        return {}, regressions
+
+    medians = {'error_rate': statistics.median(error_rate(entry) for entry in baseline)}
+    throughputs = [float(entry['rows_per_second']) for entry in baseline if entry['rows_per_second'] is not None]
+    if throughputs and run['rows_per_second'] is not None:
+        medians['rows_per_second'] = statistics.median(throughputs)
+        if float(run['rows_per_second']) < medians['rows_per_second'] * (1 - THROUGHPUT_DROP):
+            regressions.append(f"throughput {float(run['rows_per_second']):,.0f} rows/s vs trailing median "
+                               f"{medians['rows_per_second']:,.0f} rows/s")
+
+    for stage, seconds in run['stage_seconds'].items():
+        earlier = [entry['stage_seconds'][stage] for entry in baseline if stage in entry['stage_seconds']]
+        if len(earlier) < MIN_HISTORY:
+            continue
+        median_seconds = medians[f"stage:{stage}"] = statistics.median(earlier)
+        if seconds > max(median_seconds * STAGE_SLOWDOWN_FACTOR, median_seconds + STAGE_SLOWDOWN_MIN_SECONDS):
+            regressions.append(f"stage {stage} {seconds:.2f}s vs trailing median {median_seconds:.2f}s")
+
+    if error_rate(run) > medians['error_rate'] + ERROR_RATE_INCREASE:
+        regressions.append(f"error rate {error_rate(run):.2%} vs trailing median {medians['error_rate']:.2%}")
+    return medians, regressions
+
+
+def format_run(run):
+    throughput = f"{float(run['rows_per_second']):,.0f} rows/s" if run['rows_per_second'] is not None else "cached"
+    return (f"#{run['id']} {run['backend']} {run['started_at']:%Y-%m-%d %H:%M} {run['status']}: "
+            f"{run['rows_read']} read, {run['rows_imported']} imported, {run['rows_updated']} updated, "
+            f"{run['rows_skipped']} skipped, {run['rows_rejected']} rejected in "
+            f"{float(run['duration_seconds']):.2f}s ({throughput})")
+
+
+def report_run(cursor, run, any_config=False, window=HISTORY_WINDOW):
+    """Print one run against its trailing median; returns its regressions"""
+    baseline = baseline_runs(cursor, run, any_config, window)
+    medians, regressions = compare_with_baseline(run, baseline)
+    print(format_run(run))
+    if 'rows_per_second' in medians:
+        change = float(run['rows_per_second']) / medians['rows_per_second'] - 1
+        print(f"   trailing median of {len(baseline)} runs: {medians['rows_per_second']:,.0f} rows/s "
+              f"({change:+.0%}), error rate {medians['error_rate']:.2%}")
+    elif len(baseline) < MIN_HISTORY:
+        print(f"   only {len(baseline)} comparable earlier runs, need {MIN_HISTORY} for a baseline")
+    for stage, seconds in run['stage_seconds'].items():
+        median_seconds = medians.get(f"stage:{stage}")
+        print(f"   {stage:<17} {seconds:>8.2f}s" + (f"  (median {median_seconds:.2f}s)" if median_seconds else ""))
+    for message in regressions:
+        print(f"   ⚠️  {message}")
+    if not regressions:
+        print("   ✅ no regression")
+    return regressions
+
+
+def report(backend=None, run_id=None, any_config=False, window=HISTORY_WINDOW):
+    """Report the given run, or the latest run of each backend; returns the regressions or None"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+    cursor = conn.cursor()
+    try:
+        if run_id:
+            cursor.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM public.import_runs WHERE id = %s", (run_id,))
+            runs = [dict(zip(RUN_COLUMNS, row)) for row in cursor.fetchall()]
+        else:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT ON (backend) {', '.join(RUN_COLUMNS)} FROM public.import_runs
+                WHERE %(backend)s::text IS NULL OR backend = %(backend)s
+                ORDER BY backend, started_at DESC, id DESC
+                """,
+                {'backend': backend}
+            )
+            runs = [dict(zip(RUN_COLUMNS, row)) for row in cursor.fetchall()]
+
+        print(f"\n=== Import Run Report ===")
+        if not runs:
+            print("No import runs recorded")
+        regressions = {}
+        for run in runs:
+            regressions[run['id']] = report_run(cursor, run, any_config, window)
+        return regressions
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def list_runs(backend=None, limit=20):
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        for run in fetch_runs(cursor, backend, limit):
+            print(format_run(run))
+            if run['stage_seconds']:
+                print(f"   stages: {json.dumps(run['stage_seconds'])}")
+        return True
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Legacy clients import run history')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='recent import runs, newest first')
+    list_parser.add_argument('--backend', help='only runs of this backend (e.g. direct_psql:merge, pipeline)')
+    list_parser.add_argument('--limit', type=int, default=20)
+
+    report_parser = subparsers.add_parser('report', help='compare runs with the trailing median')
+    report_parser.add_argument('--backend', help='only this backend (default: the latest run of each)')
+    report_parser.add_argument('--run', type=int, help='import_runs id to report instead of the latest')
+    report_parser.add_argument('--window', type=int, default=HISTORY_WINDOW, help='earlier runs in the median')
+    report_parser.add_argument('--any-config', action='store_true',
+                               help='compare with runs of any batch configuration, not only the same one')
+    report_parser.add_argument('--fail-on-regression', action='store_true',
+                               help='exit non-zero when a run regressed (for the nightly sync job)')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        sys.exit(0 if list_runs(args.backend, args.limit) else 2)
+
+    run_regressions = report(args.backend, args.run, args.any_config, args.window)
+    if run_regressions is None:
+        sys.exit(2)
+    regressed = [run_id for run_id, messages in run_regressions.items() if messages]
+    print(f"\n⚠️  Regressed runs: {len(regressed)}" if regressed else "\n🎉 No regressions against history")
+    if args.fail_on_regression and regressed:
+        sys.exit(1)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Legacy Clients Logo Ingestion
+Resolves LOGO references against a local asset directory, dedupes files by
+content hash, generates thumbnails in a process pool and writes them to a
+local stand-in for the Supabase 'documents' bucket. Produces an UPDATE script
+that writes the stored path, real dimensions and thumbnail paths back to
+legacy_clients.
+"""
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+from legacy_clients_common import (
+    DEFAULT_CSV_FILE,
+    SUPABASE_DIR,
+    clean_value,
+    hash_file,
+    parse_integer,
+    read_csv_rows,
+    sql_literal
+)
+
+DEFAULT_ASSETS_DIR = os.path.join(SUPABASE_DIR, 'legacy_logos')
+DEFAULT_STORAGE_DIR = os.path.join(SUPABASE_DIR, 'storage', 'documents')
+DEFAULT_OUTPUT_SQL = os.path.join(SUPABASE_DIR, 'legacy_logo_updates.sql')
+STORAGE_PREFIX = 'legacy-logos'
+MANIFEST_NAME = 'manifest.json'
+THUMBNAIL_SIZES = (64, 128, 256)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+
+
+def looks_like_path(reference):
+    """The SQL Server export inlines some logos as mangled binary, which is not a file reference"""
+    # isprintable() also rejects the NUL bytes those values are full of
+    return len(reference) <= 255 and all(ch.isprintable() for ch in reference)
+
+
+def resolve_logo(assets_dir, legacy_id, reference):
+    """Find the asset file for a client, by LOGO reference first, then by legacy id"""
+    if reference and looks_like_path(reference):
+        candidate = os.path.join(assets_dir, os.path.basename(reference.replace('\\', '/')))
+        if os.path.isfile(candidate):
+            return candidate
+
+    for extension in IMAGE_EXTENSIONS:
+        candidate = os.path.join(assets_dir, f"{legacy_id}{extension}")
+        if os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+def process_asset(source_path, content_hash, storage_dir, sizes):
+    """Copy one original into storage and render its thumbnails (runs in a worker process)"""
+    extension = os.path.splitext(source_path)[1].lower() or '.bin'
+    relative_dir = f"{STORAGE_PREFIX}/{content_hash[:2]}/{content_hash}"
+    target_dir = os.path.join(storage_dir, *relative_dir.split('/'))
+    os.makedirs(target_dir, exist_ok=True)
+
+    original_path = f"{relative_dir}/original{extension}"
+    shutil.copyfile(source_path, os.path.join(storage_dir, *original_path.split('/')))
+
+    thumbnails = {}
+    with Image.open(source_path) as image:
+        width, height = image.size
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        for size in sizes:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            thumbnail_path = f"{relative_dir}/thumb_{size}.png"
+            thumbnail.save(os.path.join(storage_dir, *thumbnail_path.split('/')), 'PNG', optimize=True)
+            thumbnails[str(size)] = thumbnail_path
+
+    return {
+        'original': original_path,
+        'width': width,
+        'height': height,
+        'thumbnails': thumbnails
+    }
+
+
+def manifest_key(content_hash, sizes):
+    """Manifest entries are per file and thumbnail size set, so new sizes get rendered"""
+    return f"{content_hash}:{','.join(str(size) for size in sorted(set(sizes)))}"
+
+
+def load_manifest(manifest_path):
+    """Load the hash -> processed asset manifest from a previous run"""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def save_manifest(manifest_path, manifest):
+    """Write the manifest atomically so an interrupted run keeps the previous state"""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def is_complete(entry, storage_dir):
+    """True when every file recorded for a hash still exists in storage"""
+    paths = [entry['original']] + list(entry['thumbnails'].values())
+    return all(os.path.exists(os.path.join(storage_dir, *path.split('/'))) for path in paths)
+
+
+def write_update_sql(output_sql_file, assignments, manifest):
+    """Write one set-based UPDATE that stores logo path, real dimensions and thumbnail paths"""
+    values = []
+    for legacy_id, key in sorted(assignments.items()):
+        entry = manifest[key]
+        thumbnails = json.dumps(entry['thumbnails'], sort_keys=True)
+        values.append(
+            f"    ({legacy_id}, {sql_literal(entry['original'])}, {entry['height']}, {entry['width']}, "
+            f"{sql_literal(thumbnails)}::jsonb)"
+        )
+
+    with open(output_sql_file, 'w', encoding='utf-8') as output:
+        output.write("-- Legacy client logo paths and dimensions\n")
+        output.write("-- Generated by scripts/ingest_legacy_logos.py\n")
+        if not values:
+            output.write("-- No logos resolved\n")
+            return
+        output.write("BEGIN;\n\n")
+        output.write("UPDATE public.legacy_clients AS lc\n")
+        output.write("SET logo = v.logo, logo_altura = v.logo_altura, logo_largura = v.logo_largura,\n")
+        output.write("    logo_thumbnails = v.logo_thumbnails, updated_at = NOW()\n")
+        output.write("FROM (VALUES\n")
+        output.write(",\n".join(values))
+        output.write("\n) AS v(legacy_client_id, logo, logo_altura, logo_largura, logo_thumbnails)\n")
+        output.write("WHERE lc.legacy_client_id = v.legacy_client_id\n")
+        output.write("  AND (lc.logo, lc.logo_altura, lc.logo_largura, lc.logo_thumbnails)\n")
+        output.write("      IS DISTINCT FROM (v.logo, v.logo_altura, v.logo_largura, v.logo_thumbnails);\n\n")
+        output.write("COMMIT;\n")
+
+
+def ingest_logos(csv_file_path, assets_dir, storage_dir, output_sql_file, sizes=THUMBNAIL_SIZES, workers=None):
+    """Resolve, dedupe and process logo assets, skipping hashes already in the manifest"""
+    os.makedirs(storage_dir, exist_ok=True)
+    manifest_path = os.path.join(storage_dir, STORAGE_PREFIX, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    manifest = load_manifest(manifest_path)
+
+    assignments = {}
+    sources = {}
+    hash_cache = {}
+    missing_count = 0
+    unreferenced_count = 0
+
+    for row in read_csv_rows(csv_file_path):
+        legacy_id = parse_integer(row.get('idCLIENTES'))
+        if legacy_id is None:
+            continue
+
+        reference = clean_value(row.get('LOGO'))
+        source_path = resolve_logo(assets_dir, legacy_id, reference)
+        if source_path is None:
+            if reference:
+                missing_count += 1
+            else:
+                unreferenced_count += 1
+            continue
+
+        if source_path not in hash_cache:
+            hash_cache[source_path] = hash_file(source_path)
+        content_hash = hash_cache[source_path]
+
+        key = manifest_key(content_hash, sizes)
+        assignments[legacy_id] = key
+        sources.setdefault(key, (content_hash, source_path))
+
+    pending = {
+        key: source
+        for key, source in sources.items()
+        if key not in manifest or not is_complete(manifest[key], storage_dir)
+    }
+
+    print(f"Resolved logos: {len(assignments)} clients, {len(sources)} unique files")
+    print(f"Already processed: {len(sources) - len(pending)}, to process: {len(pending)}")
+
+    failed = set()
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(process_asset, source_path, content_hash, storage_dir, tuple(sizes)): key
+                for key, (content_hash, source_path) in pending.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    manifest[key] = future.result()
+                except Exception as e:
+                    failed.add(key)
+                    print(f"Error processing {pending[key][1]}: {e}")
+
+        save_manifest(manifest_path, manifest)
+
+    assignments = {
+        legacy_id: key
+        for legacy_id, key in assignments.items()
+        if key not in failed
+    }
+    write_update_sql(output_sql_file, assignments, manifest)
+
+    print(f"\nLogo ingestion completed:")
+    print(f"  Clients with logos: {len(assignments)}")
+    print(f"  Processed this run: {len(pending) - len(failed)}")
+    print(f"  Failed: {len(failed)}")
+    print(f"  Unresolved references: {missing_count}")
+    print(f"  Clients without logo: {unreferenced_count}")
+    print(f"  Update SQL: {output_sql_file}")
+
+    return assignments
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest legacy client logos into local storage')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--assets-dir', default=DEFAULT_ASSETS_DIR, help='directory holding exported logo files')
+    parser.add_argument('--storage-dir', default=DEFAULT_STORAGE_DIR, help='local stand-in for the documents bucket')
+    parser.add_argument('--output-sql', default=DEFAULT_OUTPUT_SQL, help='where to write the UPDATE script')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in THUMBNAIL_SIZES),
+                        help='comma separated thumbnail bounding boxes in pixels')
+    parser.add_argument('--workers', type=int, default=None, help='thumbnail worker processes')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    ingest_logos(args.csv, args.assets_dir, args.storage_dir, args.output_sql, sizes, args.workers)
+
+
+if __name__ == "__main__":
+    main()
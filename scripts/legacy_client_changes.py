@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Consumers of the legacy clients change feed
+Every insert, update, deactivation and delete on public.legacy_clients is
+appended to public.legacy_client_changes with an increasing seq (triggers
+from migration 20261018_150000; the swap import records its own diff).
+A consumer keeps its position in public.legacy_client_change_cursors and
+reads only the changes after it, so its cost follows the size of the change
+set instead of the table:
+
+    consume('search_index', handler)    handler(changes) per batch, cursor
+                                        advanced after each batch returns
+    read --consumer x --output f.ndjson changes after the cursor as NDJSON,
+                                        --ack to advance the cursor too
+
+A consumer writing to the same database should apply a batch and call
+ack_changes() in one transaction (legacy_clients_contacts.py sync does), so
+the cursor never gets ahead of or behind its own data. A 'truncate' change
+means the table was emptied: the consumer has to rebuild from scratch.
+
+Usage:
+  legacy_client_changes.py status
+  legacy_client_changes.py read --consumer search_index [--output changes.ndjson] [--ack]
+  legacy_client_changes.py register --consumer search_index [--from-now]
+  legacy_client_changes.py prune [--keep-days 30]
+"""
+import argparse
+import json
+import sys
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION
+
+CHANGES_TABLE = 'public.legacy_client_changes'
+CURSORS_TABLE = 'public.legacy_client_change_cursors'
+SEQ_SEQUENCE = 'public.legacy_client_changes_seq_seq'
+CHANGE_COLUMNS = ['seq', 'legacy_client_id', 'operation', 'changed_columns', 'row_data', 'source', 'changed_at']
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_KEEP_DAYS = 30
+
+
+def set_change_source(cursor, source):
+    """Label the changes this connection makes to legacy_clients (e.g. 'direct_psql:merge')"""
+    cursor.execute("SELECT set_config('legacy_clients.change_source', %s, false)", (source,))
+
+
+def read_changes(cursor, consumer, limit=DEFAULT_BATCH_SIZE):
+    """Changes after the consumer's cursor as dicts, oldest first"""
+    cursor.execute(
+        f"SELECT {', '.join(CHANGE_COLUMNS)} FROM public.read_legacy_client_changes(%s, %s)",
+        (consumer, limit)
+    )
+    return [dict(zip(CHANGE_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def ack_changes(cursor, consumer, seq):
+    """Advance the consumer's cursor to seq (never backwards); returns the stored position"""
+    cursor.execute("SELECT public.ack_legacy_client_changes(%s, %s)", (consumer, seq))
+    return cursor.fetchone()[0]
+
+
+def latest_seq(cursor):
+    """Highest seq handed out so far (from the sequence: pruning may have emptied the table)"""
+    cursor.execute(f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {SEQ_SEQUENCE}")
+    return cursor.fetchone()[0]
+
+
+def consume(consumer, handler, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """Feed every pending change to handler(changes) in batches; returns the number of changes handled
+
+    The cursor moves after each batch the handler returns from, so a crash
+    replays at most the batch in progress (at-least-once delivery).
+    """
+    conn = psycopg2.connect(**DB_CONNECTION)
+    cursor = conn.cursor()
+    handled = 0
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            changes = read_changes(cursor, consumer, batch_size)
+            conn.commit()
+            if not changes:
+                break
+            handler(changes)
+            ack_changes(cursor, consumer, changes[-1]['seq'])
+            conn.commit()
+            handled += len(changes)
+            batches += 1
+        return handled
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def change_record(change):
+    """JSON-ready form of a change (NDJSON export)"""
+    return dict(change, changed_at=change['changed_at'].isoformat())
+
+
+def write_ndjson(changes, output):
+    for change in changes:
+        output.write(json.dumps(change_record(change), ensure_ascii=False, default=str) + "\n")
+
+
+def feed_status(cursor):
+    """(latest seq, retained changes, [(consumer, last_seq, lag, updated_at)])"""
+    latest = latest_seq(cursor)
+    cursor.execute(f"SELECT COUNT(*) FROM {CHANGES_TABLE}")
+    retained = cursor.fetchone()[0]
+    cursor.execute(
+        f"""
+        SELECT c.consumer, c.last_seq,
+               (SELECT COUNT(*) FROM {CHANGES_TABLE} AS ch WHERE ch.seq > c.last_seq),
+               c.updated_at
+        FROM {CURSORS_TABLE} AS c
+        ORDER BY c.consumer
+        """
+    )
+    return latest, retained, cursor.fetchall()
+
+
+def prune_changes(cursor, keep_days=DEFAULT_KEEP_DAYS):
+    """Delete changes every registered consumer has processed and that are older than keep_days"""
+    cursor.execute(
+        f"""
+        DELETE FROM {CHANGES_TABLE}
+        WHERE seq <= (SELECT COALESCE(MIN(last_seq), 0) FROM {CURSORS_TABLE})
+          AND changed_at < NOW() - make_interval(days => %s)
+        """,
+        (keep_days,)
+    )
+    return cursor.rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Legacy clients change feed: read, acknowledge and prune')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help='latest seq and each consumer\'s position and lag')
+
+    read_parser = subparsers.add_parser('read', help='changes after a consumer\'s cursor')
+    read_parser.add_argument('--consumer', required=True)
+    read_parser.add_argument('--limit', type=int, default=DEFAULT_BATCH_SIZE)
+    read_parser.add_argument('--output', default='-', help='NDJSON file to write (default: stdout)')
+    read_parser.add_argument('--ack', action='store_true', help='advance the cursor past the changes written')
+
+    register_parser = subparsers.add_parser('register', help='create a consumer cursor')
+    register_parser.add_argument('--consumer', required=True)
+    register_parser.add_argument('--from-now', action='store_true',
+                                 help='start after the latest change (after a full rescan) instead of the oldest')
+
+    prune_parser = subparsers.add_parser('prune', help='delete changes every consumer has processed')
+    prune_parser.add_argument('--keep-days', type=int, default=DEFAULT_KEEP_DAYS,
+                              help='keep processed changes this many days')
+
+    args = parser.parse_args()
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}", file=sys.stderr)
+        sys.exit(2)
+    db_cursor = conn.cursor()
+
+    try:
+        if args.command == 'status':
+            latest, retained, consumers = feed_status(db_cursor)
+            print(f"\n=== Legacy Client Change Feed ===")
+            print(f"📊 Latest seq: {latest} ({retained} changes retained)")
+            for consumer, last_seq, lag, updated_at in consumers:
+                print(f"   {consumer:<28} at {last_seq:>10}  lag {lag:>8}  ({updated_at:%Y-%m-%d %H:%M})")
+            if not consumers:
+                print("   no consumers registered")
+        elif args.command == 'read':
+            pending = read_changes(db_cursor, args.consumer, args.limit)
+            if args.output == '-':
+                write_ndjson(pending, sys.stdout)
+            else:
+                with open(args.output, 'w', encoding='utf-8') as ndjson_file:
+                    write_ndjson(pending, ndjson_file)
+            acked = ''
+            if args.ack and pending:
+                acked = f" (cursor now {ack_changes(db_cursor, args.consumer, pending[-1]['seq'])})"
+            conn.commit()
+            print(f"📤 {len(pending)} changes for {args.consumer}{acked}", file=sys.stderr)
+        elif args.command == 'register':
+            position = ack_changes(db_cursor, args.consumer, latest_seq(db_cursor) if args.from_now else 0)
+            conn.commit()
+            print(f"✅ {args.consumer} at seq {position}")
+        else:
+            pruned = prune_changes(db_cursor, args.keep_days)
+            conn.commit()
+            print(f"🧹 Pruned {pruned} processed changes")
+    finally:
+        db_cursor.close()
+        conn.close()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Compact columnar batches of converted legacy client rows
+A list of 32-tuples costs a tuple header, 32 pointers and a fresh str or int
+object per cell. RowBatch keeps one column object per legacy_clients column
+instead:
+
+    integer  array('q'), NULL stored as NULL_INTEGER
+    boolean  array('b'), 1 / 0 / -1 for NULL
+    text     UTF-8 bytes of every row in one bytearray plus an array('i') of
+             end offsets, so a cell costs its bytes and 4 more instead of a
+             str object; the small vocabularies in DICTIONARY_COLUMNS (cidade,
+             uf, pessoa, grupo1 ...) store each distinct value once and an
+             array('H') code per row (array('I') past 65535)
+
+Iterating a batch yields the same tuples as convert_row(), in COLUMN_NAMES
+order and built on the fly, so copy_rows(), sql_literal() rendering and
+contact extraction take a batch as they take a list of rows. Batches pickle
+as their arrays and buffers, for worker results and pipeline artifacts.
+
+Usage:
+  legacy_clients_batch.py [--csv clients.csv] [--copies 20]
+"""
+import argparse
+import pickle
+import sys
+import time
+import tracemalloc
+from array import array
+from itertools import islice
+
+from legacy_clients_common import COLUMN_NAMES, DEFAULT_CSV_FILE, LEGACY_CLIENT_COLUMNS, convert_row, read_csv_rows
+
+DICTIONARY_COLUMNS = frozenset(('bairro', 'cidade', 'pais', 'uf', 'pessoa', 'grupo1', 'grupo2'))
+NULL_INTEGER = -2 ** 63
+NULL_BOOLEAN = -1
+PICKLE_PROTOCOL = 4
+EXTEND_CHUNK_ROWS = 1024
+
+
+class IntegerColumn:
+    """Nullable 64-bit integers"""
+    __slots__ = ('values',)
+
+    def __init__(self, values=None):
+        self.values = array('q') if values is None else values
+
+    def append(self, value):
+        self.values.append(NULL_INTEGER if value is None else value)
+
+    def extend(self, values):
+        self.values.extend([NULL_INTEGER if value is None else value for value in values])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        value = self.values[index]
+        return None if value == NULL_INTEGER else value
+
+    def __iter__(self):
+        for value in self.values:
+            yield None if value == NULL_INTEGER else value
+
+    def take(self, indices):
+        values = self.values
+        return IntegerColumn(array('q', [values[i] for i in indices]))
+
+    def nbytes(self):
+        return sys.getsizeof(self.values)
+
+
+class BooleanColumn:
+    """Nullable booleans, one byte each"""
+    __slots__ = ('values',)
+    DECODE = {1: True, 0: False, NULL_BOOLEAN: None}
+
+    def __init__(self, values=None):
+        self.values = array('b') if values is None else values
+
+    def append(self, value):
+        self.values.append(NULL_BOOLEAN if value is None else int(value))
+
+    def extend(self, values):
+        self.values.extend([NULL_BOOLEAN if value is None else int(value) for value in values])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.DECODE[self.values[index]]
+
+    def __iter__(self):
+        return map(self.DECODE.__getitem__, self.values)
+
+    def take(self, indices):
+        values = self.values
+        return BooleanColumn(array('b', [values[i] for i in indices]))
+
+    def nbytes(self):
+        return sys.getsizeof(self.values)
+
+
+class DictionaryColumn:
+    """Nullable text from a small vocabulary: distinct values once, a code per row (0 is NULL)"""
+    __slots__ = ('dictionary', 'codes', 'lookup')
+
+    def __init__(self, dictionary=None, codes=None):
+        self.dictionary = [None] if dictionary is None else dictionary
+        self.codes = array('H') if codes is None else codes
+        self.lookup = {value: code for code, value in enumerate(self.dictionary)}
+
+    def __getstate__(self):
+        # lookup is rebuilt on load, no need to pickle every value twice
+        return self.dictionary, self.codes
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def append(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        lookup = self.lookup
+        codes = [lookup[value] if value in lookup else self.add(value) for value in values]
+        if self.codes.typecode == 'H' and len(self.dictionary) > 0x10000:
+            self.codes = array('I', self.codes)
+        self.codes.extend(codes)
+
+    def add(self, value):
+        code = self.lookup[value] = len(self.dictionary)
+        self.dictionary.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.dictionary[self.codes[index]]
+
+    def __iter__(self):
+        return map(self.dictionary.__getitem__, self.codes)
+
+    def take(self, indices):
+        codes = self.codes
+        return DictionaryColumn(list(self.dictionary), array(codes.typecode, [codes[i] for i in indices]))
+
+    def nbytes(self):
+        return (sys.getsizeof(self.codes) + sys.getsizeof(self.dictionary) + sys.getsizeof(self.lookup)
+                + sum(sys.getsizeof(value) for value in self.dictionary if value is not None))
+
+
+class TextColumn:
+    """Nullable free text: UTF-8 bytes in one buffer and each row's end offset (bitwise not for NULL)"""
+    __slots__ = ('data', 'ends')
+
+    def __init__(self, data=None, ends=None):
+        self.data = bytearray() if data is None else data
+        self.ends = array('i') if ends is None else ends
+
+    def append(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        data = self.data
+        ends = []
+        for value in values:
+            if value is None:
+                ends.append(~len(data))
+            else:
+                data += value.encode('utf-8')
+                ends.append(len(data))
+        if self.ends.typecode == 'i' and len(data) > 0x7FFFFFFF:
+            self.ends = array('q', self.ends)
+        self.ends.extend(ends)
+
+    def span(self, index):
+        """(start, end) of a row's bytes, end None for NULL"""
+        end = self.ends[index]
+        previous = self.ends[index - 1] if index else 0
+        start = ~previous if previous < 0 else previous
+        return start, (None if end < 0 else end)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, index):
+        start, end = self.span(index)
+        return None if end is None else self.data[start:end].decode('utf-8')
+
+    def __iter__(self):
+        data = self.data
+        start = 0
+        for end in self.ends:
+            if end < 0:
+                yield None
+                start = ~end
+            else:
+                yield data[start:end].decode('utf-8')
+                start = end
+
+    def take(self, indices):
+        data, ends, source = bytearray(), array(self.ends.typecode), self.data
+        for index in indices:
+            start, end = self.span(index)
+            if end is None:
+                ends.append(~len(data))
+            else:
+                data += source[start:end]
+                ends.append(len(data))
+        return TextColumn(data, ends)
+
+    def nbytes(self):
+        return sys.getsizeof(self.data) + sys.getsizeof(self.ends)
+
+
+def new_column(column, kind):
+    """Empty column object for one legacy_clients column"""
+    if kind == 'integer':
+        return IntegerColumn()
+    if kind == 'boolean':
+        return BooleanColumn()
+    return DictionaryColumn() if column in DICTIONARY_COLUMNS else TextColumn()
+
+
+class RowBatch:
+    """Converted legacy_clients rows stored column by column; iterates as convert_row() tuples"""
+    __slots__ = ('columns',)
+
+    def __init__(self, rows=(), columns=None):
+        self.columns = columns if columns is not None else [
+            new_column(column, kind) for _, column, kind in LEGACY_CLIENT_COLUMNS
+        ]
+        self.extend(rows)
+
+    def append(self, row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+
+    def extend(self, rows, chunk_size=EXTEND_CHUNK_ROWS):
+        """Append rows, transposing them a chunk at a time so each column loads in bulk"""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            for column, values in zip(self.columns, zip(*chunk)):
+                column.extend(values)
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __iter__(self):
+        return zip(*self.columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.take(range(*index.indices(len(self)))))
+        if index < 0:
+            index += len(self)
+        return tuple(column[index] for column in self.columns)
+
+    def column(self, name):
+        """Values of one column, without building rows"""
+        return iter(self.columns[COLUMN_NAMES.index(name)])
+
+    def legacy_ids(self):
+        return self.column('legacy_client_id')
+
+    def take(self, indices):
+        """New batch with the rows at these positions, in this order"""
+        indices = indices if isinstance(indices, (list, range)) else list(indices)
+        return RowBatch(columns=[column.take(indices) for column in self.columns])
+
+    def sorted(self, key=None, column='legacy_client_id'):
+        """New batch sorted (stably) by key(value) of one column; only that column is decoded"""
+        values = list(self.column(column))
+        return self.take(sorted(range(len(values)), key=values.__getitem__ if key is None
+                                else lambda index: key(values[index])))
+
+    def keep_last_per_id(self):
+        """Keep only the last row of each legacy id, in first-seen order, dropping rows without id
+
+        Compacts in place one column at a time, so the peak is the batch plus
+        one column rather than two batches. Returns (duplicates, skipped).
+        """
+        positions = {}
+        skipped = 0
+        for index, legacy_id in enumerate(self.legacy_ids()):
+            if legacy_id is None:
+                skipped += 1
+            else:
+                positions[legacy_id] = index
+        duplicates = len(self) - skipped - len(positions)
+        if duplicates or skipped:
+            indices = list(positions.values())
+            positions = None
+            for position, column in enumerate(self.columns):
+                self.columns[position] = column.take(indices)
+        return duplicates, skipped
+
+    def nbytes(self):
+        """Approximate heap size of the batch"""
+        return sys.getsizeof(self.columns) + sum(column.nbytes() for column in self.columns)
+
+
+def measure(build):
+    """(result, peak traced bytes, seconds) of build()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def compare_with_tuples(csv_file_path, copies):
+    """Peak memory and pickle size of the CSV held as tuples and as a RowBatch"""
+    source = [convert_row(row) for row in read_csv_rows(csv_file_path)]
+
+    def rows():
+        # each copy gets fresh ids and fresh strings, as a larger export would
+        offset = 0
+        for _ in range(copies):
+            for row in source:
+                yield (None if row[0] is None else row[0] + offset,) + tuple(
+                    None if value is None else (''.join(value) if isinstance(value, str) else value)
+                    for value in row[1:]
+                )
+            offset += 10 ** 7
+
+    tuples, tuple_peak, tuple_elapsed = measure(lambda: list(rows()))
+    tuple_pickle = len(pickle.dumps(tuples, protocol=PICKLE_PROTOCOL))
+    del tuples
+    batch, batch_peak, batch_elapsed = measure(lambda: RowBatch(rows()))
+    batch_pickle = len(pickle.dumps(batch, protocol=PICKLE_PROTOCOL))
+
+    identical = all(left == right for left, right in zip(batch, rows()))
+    print(f"\n=== Row Batch Comparison ({len(batch)} rows) ===")
+    print(f"📊 Tuples:    peak {tuple_peak / 1048576:7.1f} MiB, pickle {tuple_pickle / 1048576:6.1f} MiB, "
+          f"{tuple_elapsed:.2f}s")
+    print(f"📊 RowBatch:  peak {batch_peak / 1048576:7.1f} MiB, pickle {batch_pickle / 1048576:6.1f} MiB, "
+          f"{batch_elapsed:.2f}s")
+    print(f"📉 RowBatch vs tuples: peak x{batch_peak / max(tuple_peak, 1):.2f}, "
+          f"pickle x{batch_pickle / max(tuple_pickle, 1):.2f}, build time x{batch_elapsed / max(tuple_elapsed, 1e-9):.2f}")
+    for (_, name, _), column in sorted(zip(LEGACY_CLIENT_COLUMNS, batch.columns), key=lambda item: -item[1].nbytes())[:8]:
+        print(f"   {name:20} {type(column).__name__:17} {column.nbytes() / 1048576:6.1f} MiB")
+    print("✅ Rows identical" if identical else "❌ Rows differ")
+    return identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare tuple rows and columnar RowBatch memory on the legacy clients CSV')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--copies', type=int, default=20, help='repeat the CSV this many times (with new ids)')
+    args = parser.parse_args()
+
+    sys.exit(0 if compare_with_tuples(args.csv, args.copies) else 1)
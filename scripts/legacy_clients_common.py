@@ -0,0 +1,175 @@
+"""
+Shared helpers for the legacy clients import scripts
+Column mapping, value parsing and default paths used by every import stage
+"""
+import csv
+import hashlib
+import os
+import re
+import tempfile
+import unicodedata
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPTS_DIR)
+SUPABASE_DIR = os.path.join(REPO_ROOT, 'supabase')
+DEFAULT_CSV_FILE = os.path.join(SUPABASE_DIR, 'clients.csv')
+COPY_BUFFER_BYTES = 8 * 1024 * 1024
+
+# Database connection details from Supabase startup (overridable via libpq env vars)
+DB_CONNECTION = {
+    'host': os.getenv('PGHOST', '127.0.0.1'),
+    'port': os.getenv('PGPORT', '54322'),
+    'database': os.getenv('PGDATABASE', 'postgres'),
+    'user': os.getenv('PGUSER', 'postgres'),
+    'password': os.getenv('PGPASSWORD', 'postgres')
+}
+
+# CSV header -> legacy_clients column -> value type, in INSERT order
+LEGACY_CLIENT_COLUMNS = [
+    ('idCLIENTES', 'legacy_client_id', 'integer'),
+    ('DESCRICAO', 'descricao', 'text'),
+    ('DESCRICAOFANTASIA', 'descricao_fantasia', 'text'),
+    ('ENDERECO', 'endereco', 'text'),
+    ('NUMERO', 'numero', 'text'),
+    ('COMPLEMENTO', 'complemento', 'text'),
+    ('BAIRRO', 'bairro', 'text'),
+    ('CIDADE', 'cidade', 'text'),
+    ('PAIS', 'pais', 'text'),
+    ('UF', 'uf', 'text'),
+    ('CEP', 'cep', 'text'),
+    ('TELEFONE1', 'telefone1', 'text'),
+    ('TELEFONE2', 'telefone2', 'text'),
+    ('TELEFONE3', 'telefone3', 'text'),
+    ('TELEFONE4', 'telefone4', 'text'),
+    ('EMAIL', 'email', 'text'),
+    ('EMAILCONTRATOS', 'email_contratos', 'text'),
+    ('PESSOA', 'pessoa', 'text'),
+    ('GRUPO1', 'grupo1', 'text'),
+    ('GRUPO2', 'grupo2', 'text'),
+    ('REFERENCIAS', 'referencias', 'text'),
+    ('OBS', 'obs', 'text'),
+    ('DOCUMENTO1', 'documento1', 'text'),
+    ('DOCUMENTO2', 'documento2', 'text'),
+    ('DOCUMENTO3', 'documento3', 'text'),
+    ('ATIVO', 'ativo', 'boolean'),
+    ('IDUSUARIO', 'id_usuario', 'integer'),
+    ('IDUSUARIOULTIMO', 'id_usuario_ultimo', 'integer'),
+    ('LOGO', 'logo', 'text'),
+    ('LOGOALTURA', 'logo_altura', 'integer'),
+    ('LOGOLARGURA', 'logo_largura', 'integer'),
+    ('AUTOSIZE', 'auto_size', 'boolean')
+]
+
+COLUMN_NAMES = [column for _, column, _ in LEGACY_CLIENT_COLUMNS]
+
+SQL_TYPES = {
+    'text': 'TEXT',
+    'integer': 'INTEGER',
+    'boolean': 'BOOLEAN'
+}
+
+INSERT_COLUMNS_SQL = """legacy_client_id, descricao, descricao_fantasia, endereco, numero, complemento,
+    bairro, cidade, pais, uf, cep, telefone1, telefone2, telefone3, telefone4,
+    email, email_contratos, pessoa, grupo1, grupo2, referencias, obs,
+    documento1, documento2, documento3, ativo, id_usuario, id_usuario_ultimo,
+    logo, logo_altura, logo_largura, auto_size"""
+
+
+def clean_value(value):
+    """Clean and normalize CSV values"""
+    if not value or value.strip() == '':
+        return None
+    return value.strip()
+
+
+def parse_boolean(value):
+    """Convert string boolean to Python boolean"""
+    if not value or value.strip() == '':
+        return None
+    return value.upper() == 'T'
+
+
+def parse_integer(value):
+    """Convert string to integer, handling empty values"""
+    if not value or value.strip() == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+PARSERS = {
+    'text': clean_value,
+    'integer': parse_integer,
+    'boolean': parse_boolean
+}
+
+
+def convert_row(row):
+    """Convert a CSV dict row into a legacy_clients tuple in COLUMN_NAMES order"""
+    return tuple(PARSERS[kind](row.get(field)) for field, _, kind in LEGACY_CLIENT_COLUMNS)
+
+
+def read_csv_rows(csv_file_path):
+    """Yield raw CSV dict rows from the legacy clients export"""
+    with open(csv_file_path, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield row
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, streamed"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fold_text(value):
+    """Accent-fold, lowercase and collapse punctuation/whitespace for matching ('São  Gotardo' -> 'sao gotardo')"""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return re.sub(r'[^a-z0-9]+', ' ', stripped.lower()).strip()
+
+
+def column_definitions_sql():
+    """Column list for a bare staging copy of legacy_clients (no id, defaults or constraints)"""
+    return ',\n    '.join(f"{column} {SQL_TYPES[kind]}" for _, column, kind in LEGACY_CLIENT_COLUMNS)
+
+
+def copy_rows(cursor, table_name, rows, columns=COLUMN_NAMES):
+    """Stream converted row tuples into a table with COPY ... FROM STDIN
+
+    The CSV text is buffered in memory up to COPY_BUFFER_BYTES and spills to a
+    temp file beyond that, so rows can come from a lazy stream of any size.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=COPY_BUFFER_BYTES, mode='w+', encoding='utf-8',
+                                       newline='') as buffer:
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    return count
+
+
+def sql_literal(value):
+    """Render a converted Python value as a SQL literal"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    escaped = str(value).replace("'", "''")
+    return f"'{escaped}'"
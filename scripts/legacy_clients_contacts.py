@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Normalized email / phone reverse lookup for legacy clients
+Splits EMAIL and EMAILCONTRATOS (often several addresses in one field, mixed
+with notes) and TELEFONE1..4 (free formats such as '(35)3212-6334' or
+'34 3671-2612') into rows of public.legacy_client_contacts:
+
+    email   lowercased address
+    domain  the address's domain, except for free mail providers
+    phone   E.164 number; Brazilian numbers are validated against the area
+            code table, numbers without area code borrow the client's own
+
+The table is reloaded in bulk by build, which reads public.legacy_clients and
+writes the contacts (TRUNCATE + COPY) in the same snapshot in which it moves
+its change feed cursor, or kept current by sync, which re-extracts only the
+clients in the change feed since that cursor (consumer 'legacy_client_contacts',
+see legacy_client_changes.py). Resolving a contact is one probe of its primary
+key.
+
+Usage:
+  legacy_clients_contacts.py build
+  legacy_clients_contacts.py sync
+  legacy_clients_contacts.py lookup "(35) 3212-6334"
+  legacy_clients_contacts.py lookup vendas@example.com.br
+"""
+import argparse
+import re
+import time
+
+import psycopg2
+
+from legacy_clients_common import COLUMN_NAMES, DB_CONNECTION, copy_rows
+from legacy_client_changes import CURSORS_TABLE, ack_changes, latest_seq, read_changes
+
+CONTACTS_TABLE = 'public.legacy_client_contacts'
+CHANGES_CONSUMER = 'legacy_client_contacts'
+SYNC_BATCH_SIZE = 5000
+BUILD_FETCH_SIZE = 10000
+CONTACT_COLUMNS = ['kind', 'value', 'legacy_client_id', 'source_column']
+EMAIL_COLUMNS = ['email', 'email_contratos']
+PHONE_COLUMNS = ['telefone1', 'telefone2', 'telefone3', 'telefone4']
+EMAIL_POSITIONS = [(COLUMN_NAMES.index(column), column) for column in EMAIL_COLUMNS]
+PHONE_POSITIONS = [(COLUMN_NAMES.index(column), column) for column in PHONE_COLUMNS]
+
+EMAIL_PATTERN = re.compile(r"[a-z0-9._%+'-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}\b")
+
+# Anatel DDD area codes
+BRAZIL_AREA_CODES = frozenset((
+    '11', '12', '13', '14', '15', '16', '17', '18', '19',
+    '21', '22', '24', '27', '28',
+    '31', '32', '33', '34', '35', '37', '38',
+    '41', '42', '43', '44', '45', '46', '47', '48', '49',
+    '51', '53', '54', '55',
+    '61', '62', '63', '64', '65', '66', '67', '68', '69',
+    '71', '73', '74', '75', '77', '79',
+    '81', '82', '83', '84', '85', '86', '87', '88', '89',
+    '91', '92', '93', '94', '95', '96', '97', '98', '99'
+))
+
+# A shared provider domain says nothing about which client wrote
+FREE_MAIL_DOMAINS = frozenset((
+    'gmail.com', 'googlemail.com', 'hotmail.com', 'hotmail.com.br', 'outlook.com', 'outlook.com.br',
+    'live.com', 'msn.com', 'yahoo.com', 'yahoo.com.br', 'icloud.com', 'uol.com.br', 'bol.com.br',
+    'terra.com.br', 'ig.com.br', 'globo.com', 'globomail.com', 'aol.com'
+))
+
+
+def normalize_emails(value):
+    """Lowercased addresses found in a free-text email field"""
+    if not value:
+        return []
+    return [address.strip('.') for address in EMAIL_PATTERN.findall(value.lower())]
+
+
+def email_domain(address):
+    """Domain of an address, or None for free mail providers"""
+    domain = address.rsplit('@', 1)[-1]
+    return None if domain in FREE_MAIL_DOMAINS else domain
+
+
+def normalize_phone(value, default_area_code=None):
+    """E.164 form of a phone number, or None when it cannot be read reliably
+
+    Brazilian numbers need 10 (landline) or 11 (mobile) national digits with a
+    known area code; 8 or 9 digit local numbers take default_area_code.
+    Pre-2016 8 digit mobiles (starting 6-9) get the leading 9 they have today.
+    Numbers written with + or 00 and another country code are kept as digits.
+    """
+    if not value:
+        return None
+    text = value.strip()
+    digits = re.sub(r'\D', '', text)
+    if text.startswith('+') or text.startswith('00'):
+        digits = digits[2:] if text.startswith('00') else digits
+        if not digits.startswith('55'):
+            return f"+{digits}" if 7 <= len(digits) <= 15 else None
+        digits = digits[2:]
+    else:
+        digits = digits.lstrip('0')
+
+    if len(digits) in (8, 9):
+        if not default_area_code:
+            return None
+        digits = default_area_code + digits
+    area_code, subscriber = digits[:2], digits[2:]
+    if area_code not in BRAZIL_AREA_CODES:
+        return None
+    if len(subscriber) == 8 and subscriber[0] in '6789':
+        subscriber = '9' + subscriber
+    if len(subscriber) == 9 and subscriber[0] != '9':
+        return None
+    if len(subscriber) not in (8, 9) or subscriber[0] in '01':
+        return None
+    return f"+55{area_code}{subscriber}"
+
+
+def contact_rows(row):
+    """(kind, value, legacy_client_id, source_column) rows of one converted legacy_clients tuple"""
+    legacy_id = row[0]
+    if legacy_id is None:
+        return
+    for position, column in EMAIL_POSITIONS:
+        for address in normalize_emails(row[position]):
+            yield 'email', address, legacy_id, column
+            domain = email_domain(address)
+            if domain:
+                yield 'domain', domain, legacy_id, column
+
+    # Numbers without area code usually sit next to one that has it
+    phones = [(row[position], column) for position, column in PHONE_POSITIONS if row[position]]
+    area_code = next((normalized[3:5] for normalized in (normalize_phone(value) for value, _ in phones)
+                      if normalized and normalized.startswith('+55')), None)
+    for value, column in phones:
+        normalized = normalize_phone(value, area_code)
+        if normalized:
+            yield 'phone', normalized, legacy_id, column
+
+
+def build_contacts(rows):
+    """Deduplicated contact rows (first source column wins) and per-kind counts"""
+    contacts = {}
+    for row in rows:
+        for kind, value, legacy_id, column in contact_rows(row):
+            contacts.setdefault((kind, value, legacy_id), column)
+    counts = {'email': 0, 'domain': 0, 'phone': 0}
+    for kind, _, _ in contacts:
+        counts[kind] += 1
+    return [key + (column,) for key, column in contacts.items()], counts
+
+
+def load_contacts():
+    """Rebuild legacy_client_contacts from public.legacy_clients; returns per-kind counts or None"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+    cursor = conn.cursor()
+    try:
+        # One snapshot for the rows read and the feed position acked: the rebuild covers
+        # exactly the changes up to that position, later ones are left to sync
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        position = latest_seq(cursor)
+        rows_cursor = conn.cursor(name='legacy_clients_contacts_build')
+        rows_cursor.itersize = BUILD_FETCH_SIZE
+        rows_cursor.execute(f"SELECT {', '.join(COLUMN_NAMES)} FROM public.legacy_clients")
+        contacts, counts = build_contacts(rows_cursor)
+        rows_cursor.close()
+
+        cursor.execute(f"TRUNCATE {CONTACTS_TABLE}")
+        copy_rows(cursor, CONTACTS_TABLE, contacts, CONTACT_COLUMNS)
+        ack_changes(cursor, CHANGES_CONSUMER, position)
+        conn.commit()
+        cursor.execute(f"ANALYZE {CONTACTS_TABLE}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error loading legacy client contacts, nothing was changed: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+    return counts
+
+
+def sync_contacts(batch_size=SYNC_BATCH_SIZE):
+    """Re-extract the contacts of clients changed since the last build or sync
+
+    Returns {'changes', 'clients', 'contacts'} counts, or None when a full build
+    is needed (no build yet, the table was truncated) or the sync failed.
+    Each batch of changes and the cursor move commit together.
+    """
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+    cursor = conn.cursor()
+    counts = {'changes': 0, 'clients': 0, 'contacts': 0}
+    try:
+        cursor.execute(f"SELECT 1 FROM {CURSORS_TABLE} WHERE consumer = %s", (CHANGES_CONSUMER,))
+        if cursor.fetchone() is None:
+            print("⚠️  legacy_client_contacts has never been built, run build first")
+            return None
+        while True:
+            changes = read_changes(cursor, CHANGES_CONSUMER, batch_size)
+            if not changes:
+                break
+            if any(change['operation'] == 'truncate' for change in changes):
+                print("⚠️  legacy_clients was truncated since the last sync, run build")
+                conn.rollback()
+                return None
+
+            # Last image of each client in the batch; deleted clients keep no contacts. An update
+            # that changes legacy_client_id is preceded by a 'delete' of the old id in the feed
+            latest = {}
+            for change in changes:
+                latest[change['legacy_client_id']] = change
+            rows = [tuple(change['row_data'].get(column) for column in COLUMN_NAMES)
+                    for change in latest.values() if change['operation'] != 'delete']
+            contacts, _ = build_contacts(rows)
+
+            cursor.execute(f"DELETE FROM {CONTACTS_TABLE} WHERE legacy_client_id = ANY(%s)", (list(latest),))
+            copy_rows(cursor, CONTACTS_TABLE, contacts, CONTACT_COLUMNS)
+            ack_changes(cursor, CHANGES_CONSUMER, changes[-1]['seq'])
+            conn.commit()
+            counts['changes'] += len(changes)
+            counts['clients'] += len(latest)
+            counts['contacts'] += len(contacts)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error syncing legacy client contacts, the failed batch was not applied: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+    return counts
+
+
+def detect_contact(value):
+    """(kind, normalized value) of a lookup input: an email, a domain or a phone number"""
+    text = value.strip().lower()
+    if '@' in text and not text.startswith('@'):
+        emails = normalize_emails(text)
+        return ('email', emails[0]) if emails else ('email', text)
+    if re.search(r'[a-z]', text):
+        return 'domain', re.sub(r'^(@|www\.)', '', text)
+    return 'phone', normalize_phone(text)
+
+
+def find_legacy_clients(value, kind=None):
+    """Legacy clients matching an email, domain or phone: [(legacy_client_id, descricao, source_column)]"""
+    if kind:
+        normalized = {'email': lambda v: (normalize_emails(v) or [v.strip().lower()])[0],
+                      'domain': lambda v: re.sub(r'^(@|www\.)', '', v.strip().lower()),
+                      'phone': normalize_phone}[kind](value)
+    else:
+        kind, normalized = detect_contact(value)
+    if not normalized:
+        return []
+
+    conn = psycopg2.connect(**DB_CONNECTION)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT c.legacy_client_id, lc.descricao, c.source_column FROM {CONTACTS_TABLE} AS c "
+            "LEFT JOIN public.legacy_clients AS lc ON lc.legacy_client_id = c.legacy_client_id "
+            "WHERE c.kind = %s AND c.value = %s ORDER BY c.legacy_client_id",
+            (kind, normalized)
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Normalized contact reverse lookup for legacy clients')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('build', help='reload legacy_client_contacts from public.legacy_clients')
+
+    subparsers.add_parser('sync', help='apply legacy_clients changes since the last build or sync')
+
+    lookup_parser = subparsers.add_parser('lookup', help='legacy clients with an email, domain or phone')
+    lookup_parser.add_argument('value')
+    lookup_parser.add_argument('--kind', choices=['email', 'domain', 'phone'], help='skip kind detection')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        contact_counts = load_contacts()
+        if contact_counts is None:
+            print("💥 Loading legacy client contacts failed!")
+        else:
+            print(f"\n=== Legacy Client Contacts Summary ===")
+            print(f"📧 Emails: {contact_counts['email']}")
+            print(f"🌐 Domains: {contact_counts['domain']}")
+            print(f"📞 Phones: {contact_counts['phone']}")
+            print(f"⏱️  {time.perf_counter() - started:.2f}s")
+            print("🎉 Legacy client contacts loaded successfully!")
+    elif args.command == 'sync':
+        started = time.perf_counter()
+        sync_counts = sync_contacts()
+        if sync_counts is None:
+            print("💥 Syncing legacy client contacts failed!")
+        else:
+            print(f"\n=== Legacy Client Contacts Sync ===")
+            print(f"🔄 Changes applied: {sync_counts['changes']} ({sync_counts['clients']} clients)")
+            print(f"📇 Contacts rewritten: {sync_counts['contacts']}")
+            print(f"⏱️  {time.perf_counter() - started:.2f}s")
+    else:
+        matches = find_legacy_clients(args.value, args.kind)
+        for legacy_id, name, source_column in matches:
+            print(f"{legacy_id}\t{name}\t({source_column})")
+        if not matches:
+            print("No legacy client found")
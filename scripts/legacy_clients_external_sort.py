@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+External merge sort of converted legacy client rows by legacy_client_id
+Rows are collected into runs of at most max_rows_in_memory, each run is
+sorted and spilled to a temp file, and the runs are streamed back through a
+k-way heapq.merge (in several passes when there are more runs than
+max_open_runs). Memory stays bounded by one run plus one row per open run,
+whatever the size of the export. The sort is stable, so among rows with the
+same id the last one in the CSV is still the last one out.
+"""
+import argparse
+import contextlib
+import csv
+import heapq
+import os
+import pickle
+import tempfile
+import time
+from itertools import islice
+
+from legacy_clients_batch import RowBatch
+from legacy_clients_common import COLUMN_NAMES, DEFAULT_CSV_FILE, SUPABASE_DIR, convert_row, read_csv_rows
+
+DEFAULT_MAX_ROWS_IN_MEMORY = 100000
+DEFAULT_MAX_OPEN_RUNS = 64
+PICKLE_PROTOCOL = 4
+DEFAULT_OUTPUT_CSV = os.path.join(SUPABASE_DIR, 'clients_sorted.csv')
+
+
+def legacy_id_order(legacy_id):
+    """Sort key of a legacy_client_id: ascending, missing ids last"""
+    return (legacy_id is None, legacy_id or 0)
+
+
+def legacy_id_key(row):
+    """Sort key for converted rows: by legacy_client_id, rows without an id last"""
+    return legacy_id_order(row[0])
+
+
+def write_run(rows, temp_dir):
+    """Spill one sorted run to disk, one pickle per row"""
+    handle, path = tempfile.mkstemp(prefix='run_', suffix='.pickle', dir=temp_dir)
+    with os.fdopen(handle, 'wb') as output:
+        for row in rows:
+            pickle.dump(row, output, protocol=PICKLE_PROTOCOL)
+    return path
+
+
+def read_run(path):
+    """Stream a spilled run back and delete it once exhausted"""
+    try:
+        with open(path, 'rb') as run:
+            while True:
+                try:
+                    yield pickle.load(run)
+                except EOFError:
+                    return
+    finally:
+        # the work directory may already be gone when a consumer stopped early
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+class ExternalSort:
+    """Sort an iterable of rows larger than memory; iterate the instance for sorted rows"""
+
+    def __init__(self, rows, max_rows_in_memory=DEFAULT_MAX_ROWS_IN_MEMORY,
+                 max_open_runs=DEFAULT_MAX_OPEN_RUNS, temp_dir=None):
+        self.rows = rows
+        self.max_rows_in_memory = max_rows_in_memory
+        self.max_open_runs = max(2, max_open_runs)
+        self.temp_dir = temp_dir
+        self.runs_spilled = 0
+        self.merge_passes = 0
+
+    def __iter__(self):
+        with tempfile.TemporaryDirectory(prefix='legacy_clients_sort_', dir=self.temp_dir) as work_dir:
+            runs = []
+            rows = iter(self.rows)
+            # Runs are held as columnar batches and sorted on their id column alone
+            buffer = RowBatch(islice(rows, self.max_rows_in_memory))
+            while len(buffer) == self.max_rows_in_memory:
+                runs.append(write_run(buffer.sorted(legacy_id_order), work_dir))
+                buffer = RowBatch(islice(rows, self.max_rows_in_memory))
+            buffer = buffer.sorted(legacy_id_order)
+            self.runs_spilled = len(runs)
+
+            if not runs:
+                yield from buffer
+                return
+            if len(buffer):
+                runs.append(write_run(buffer, work_dir))
+                buffer = None
+
+            # Merge in passes until one merge can read every remaining run at once;
+            # runs stay in input order so equal keys keep their original order
+            while len(runs) > self.max_open_runs:
+                self.merge_passes += 1
+                runs = [
+                    write_run(heapq.merge(*(read_run(path) for path in runs[i:i + self.max_open_runs]),
+                                          key=legacy_id_key), work_dir)
+                    for i in range(0, len(runs), self.max_open_runs)
+                ]
+            self.merge_passes += 1
+            yield from heapq.merge(*(read_run(path) for path in runs), key=legacy_id_key)
+
+
+def dedupe_sorted(rows, counts=None):
+    """Keep the last row of each run of equal legacy ids in an id-sorted stream; skips rows without an id
+
+    counts, when given, gets the number of 'duplicates' and 'skipped' rows
+    dropped (complete once the stream is exhausted).
+    """
+    counts = counts if counts is not None else {}
+    counts.setdefault('duplicates', 0)
+    counts.setdefault('skipped', 0)
+    previous = None
+    for row in rows:
+        if row[0] is None:
+            counts['skipped'] += 1
+            continue
+        if previous is not None:
+            if previous[0] != row[0]:
+                yield previous
+            else:
+                counts['duplicates'] += 1
+        previous = row
+    if previous is not None:
+        yield previous
+
+
+def read_sorted_rows(csv_file_path=DEFAULT_CSV_FILE, max_rows_in_memory=DEFAULT_MAX_ROWS_IN_MEMORY, dedupe=True):
+    """Converted legacy_clients tuples from the CSV in legacy_client_id order, in bounded memory"""
+    rows = ExternalSort((convert_row(row) for row in read_csv_rows(csv_file_path)),
+                        max_rows_in_memory=max_rows_in_memory)
+    return dedupe_sorted(rows) if dedupe else iter(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write the legacy clients CSV sorted by legacy_client_id')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_CSV,
+                        help='sorted CSV of converted rows with legacy_clients column names (COPY ready)')
+    parser.add_argument('--max-rows-in-memory', type=int, default=DEFAULT_MAX_ROWS_IN_MEMORY,
+                        help='rows per in-memory run before spilling to disk')
+    parser.add_argument('--max-open-runs', type=int, default=DEFAULT_MAX_OPEN_RUNS, help='merge fan-in')
+    parser.add_argument('--keep-duplicates', action='store_true', help='write every row instead of the last per id')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    sorter = ExternalSort((convert_row(row) for row in read_csv_rows(args.csv)),
+                          max_rows_in_memory=args.max_rows_in_memory, max_open_runs=args.max_open_runs)
+    count = 0
+    with open(args.output, 'w', encoding='utf-8', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(COLUMN_NAMES)
+        for sorted_row in (iter(sorter) if args.keep_duplicates else dedupe_sorted(sorter)):
+            writer.writerow(sorted_row)
+            count += 1
+
+    print(f"\n=== External Sort Summary ===")
+    print(f"📊 Rows written: {count}")
+    print(f"💾 Runs spilled: {sorter.runs_spilled}, merge passes: {sorter.merge_passes}")
+    print(f"⏱️  {time.perf_counter() - started:.2f}s")
+    print(f"✅ Wrote {args.output}")
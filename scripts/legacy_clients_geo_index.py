@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Geohash spatial index of legacy clients for route-proximity queries
+Buckets every geocoded legacy client into a geohash cell and saves the
+cell -> clients lookup as a JSON artifact, so "clients within X km of this
+point / itinerary" only looks at the few cells around the query instead of
+scanning every client.
+
+Usage:
+  legacy_clients_geo_index.py build [--from-csv]
+  legacy_clients_geo_index.py radius --lat -21.55 --lng -45.43 --km 30
+  legacy_clients_geo_index.py corridor --route="-21.55,-45.43;-18.94,-46.99" --km 15
+  legacy_clients_geo_index.py benchmark [--synthetic 100000]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+from legacy_clients_common import DB_CONNECTION, DEFAULT_CSV_FILE, SUPABASE_DIR
+
+DEFAULT_INDEX_FILE = os.path.join(SUPABASE_DIR, 'legacy_clients_geo_index.json')
+DEFAULT_PRECISION = 5  # ~4.9 km x 4.9 km cells
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LNG_EQUATOR = 111.320
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(lat, lng, precision=DEFAULT_PRECISION):
+    """Standard base32 geohash of a coordinate"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value_range, value = (lng_range, lng) if even else (lat_range, lat)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Height and width in degrees of a geohash cell at this precision"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def segment_scale_x(start, end):
+    """Km per degree of longitude of the projection a segment is measured on (at its mid-latitude)"""
+    return KM_PER_DEGREE_LNG_EQUATOR * math.cos(math.radians((start[0] + end[0]) / 2))
+
+
+def segment_distance_km(lat, lng, start, end):
+    """Distance from a point to a route segment, on a local equirectangular projection"""
+    scale_x = segment_scale_x(start, end)
+
+    def project(point_lat, point_lng):
+        return point_lng * scale_x, point_lat * KM_PER_DEGREE_LAT
+
+    px, py = project(lat, lng)
+    ax, ay = project(*start)
+    bx, by = project(*end)
+    dx, dy = bx - ax, by - ay
+    length_squared = dx * dx + dy * dy
+    t = 0.0 if length_squared == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_squared))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+class GeoIndex:
+    """Geohash cell -> [(legacy_client_id, lat, lng)] lookup with radius and corridor queries
+
+    The artifact is keyed by geohash so other tools can read it; in memory the
+    cells are keyed by their integer (row, column) on the same grid, which makes
+    covering a bounding box a pair of range loops instead of geohash encodes.
+    """
+
+    def __init__(self, cells, precision=DEFAULT_PRECISION):
+        self.cells = cells
+        self.precision = precision
+        self.cell_height, self.cell_width = cell_size(precision)
+        self.grid = {}
+        for entries in cells.values():
+            if entries:
+                _, lat, lng = entries[0]
+                self.grid[self._grid_key(lat, lng)] = entries
+
+    def _grid_key(self, lat, lng):
+        return int((lat + 90.0) // self.cell_height), int((lng + 180.0) // self.cell_width)
+
+    @classmethod
+    def build(cls, points, precision=DEFAULT_PRECISION):
+        """Bucket (legacy_client_id, lat, lng) points into cells"""
+        cells = {}
+        for legacy_id, lat, lng in points:
+            cells.setdefault(encode_geohash(lat, lng, precision), []).append((legacy_id, lat, lng))
+        return cls(cells, precision)
+
+    @classmethod
+    def load(cls, index_file=DEFAULT_INDEX_FILE):
+        with open(index_file, 'r', encoding='utf-8') as handle:
+            data = json.load(handle)
+        cells = {cell: [tuple(entry) for entry in entries] for cell, entries in data['cells'].items()}
+        return cls(cells, data['precision'])
+
+    def save(self, index_file=DEFAULT_INDEX_FILE):
+        data = {
+            'precision': self.precision,
+            'client_count': sum(len(entries) for entries in self.cells.values()),
+            'cells': {cell: self.cells[cell] for cell in sorted(self.cells)}
+        }
+        with open(index_file, 'w', encoding='utf-8') as handle:
+            json.dump(data, handle, separators=(',', ':'))
+
+    def _candidates_in_box(self, min_lat, min_lng, max_lat, max_lng):
+        """Clients in every cell overlapping a lat/lng bounding box"""
+        min_row, min_col = self._grid_key(min_lat, min_lng)
+        max_row, max_col = self._grid_key(max_lat, max_lng)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.grid):
+            # Box covers more cells than are occupied: walk the occupied ones
+            for (row, col), entries in self.grid.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    yield from entries
+            return
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                yield from self.grid.get((row, col), ())
+
+    def _box_around(self, lat, lng, km, scale_x=None):
+        """Bounding box of everything within km of a point: on the sphere, or on a segment's projection"""
+        d_lat = km / KM_PER_DEGREE_LAT
+        if scale_x is None:
+            # Widest longitude reach of a spherical cap; the cos at the centre alone
+            # under-pads because the cap bulges towards the pole
+            reach = math.sin(min(km / EARTH_RADIUS_KM, math.pi / 2)) / max(math.cos(math.radians(lat)), 1e-9)
+            d_lng = 180.0 if reach >= 1 else math.degrees(math.asin(reach))
+        else:
+            d_lng = km / max(scale_x, 1e-9)
+        return lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng
+
+    def within_radius(self, lat, lng, km):
+        """Clients within km of a point, nearest first: [(legacy_client_id, distance_km)]"""
+        matches = []
+        for legacy_id, point_lat, point_lng in self._candidates_in_box(*self._box_around(lat, lng, km)):
+            distance = haversine_km(lat, lng, point_lat, point_lng)
+            if distance <= km:
+                matches.append((legacy_id, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def along_route(self, route, km):
+        """Clients within km of a polyline [(lat, lng), ...]: [(legacy_client_id, distance_km)]"""
+        if len(route) == 1:
+            return self.within_radius(route[0][0], route[0][1], km)
+
+        best = {}
+        # Long legs are covered piecewise so each bounding box stays close to the corridor
+        max_step_km = max(km * 4, 1.0)
+        for start, end in zip(route, route[1:]):
+            # Boxes in the projection segment_distance_km measures on, so they cover its corridor exactly
+            scale_x = segment_scale_x(start, end)
+            steps = max(1, math.ceil(haversine_km(*start, *end) / max_step_km))
+            seen = set()
+            for step in range(steps):
+                a = (start[0] + (end[0] - start[0]) * step / steps, start[1] + (end[1] - start[1]) * step / steps)
+                b = (start[0] + (end[0] - start[0]) * (step + 1) / steps,
+                     start[1] + (end[1] - start[1]) * (step + 1) / steps)
+                box_a = self._box_around(*a, km, scale_x)
+                box_b = self._box_around(*b, km, scale_x)
+                candidates = self._candidates_in_box(
+                    min(box_a[0], box_b[0]), min(box_a[1], box_b[1]),
+                    max(box_a[2], box_b[2]), max(box_a[3], box_b[3])
+                )
+                for legacy_id, point_lat, point_lng in candidates:
+                    if legacy_id in seen:
+                        continue
+                    seen.add(legacy_id)
+                    distance = segment_distance_km(point_lat, point_lng, start, end)
+                    if distance <= km and distance < best.get(legacy_id, math.inf):
+                        best[legacy_id] = distance
+        return sorted(best.items(), key=lambda match: (match[1], match[0]))
+
+
+def brute_force_radius(points, lat, lng, km):
+    """Reference linear scan for within_radius"""
+    matches = [
+        (legacy_id, haversine_km(lat, lng, point_lat, point_lng))
+        for legacy_id, point_lat, point_lng in points
+    ]
+    return sorted([m for m in matches if m[1] <= km], key=lambda match: (match[1], match[0]))
+
+
+def brute_force_route(points, route, km):
+    """Reference linear scan for along_route"""
+    matches = []
+    for legacy_id, point_lat, point_lng in points:
+        distance = min(segment_distance_km(point_lat, point_lng, a, b) for a, b in zip(route, route[1:]))
+        if distance <= km:
+            matches.append((legacy_id, distance))
+    return sorted(matches, key=lambda match: (match[1], match[0]))
+
+
+def load_points_from_db():
+    """Geocoded legacy clients from the database"""
+    import psycopg2
+
+    conn = psycopg2.connect(**DB_CONNECTION)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT legacy_client_id, latitude, longitude
+            FROM public.legacy_clients
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def load_points_from_csv(csv_file=DEFAULT_CSV_FILE):
+    """Geocode the CSV on the fly with the offline geocoder"""
+    from geocode_legacy_clients import geocode_legacy_clients
+
+    results = geocode_legacy_clients(csv_file, os.devnull)
+    return [(legacy_id, lat, lng) for legacy_id, (lat, lng, _) in results.items()]
+
+
+def parse_route(route_text):
+    return [tuple(float(value) for value in point.split(',')) for point in route_text.split(';') if point.strip()]
+
+
+def synthetic_points(points, count, seed=42, spread_km=40.0):
+    """Jitter the real client locations into a larger synthetic population"""
+    rng = random.Random(seed)
+    synthetic = []
+    for legacy_id in range(1, count + 1):
+        _, lat, lng = rng.choice(points)
+        synthetic.append((
+            legacy_id,
+            lat + rng.gauss(0, spread_km / 2) / KM_PER_DEGREE_LAT,
+            lng + rng.gauss(0, spread_km / 2) / (KM_PER_DEGREE_LNG_EQUATOR * math.cos(math.radians(lat)))
+        ))
+    return synthetic
+
+
+def run_benchmark(points, index, queries=200, seed=42):
+    """Compare index queries against the linear scan on random points and routes"""
+    rng = random.Random(seed)
+    lats = [lat for _, lat, _ in points]
+    lngs = [lng for _, _, lng in points]
+    bounds = (min(lats), min(lngs), max(lats), max(lngs))
+
+    def random_point():
+        return rng.uniform(bounds[0], bounds[2]), rng.uniform(bounds[1], bounds[3])
+
+    radius_queries = [(*random_point(), rng.choice([5, 15, 30, 60])) for _ in range(queries)]
+    route_queries = [([random_point() for _ in range(rng.randint(2, 6))], rng.choice([5, 10, 20]))
+                     for _ in range(queries)]
+
+    def timed(function, items):
+        started = time.perf_counter()
+        results = [function(*item) for item in items]
+        return time.perf_counter() - started, results
+
+    index_radius_time, index_radius = timed(index.within_radius, radius_queries)
+    brute_radius_time, brute_radius = timed(lambda *q: brute_force_radius(points, *q), radius_queries)
+    index_route_time, index_route = timed(index.along_route, route_queries)
+    brute_route_time, brute_route = timed(lambda *q: brute_force_route(points, *q), route_queries)
+
+    def same(left, right):
+        return all([m[0] for m in a] == [m[0] for m in b] for a, b in zip(left, right))
+
+    print(f"Benchmark over {len(points)} clients, {queries} queries each:")
+    print(f"  radius:   index {index_radius_time * 1000:.1f} ms, brute force {brute_radius_time * 1000:.1f} ms "
+          f"({brute_radius_time / max(index_radius_time, 1e-9):.1f}x), results match: {same(index_radius, brute_radius)}")
+    print(f"  corridor: index {index_route_time * 1000:.1f} ms, brute force {brute_route_time * 1000:.1f} ms "
+          f"({brute_route_time / max(index_route_time, 1e-9):.1f}x), results match: {same(index_route, brute_route)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Geohash index of legacy clients for proximity queries')
+    parser.add_argument('--index-file', default=DEFAULT_INDEX_FILE, help='JSON artifact to write or read')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='build the index artifact')
+    build_parser.add_argument('--from-csv', action='store_true', help='geocode the CSV offline instead of reading the DB')
+    build_parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    build_parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION, help='geohash length')
+
+    radius_parser = subparsers.add_parser('radius', help='clients within km of a point')
+    radius_parser.add_argument('--lat', type=float, required=True)
+    radius_parser.add_argument('--lng', type=float, required=True)
+    radius_parser.add_argument('--km', type=float, required=True)
+
+    corridor_parser = subparsers.add_parser('corridor', help='clients within km of a route')
+    corridor_parser.add_argument('--route', required=True, help='"lat,lng;lat,lng;..."')
+    corridor_parser.add_argument('--km', type=float, required=True)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='compare index queries with a linear scan')
+    benchmark_parser.add_argument('--queries', type=int, default=200)
+    benchmark_parser.add_argument('--synthetic', type=int, default=0,
+                                  help='benchmark on this many clients jittered around the real ones')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        points = load_points_from_csv(args.csv) if args.from_csv else load_points_from_db()
+        index = GeoIndex.build(points, args.precision)
+        index.save(args.index_file)
+        print(f"Indexed {len(points)} clients into {len(index.cells)} cells: {args.index_file}")
+    elif args.command == 'radius':
+        for legacy_id, distance in GeoIndex.load(args.index_file).within_radius(args.lat, args.lng, args.km):
+            print(f"{legacy_id}\t{distance:.1f} km")
+    elif args.command == 'corridor':
+        for legacy_id, distance in GeoIndex.load(args.index_file).along_route(parse_route(args.route), args.km):
+            print(f"{legacy_id}\t{distance:.1f} km")
+    else:
+        index = GeoIndex.load(args.index_file)
+        points = [entry for entries in index.cells.values() for entry in entries]
+        if args.synthetic:
+            points = synthetic_points(points, args.synthetic)
+            index = GeoIndex.build(points, index.precision)
+        run_benchmark(points, index, args.queries)
@@ -0,0 +1,149 @@
+"""
+Secondary index management for full legacy_clients loads
+Drops the non-unique indexes before a bulk load and rebuilds them afterwards
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION, SUPABASE_DIR
+
+DEFAULT_RECOVERY_FILE = os.path.join(SUPABASE_DIR, 'legacy_clients_deferred_indexes.sql')
+
+INDEX_QUERY = """
+    SELECT
+        ic.relname AS index_name,
+        i.indisunique OR i.indisprimary AS is_unique,
+        i.indpred IS NOT NULL OR i.indexprs IS NOT NULL AS is_partial_or_expression,
+        am.amname AS access_method,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, position)
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            ORDER BY k.position
+        ) AS key_columns,
+        pg_get_indexdef(i.indexrelid) AS definition
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_class tc ON tc.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = tc.relnamespace
+    JOIN pg_am am ON am.oid = ic.relam
+    WHERE n.nspname = %s AND tc.relname = %s
+    ORDER BY ic.relname
+"""
+
+
+def find_secondary_indexes(cursor, table='legacy_clients', schema='public'):
+    """Return (secondary, redundant) index lists for a table
+
+    Secondary indexes are the non-unique ones that can be dropped for a load.
+    An index is redundant when a unique index or constraint already covers the
+    same leading columns with the same access method.
+    """
+    cursor.execute(INDEX_QUERY, (schema, table))
+    indexes = [
+        {
+            'name': name,
+            'unique': is_unique,
+            'plain': not is_partial_or_expression,
+            'method': method,
+            'columns': list(columns),
+            'definition': definition
+        }
+        for name, is_unique, is_partial_or_expression, method, columns, definition in cursor.fetchall()
+    ]
+
+    unique_indexes = [index for index in indexes if index['unique']]
+    secondary = []
+    redundant = []
+    for index in indexes:
+        if index['unique']:
+            continue
+        secondary.append(index)
+        if index['plain'] and any(
+            unique['method'] == index['method']
+            and unique['columns'][:len(index['columns'])] == index['columns']
+            for unique in unique_indexes
+        ):
+            redundant.append(index)
+
+    return secondary, redundant
+
+
+def write_recovery_file(indexes, recovery_file=DEFAULT_RECOVERY_FILE):
+    """Keep the dropped definitions on disk in case the load dies before the rebuild"""
+    with open(recovery_file, 'w', encoding='utf-8') as output:
+        output.write("-- Secondary indexes dropped for a full legacy_clients load\n")
+        output.write("-- Run this file if the load was interrupted before the rebuild\n\n")
+        for index in indexes:
+            output.write(index['definition'].replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1) + ";\n")
+    return recovery_file
+
+
+def drop_indexes(cursor, indexes, schema='public'):
+    """Drop the given secondary indexes (caller commits)"""
+    for index in indexes:
+        cursor.execute(f'DROP INDEX IF EXISTS {schema}."{index["name"]}"')
+
+
+def _build_index(index, concurrently, schema='public'):
+    """Build one index on its own autocommit connection"""
+    conn = psycopg2.connect(**DB_CONNECTION)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET maintenance_work_mem = '256MB'")
+        if not concurrently:
+            cursor.execute(index['definition'])
+            return
+        try:
+            cursor.execute(index['definition'].replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1))
+        except Exception:
+            # A failed concurrent build leaves an INVALID index behind under the same name
+            cursor.execute(f'DROP INDEX IF EXISTS {schema}."{index["name"]}"')
+            raise
+    finally:
+        conn.close()
+
+
+def rebuild_indexes(indexes, concurrently=True, workers=4):
+    """Recreate dropped indexes
+
+    CREATE INDEX CONCURRENTLY keeps the table writable but two concurrent
+    builds on the same table serialize on their lock, so those run one at a
+    time. Plain builds share their lock and run in parallel connections.
+    """
+    failed = []
+    if concurrently:
+        for index in indexes:
+            try:
+                _build_index(index, True)
+                print(f"  Rebuilt {index['name']} (concurrently)")
+            except Exception as e:
+                failed.append(index)
+                print(f"  Error rebuilding {index['name']}: {e}")
+        return failed
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(_build_index, index, False): index for index in indexes}
+        for future, index in futures.items():
+            try:
+                future.result()
+                print(f"  Rebuilt {index['name']}")
+            except Exception as e:
+                failed.append(index)
+                print(f"  Error rebuilding {index['name']}: {e}")
+    return failed
+
+
+def analyze_table(table='legacy_clients', schema='public'):
+    """Refresh planner statistics after a load"""
+    conn = psycopg2.connect(**DB_CONNECTION)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"ANALYZE {schema}.{table}")
+        cursor.close()
+    finally:
+        conn.close()
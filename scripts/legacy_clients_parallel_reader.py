@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Parallel chunked reader for the legacy clients CSV
+Memory-maps the export (.gz/.zst inputs are decompressed to a temp file
+first), splits it into chunks at record boundaries and parses + converts
+the chunks in a process pool. Boundaries are only placed on a newline that
+sits outside a quoted field, found by matching whole records with one
+regex per record instead of parsing, so embedded newlines in OBS/REFERENCIAS
+never split a record.
+
+Yields the same converted tuples as convert_row(read_csv_rows(...)), in file
+order unless preserve_order=False.
+"""
+import argparse
+import csv
+import gzip
+import io
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from legacy_clients_batch import RowBatch
+from legacy_clients_common import DEFAULT_CSV_FILE, convert_row, read_csv_rows
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+NEWLINE = b'\n'
+LINE_WITH_ID = re.compile(rb'\n(?=\d+,)')
+# One CSV record as the csv module reads it: a field starting with a quote
+# runs to the first undoubled quote (anything up to the next delimiter after
+# it is kept literally), any other field runs to the next delimiter, so the
+# stray quotes inside the binary LOGO dumps are literal
+FIELD_PATTERN = rb'(?:"[^"]*(?:""[^"]*)*"[^,\r\n]*|[^,\r\n"][^,\r\n]*|)'
+RECORD_PATTERN = re.compile(FIELD_PATTERN + rb'(?:,' + FIELD_PATTERN + rb')*(?:\r\n?|\n|\Z)')
+
+
+def decompress_to_file(csv_file_path, directory):
+    """Decompress a .gz/.zst export next to the other temp files so it can be memory-mapped like a plain CSV"""
+    target = os.path.join(directory, 'clients.csv')
+    if csv_file_path.endswith('.gz'):
+        with gzip.open(csv_file_path, 'rb') as source, open(target, 'wb') as output:
+            shutil.copyfileobj(source, output, COPY_BUFFER_SIZE)
+        return target
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Reading .zst exports needs the zstandard package (pip install zstandard)")
+    with open(csv_file_path, 'rb') as source, open(target, 'wb') as output:
+        zstandard.ZstdDecompressor().copy_stream(source, output)
+    return target
+
+
+def map_file(csv_file_path):
+    with open(csv_file_path, 'rb') as handle:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def record_end(buffer, start, position):
+    """
+    First offset > position that follows a newline ending a record, given that
+    start is the beginning of a record. Records are matched whole by
+    RECORD_PATTERN, so newlines inside quoted fields are skipped over.
+    """
+    size = len(buffer)
+    while start < size:
+        match = RECORD_PATTERN.match(buffer, start)
+        if match is None or match.end() == start:
+            # unterminated quote: the csv module reads it to the end of the file
+            return size
+        start = match.end()
+        if start > position and buffer[start - 1:start] == NEWLINE:
+            return start
+    return size
+
+
+def mapped_record_end(csv_file_path, start, position):
+    """Worker entry point: record_end over a fresh map of the file"""
+    with map_file(csv_file_path) as buffer:
+        return record_end(buffer, start, position)
+
+
+def guess_boundaries(buffer, first, chunk_size):
+    """
+    Cheap candidate record starts roughly chunk_size apart: a line starting
+    with a numeric idCLIENTES, or any line when none is near. Candidates can
+    be wrong (a line inside a quoted OBS may start with digits); they are
+    checked by find_chunk_boundaries.
+    """
+    size = len(buffer)
+    candidates = [first]
+    while candidates[-1] < size:
+        target = candidates[-1] + chunk_size
+        if target >= size:
+            break
+        match = LINE_WITH_ID.search(buffer, target, target + chunk_size)
+        newline = match.start() if match else buffer.find(NEWLINE, target)
+        if newline == -1:
+            break
+        candidates.append(newline + 1)
+    candidates.append(size)
+    return candidates
+
+
+def find_chunk_boundaries(csv_file_path, buffer, header_end, chunk_size, executor=None):
+    """
+    Exact record boundaries roughly chunk_size apart. Workers scan each
+    candidate chunk assuming its candidate start is right and report the true
+    end of the record around the next candidate; the parent walks the chunks
+    in order and rescans the rare chunk whose start turned out to be wrong.
+    Returns [(start, end), ...] covering everything after the header.
+    """
+    candidates = guess_boundaries(buffer, header_end, chunk_size)
+    pairs = list(zip(candidates[:-1], candidates[1:]))
+    if executor is None:
+        scanned = [record_end(buffer, start, end - 1) for start, end in pairs]
+    else:
+        scanned = list(executor.map(mapped_record_end, [csv_file_path] * len(pairs),
+                                    [start for start, _ in pairs], [end - 1 for _, end in pairs]))
+
+    spans = []
+    start = header_end
+    for (candidate_start, candidate_end), end in zip(pairs, scanned):
+        if candidate_end <= start:
+            continue
+        if candidate_start != start:
+            end = record_end(buffer, start, candidate_end - 1)
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def parse_chunk(data, header):
+    """Parse one chunk of whole records into a RowBatch of converted legacy_clients rows"""
+    # Same text layer as read_csv_rows (universal newlines), so embedded \r\n become \n there too
+    records = csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'))
+    return RowBatch(convert_row(dict(zip(header, record))) for record in records if record)
+
+
+def parse_mapped_chunk(csv_file_path, start, end, header):
+    """Worker entry point: map the file again instead of pickling the chunk"""
+    with map_file(csv_file_path) as buffer:
+        return parse_chunk(buffer[start:end], header)
+
+
+def read_rows_parallel(csv_file_path=DEFAULT_CSV_FILE, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                       preserve_order=True):
+    """Yield converted legacy_clients tuples, parsing chunks on several processes"""
+    with tempfile.TemporaryDirectory(prefix='legacy_clients_') as temp_dir:
+        if csv_file_path.endswith(('.gz', '.zst')):
+            csv_file_path = decompress_to_file(csv_file_path, temp_dir)
+        if os.path.getsize(csv_file_path) == 0:
+            return
+
+        with map_file(csv_file_path) as buffer:
+            header_end = record_end(buffer, 0, 0)
+            header = next(csv.reader(io.TextIOWrapper(io.BytesIO(buffer[:header_end]), encoding='utf-8')))
+
+            if workers == 1 or len(buffer) <= chunk_size:
+                spans = find_chunk_boundaries(csv_file_path, buffer, header_end, chunk_size)
+                for start, end in spans:
+                    yield from parse_chunk(buffer[start:end], header)
+                return
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                spans = find_chunk_boundaries(csv_file_path, buffer, header_end, chunk_size, executor)
+                futures = [executor.submit(parse_mapped_chunk, csv_file_path, start, end, header)
+                           for start, end in spans]
+                for future in (futures if preserve_order else as_completed(futures)):
+                    yield from future.result()
+
+
+def compare_with_sequential(csv_file_path, workers, chunk_size):
+    """Time the sequential and parallel readers and check they produce the same rows"""
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='legacy_clients_') as temp_dir:
+        plain_file = csv_file_path
+        if csv_file_path.endswith(('.gz', '.zst')):
+            plain_file = decompress_to_file(csv_file_path, temp_dir)
+        sequential = [convert_row(row) for row in read_csv_rows(plain_file)]
+    sequential_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parallel = list(read_rows_parallel(csv_file_path, workers, chunk_size))
+    parallel_elapsed = time.perf_counter() - started
+
+    print(f"\n=== Parallel Reader Comparison ===")
+    print(f"📊 Sequential: {len(sequential)} rows in {sequential_elapsed:.2f}s "
+          f"({len(sequential) / max(sequential_elapsed, 1e-9):,.0f} rows/s)")
+    print(f"📊 Parallel:   {len(parallel)} rows in {parallel_elapsed:.2f}s "
+          f"({len(parallel) / max(parallel_elapsed, 1e-9):,.0f} rows/s)")
+    if parallel == sequential:
+        print("✅ Rows identical")
+        return True
+    print("❌ Rows differ from the sequential reader")
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Parse the legacy clients CSV on several processes')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export (.csv, .csv.gz or .csv.zst)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='parser processes')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='target chunk size in bytes')
+    parser.add_argument('--compare', action='store_true', help='also run the sequential reader and check the output matches')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_with_sequential(args.csv, args.workers, args.chunk_size)
+    else:
+        started = time.perf_counter()
+        count = sum(1 for _ in read_rows_parallel(args.csv, args.workers, args.chunk_size, preserve_order=False))
+        elapsed = time.perf_counter() - started
+        print(f"Parsed {count} rows in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression checks for the legacy_clients access patterns
+Builds a synthetic copy of legacy_clients and companies in a scratch schema
+(tables created LIKE the real ones INCLUDING ALL, so they carry the current
+indexes, and the real companies_with_legacy view definition) at several
+sizes, then runs EXPLAIN (ANALYZE, BUFFERS) for the queries the admin pages
+issue: the order('legacy_client_id') + range listing, the three-column ilike
+search, the company_id lookup and the companies_with_legacy join.
+
+Each check asserts on plan shape (which relations must be read through an
+index, no sequential scan, no sort) and on execution time. Every run is
+appended to supabase/query_plans/history.jsonl and compared with earlier
+runs: a changed plan shape or an execution time well above the trailing
+median is flagged too. Exits non-zero when anything fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION, SUPABASE_DIR
+
+SCHEMA = 'plan_check'
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_OUTPUT_DIR = os.path.join(SUPABASE_DIR, 'query_plans')
+PAGE_LIMIT = 100
+REPEATS = 3
+HISTORY_WINDOW = 5
+SLOWDOWN_FACTOR = 2.0
+SLOWDOWN_MIN_MS = 1.0
+
+LISTING_COLUMNS = "id, legacy_client_id, descricao, descricao_fantasia, cidade, email, telefone1, ativo, company_id"
+
+# Mirrors the route: order('legacy_client_id') + range(from, to)
+LISTING_SQL = f"""
+    SELECT {LISTING_COLUMNS} FROM legacy_clients
+    ORDER BY legacy_client_id LIMIT {PAGE_LIMIT} OFFSET %(offset)s
+"""
+
+# Mirrors the route: .or('descricao.ilike.%s%,cidade.ilike.%s%,email.ilike.%s%')
+SEARCH_SQL = f"""
+    SELECT {LISTING_COLUMNS} FROM legacy_clients
+    WHERE descricao ILIKE %(pattern)s OR cidade ILIKE %(pattern)s OR email ILIKE %(pattern)s
+    ORDER BY legacy_client_id LIMIT {PAGE_LIMIT}
+"""
+
+COMPANY_LOOKUP_SQL = f"SELECT {LISTING_COLUMNS} FROM legacy_clients WHERE company_id = %(company_id)s"
+
+COMPANY_WITH_LEGACY_SQL = "SELECT * FROM companies_with_legacy WHERE id = %(company_id)s"
+
+COMPANIES_WITH_LEGACY_PAGE_SQL = f"SELECT * FROM companies_with_legacy ORDER BY id LIMIT {PAGE_LIMIT}"
+
+# index_on: relations that must be read through an index; no_seq_scan: relations
+# that must never be scanned sequentially; no_sort: the order must come from an index.
+# Shape and time assertions only apply from min_rows up, where the planner should
+# prefer indexes and fixed overheads no longer dominate; smaller tables are still
+# measured and recorded. The budget is base_ms + ms_per_10k_rows * rows / 10000.
+# No index can serve '%term%' without pg_trgm, and an OFFSET page costs a walk
+# over every skipped row whichever plan is chosen (a seq scan plus top-N sort
+# is legitimately cheaper for deep pages), so those checks have budgets only;
+# a change of their plan shape is still flagged against history.
+CHECKS = [
+    {'name': 'listing_first_page', 'sql': LISTING_SQL, 'params': lambda size, ids: {'offset': 0},
+     'index_on': ['legacy_clients'], 'no_seq_scan': ['legacy_clients'], 'no_sort': True,
+     'min_rows': 10000, 'base_ms': 5, 'ms_per_10k_rows': 0},
+    {'name': 'listing_deep_page', 'sql': LISTING_SQL,
+     'params': lambda size, ids: {'offset': max(0, size - PAGE_LIMIT)},
+     'min_rows': 10000, 'base_ms': 5, 'ms_per_10k_rows': 15},
+    {'name': 'search_many_matches', 'sql': SEARCH_SQL, 'params': lambda size, ids: {'pattern': '%cafe%'},
+     'min_rows': 10000, 'base_ms': 5, 'ms_per_10k_rows': 5},
+    {'name': 'search_no_match', 'sql': SEARCH_SQL, 'params': lambda size, ids: {'pattern': '%zzqq%'},
+     'min_rows': 10000, 'base_ms': 5, 'ms_per_10k_rows': 40},
+    {'name': 'company_id_lookup', 'sql': COMPANY_LOOKUP_SQL, 'params': lambda size, ids: {'company_id': ids[0]},
+     'index_on': ['legacy_clients'], 'no_seq_scan': ['legacy_clients'],
+     'min_rows': 10000, 'base_ms': 2, 'ms_per_10k_rows': 0},
+    {'name': 'companies_with_legacy_by_id', 'sql': COMPANY_WITH_LEGACY_SQL,
+     'params': lambda size, ids: {'company_id': ids[-1]},
+     'index_on': ['companies', 'legacy_clients'], 'no_seq_scan': ['companies', 'legacy_clients'],
+     'min_rows': 10000, 'base_ms': 2, 'ms_per_10k_rows': 0},
+    {'name': 'companies_with_legacy_page', 'sql': COMPANIES_WITH_LEGACY_PAGE_SQL, 'params': lambda size, ids: {},
+     'index_on': ['companies', 'legacy_clients'], 'no_seq_scan': ['legacy_clients'], 'no_sort': True,
+     'min_rows': 10000, 'base_ms': 5, 'ms_per_10k_rows': 0},
+]
+
+CITIES = ['Santos', 'Varginha', 'Guaxupé', 'São Paulo', 'Franca', 'Patrocínio', 'Três Pontas', 'Vitória',
+          'Manhuaçu', 'Londrina', 'Poços de Caldas', 'Campinas', 'Alfenas', 'Machado', 'Garça', 'Marília']
+NAME_WORDS = ['Café', 'Comercial', 'Exportadora', 'Fazenda', 'Agro', 'Cooperativa', 'Armazéns', 'Torrefação',
+              'Cafeeira', 'Grãos', 'Mineira', 'Paulista', 'Sul', 'Cerrado', 'Montanhas', 'Trading']
+
+SYNTHETIC_ROWS_SQL = """
+    INSERT INTO legacy_clients (legacy_client_id, descricao, descricao_fantasia, cidade, uf, pais, email,
+                                telefone1, grupo1, grupo2, pessoa, ativo)
+    SELECT i,
+           (%(words)s::text[])[1 + i %% 16] || ' ' || (%(words)s::text[])[1 + (i / 16) %% 16] || ' LTDA ' || i,
+           (%(words)s::text[])[1 + (i / 7) %% 16] || ' ' || i,
+           (%(cities)s::text[])[1 + (i * 7) %% 16],
+           'MG', 'Brasil',
+           'contato' || i || '@cliente' || (i %% 997) || '.com.br',
+           '(35) 3' || lpad((i %% 10000000)::text, 7, '0'),
+           (ARRAY['CL', 'VE', 'CO', 'RE'])[1 + i %% 4],
+           (ARRAY['CL', 'VE', 'CO', 'RE'])[1 + (i / 4) %% 4],
+           CASE WHEN i %% 5 = 0 THEN 'F' ELSE 'J' END,
+           i %% 10 <> 0
+    FROM generate_series(1, %(size)s) AS g(i)
+    -- physical order unrelated to legacy_client_id, as after repeated merges
+    ORDER BY md5(i::text)
+"""
+
+SYNTHETIC_LINKS_SQL = """
+    INSERT INTO companies (name, fantasy_name, category, legacy_client_id)
+    SELECT descricao, descricao_fantasia, grupo1, legacy_client_id
+    FROM legacy_clients
+    WHERE legacy_client_id % 10 < 3;
+
+    UPDATE legacy_clients AS lc
+    SET company_id = c.id
+    FROM companies AS c
+    WHERE c.legacy_client_id = lc.legacy_client_id;
+"""
+
+
+def build_schema(cursor, size):
+    """(Re)create the scratch schema with `size` synthetic legacy clients; returns linked company ids"""
+    cursor.execute("SET search_path = public")
+    cursor.execute("SELECT pg_get_viewdef('public.companies_with_legacy'::regclass)")
+    view_definition = cursor.fetchone()[0]
+
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"CREATE TABLE {SCHEMA}.companies (LIKE public.companies INCLUDING ALL)")
+    cursor.execute(f"CREATE TABLE {SCHEMA}.legacy_clients (LIKE public.legacy_clients INCLUDING ALL)")
+    # INCLUDING ALL copies id's nextval('public.legacy_clients_id_seq') default; synthetic
+    # rows must not consume the production sequence, so they draw from a scratch one
+    cursor.execute(f"CREATE SEQUENCE {SCHEMA}.legacy_clients_id_seq OWNED BY {SCHEMA}.legacy_clients.id")
+    cursor.execute(f"ALTER TABLE {SCHEMA}.legacy_clients "
+                   f"ALTER COLUMN id SET DEFAULT nextval('{SCHEMA}.legacy_clients_id_seq')")
+    # The view definition was printed with unqualified names, so it binds to the scratch tables
+    cursor.execute(f"SET search_path = {SCHEMA}")
+    cursor.execute(f"CREATE VIEW companies_with_legacy AS {view_definition}")
+
+    cursor.execute(SYNTHETIC_ROWS_SQL, {'size': size, 'words': NAME_WORDS, 'cities': CITIES})
+    cursor.execute(SYNTHETIC_LINKS_SQL)
+    cursor.execute("VACUUM ANALYZE legacy_clients")
+    cursor.execute("VACUUM ANALYZE companies")
+    cursor.execute("SELECT id FROM companies ORDER BY legacy_client_id")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def plan_nodes(plan):
+    """Flatten an EXPLAIN JSON plan into its nodes"""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def plan_shape(plan):
+    """Compact signature of a plan: node types with their relation or index, depth first"""
+    parts = []
+    for node in plan_nodes(plan):
+        target = node.get('Index Name') or node.get('Relation Name')
+        parts.append(f"{node['Node Type']}({target})" if target else node['Node Type'])
+    return ' > '.join(parts)
+
+
+def check_shape(check, plan):
+    """Assertion failures of one plan against a check's expectations"""
+    nodes = list(plan_nodes(plan))
+    failures = []
+    for relation in check.get('index_on', []):
+        if not any(node['Node Type'] in ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+                   and node.get('Relation Name') == relation for node in nodes):
+            failures.append(f"{relation} is not read through an index")
+    for relation in check.get('no_seq_scan', []):
+        if any(node['Node Type'] == 'Seq Scan' and node.get('Relation Name') == relation for node in nodes):
+            failures.append(f"sequential scan on {relation}")
+    if check.get('no_sort') and any(node['Node Type'] in ('Sort', 'Incremental Sort') for node in nodes):
+        failures.append("explicit sort instead of index order")
+    return failures
+
+
+def explain(cursor, sql, params):
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+    result = cursor.fetchone()[0]
+    return (result if isinstance(result, list) else json.loads(result))[0]
+
+
+def run_check(cursor, check, size, company_ids, repeats=REPEATS):
+    """EXPLAIN ANALYZE one check `repeats` times (after a warm-up) and evaluate it"""
+    params = check['params'](size, company_ids)
+    explain(cursor, check['sql'], params)
+    runs = [explain(cursor, check['sql'], params) for _ in range(repeats)]
+    execution_ms = statistics.median(run['Execution Time'] for run in runs)
+    plan = runs[-1]['Plan']
+
+    budget_ms = check['base_ms'] + check['ms_per_10k_rows'] * size / 10000
+    failures = []
+    if size >= check['min_rows']:
+        failures = check_shape(check, plan)
+        if execution_ms > budget_ms:
+            failures.append(f"{execution_ms:.2f} ms over the {budget_ms:.2f} ms budget")
+    return {
+        'check': check['name'],
+        'size': size,
+        'execution_ms': round(execution_ms, 3),
+        'planning_ms': round(runs[-1]['Planning Time'], 3),
+        'budget_ms': budget_ms,
+        'shared_hit_blocks': plan.get('Shared Hit Blocks', 0),
+        'shared_read_blocks': plan.get('Shared Read Blocks', 0),
+        'shape': plan_shape(plan),
+        'failures': failures,
+        'plan': plan
+    }
+
+
+def read_history(history_file):
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file, encoding='utf-8') as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def compare_with_history(result, history):
+    """Regressions of one result against earlier runs of the same check and size"""
+    earlier = [entry for entry in history if entry['check'] == result['check'] and entry['size'] == result['size']]
+    if not earlier:
+        return []
+    regressions = []
+    if earlier[-1]['shape'] != result['shape']:
+        regressions.append(f"plan shape changed from: {earlier[-1]['shape']}")
+    median_ms = statistics.median(entry['execution_ms'] for entry in earlier[-HISTORY_WINDOW:])
+    if result['execution_ms'] > max(median_ms * SLOWDOWN_FACTOR, median_ms + SLOWDOWN_MIN_MS):
+        regressions.append(f"{result['execution_ms']:.2f} ms vs trailing median {median_ms:.2f} ms")
+    return regressions
+
+
+def run_plan_checks(sizes=DEFAULT_SIZES, output_dir=DEFAULT_OUTPUT_DIR, check_names=None, keep_schema=False):
+    """Run every check at every size; returns the results or None when the database is unreachable"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+    conn.autocommit = True
+    cursor = conn.cursor()
+    history_file = os.path.join(output_dir, 'history.jsonl')
+    history = read_history(history_file)
+    run_at = datetime.now().isoformat(timespec='seconds')
+    checks = [check for check in CHECKS if not check_names or check['name'] in check_names]
+    results = []
+    try:
+        for size in sizes:
+            started = time.perf_counter()
+            company_ids = build_schema(cursor, size)
+            print(f"\n📦 {size} synthetic legacy clients ({len(company_ids)} linked) "
+                  f"built in {time.perf_counter() - started:.1f}s")
+            for check in checks:
+                result = run_check(cursor, check, size, company_ids)
+                result['regressions'] = compare_with_history(result, history)
+                results.append(result)
+                icon = '❌' if result['failures'] else ('⚠️ ' if result['regressions'] else '✅')
+                print(f"{icon} {check['name']:<28} {result['execution_ms']:>9.2f} ms "
+                      f"(budget {result['budget_ms']:.0f}) {result['shape']}")
+                for message in result['failures'] + result['regressions']:
+                    print(f"     {message}")
+    finally:
+        if not keep_schema:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.close()
+        conn.close()
+
+    run_dir = os.path.join(output_dir, 'runs', run_at.replace(':', '').replace('-', ''))
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, 'plans.json'), 'w', encoding='utf-8') as plans:
+        json.dump(results, plans, indent=2, default=str)
+    with open(history_file, 'a', encoding='utf-8') as history_output:
+        for result in results:
+            entry = {key: value for key, value in result.items() if key != 'plan'}
+            history_output.write(json.dumps(dict(entry, run_at=run_at), default=str) + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check legacy_clients query plans on synthetic data')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma separated synthetic table sizes')
+    parser.add_argument('--check', action='append', help=f"run only this check (repeatable): "
+                                                         f"{', '.join(check['name'] for check in CHECKS)}")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help='history and per-run plans')
+    parser.add_argument('--keep-schema', action='store_true', help=f"leave the {SCHEMA} schema for inspection")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='also exit non-zero when a plan shape or timing regressed against history')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.check or [] if name not in {check['name'] for check in CHECKS}]
+    if unknown:
+        parser.error(f"unknown check(s): {', '.join(unknown)}")
+
+    plan_results = run_plan_checks([int(size) for size in args.sizes.split(',')], args.output_dir,
+                                   args.check, args.keep_schema)
+    if plan_results is None:
+        sys.exit(2)
+    failed = [result for result in plan_results if result['failures']]
+    regressed = [result for result in plan_results if result['regressions']]
+    print(f"\n=== Query Plan Summary ===")
+    print(f"📊 Checks run: {len(plan_results)}")
+    print(f"❌ Failed: {len(failed)}")
+    print(f"⚠️  Regressed against history: {len(regressed)}")
+    if failed or (args.fail_on_regression and regressed):
+        print("💥 Query plan checks failed!")
+        sys.exit(1)
+    print("🎉 Query plans look as expected!")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Load test for GET /api/admin/legacy-clients
+Runs a closed-loop asyncio load against a local dev server (npm run dev on
+top of the local Supabase): --concurrency workers, each on its own
+keep-alive connection, issue a weighted mix of requests for --duration
+seconds or until --requests have been sent:
+
+    page         a random listing page
+    deep_page    one of the last pages (largest OFFSET)
+    search_hit   a search term taken from the CSV (cities, name words)
+    search_miss  a search term that matches nothing (full ilike scan)
+
+Reports throughput, error rate and p50/p95/p99 latency per operation, and
+how many responses came from the precomputed listing snapshots. Uses a
+minimal HTTP/1.1 client on asyncio streams, so it needs no extra packages.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+from legacy_clients_common import DEFAULT_CSV_FILE, read_csv_rows
+
+DEFAULT_URL = 'http://localhost:3000/api/admin/legacy-clients'
+DEFAULT_MIX = 'page=50,deep_page=20,search_hit=20,search_miss=10'
+PERCENTILES = (50, 95, 99)
+OPERATIONS = ('page', 'deep_page', 'search_hit', 'search_miss')
+
+
+def parse_mix(mix):
+    """'page=50,search_hit=20' -> {'page': 50, 'search_hit': 20}"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"unknown operation {name.strip()!r}, expected one of {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def load_workload(csv_file_path, term_count=40):
+    """Row count and realistic search terms (frequent cities and name words) from the CSV"""
+    cities = Counter()
+    words = Counter()
+    rows = 0
+    for row in read_csv_rows(csv_file_path):
+        rows += 1
+        if (row.get('CIDADE') or '').strip():
+            cities[row['CIDADE'].strip()] += 1
+        for word in (row.get('DESCRICAO') or '').split():
+            if len(word) >= 4 and word.isalpha():
+                words[word.lower()] += 1
+    half = term_count // 2
+    terms = [city for city, _ in cities.most_common(half)] + [word for word, _ in words.most_common(half)]
+    return rows, terms
+
+
+class Workload:
+    """Builds query strings for each operation"""
+
+    def __init__(self, row_count, limit, terms, rng):
+        self.limit = limit
+        self.last_page = max(1, -(-row_count // limit))
+        self.terms = terms
+        self.rng = rng
+
+    def page(self):
+        return {'page': self.rng.randint(1, self.last_page), 'limit': self.limit}
+
+    def deep_page(self):
+        return {'page': self.rng.randint(max(1, self.last_page - 2), self.last_page), 'limit': self.limit}
+
+    def search_hit(self):
+        return {'search': self.rng.choice(self.terms), 'page': 1, 'limit': self.limit}
+
+    def search_miss(self):
+        return {'search': f"zz{self.rng.getrandbits(40):x}qq", 'page': 1, 'limit': self.limit}
+
+
+class HttpConnection:
+    """One keep-alive HTTP/1.1 connection; reconnects when the server closes it"""
+
+    def __init__(self, host, port, headers):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, target):
+        """Send one GET and return (status, body bytes)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        request = f"GET {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nConnection: keep-alive\r\n"
+        request += ''.join(f"{name}: {value}\r\n" for name, value in self.headers) + "\r\n"
+        self.writer.write(request.encode('latin-1'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('server closed the connection')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                body += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+            body = bytes(body)
+        elif 'content-length' in response_headers:
+            body = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        keep_alive = response_headers.get('connection', '').lower() != 'close'
+        if not keep_alive:
+            await self.close()
+        return status, body
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = Counter()
+        self.error_samples = []
+        self.cached = Counter()
+
+    def record(self, operation, elapsed, error=None, cached=False):
+        self.latencies[operation].append(elapsed)
+        if error:
+            self.errors[operation] += 1
+            if len(self.error_samples) < 5:
+                self.error_samples.append(f"{operation}: {error}")
+        elif cached:
+            self.cached[operation] += 1
+
+
+async def run_worker(base_path, host, port, headers, workload, weights, results, deadline, budget):
+    connection = HttpConnection(host, port, headers)
+    rng = workload.rng
+    names, cumulative = list(weights), list(weights.values())
+    try:
+        while time.perf_counter() < deadline and budget['remaining'] != 0:
+            if budget['remaining'] > 0:
+                budget['remaining'] -= 1
+            operation = rng.choices(names, weights=cumulative)[0]
+            target = f"{base_path}?{urlencode(getattr(workload, operation)())}"
+            started = time.perf_counter()
+            try:
+                status, body = await connection.get(target)
+                elapsed = time.perf_counter() - started
+                if status >= 400:
+                    results.record(operation, elapsed, error=f"HTTP {status} {body[:120]!r}")
+                else:
+                    results.record(operation, elapsed, cached=json.loads(body).get('cached') is True)
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                results.record(operation, time.perf_counter() - started, error=repr(e))
+                await connection.close()
+    finally:
+        await connection.close()
+
+
+async def run_load_test(url, concurrency, duration, requests, weights, workload, headers):
+    parts = urlsplit(url)
+    if parts.scheme != 'http':
+        raise ValueError('only plain http:// dev servers are supported')
+    results = Results()
+    budget = {'remaining': requests if requests else -1}
+    deadline = time.perf_counter() + (duration if duration else float('inf'))
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_worker(parts.path, parts.hostname, parts.port or 80, headers, workload, weights, results,
+                   deadline, budget)
+        for _ in range(concurrency)
+    ))
+    return results, time.perf_counter() - started
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(results, elapsed):
+    summary = {'elapsed_seconds': round(elapsed, 3), 'operations': {}}
+    every = []
+    for operation, latencies in results.latencies.items():
+        if not latencies:
+            continue
+        ordered = sorted(latencies)
+        every.extend(latencies)
+        summary['operations'][operation] = {
+            'requests': len(latencies),
+            'errors': results.errors[operation],
+            'error_rate': results.errors[operation] / len(latencies),
+            'cached': results.cached[operation],
+            **{f"p{p}_ms": percentile(ordered, p) * 1000 for p in PERCENTILES},
+            'max_ms': ordered[-1] * 1000
+        }
+    ordered = sorted(every)
+    total_errors = sum(results.errors.values())
+    summary['total'] = {
+        'requests': len(ordered),
+        'errors': total_errors,
+        'error_rate': total_errors / len(ordered) if ordered else 0.0,
+        'requests_per_second': len(ordered) / elapsed if elapsed else 0.0,
+        **{f"p{p}_ms": percentile(ordered, p) * 1000 for p in PERCENTILES}
+    }
+    summary['error_samples'] = results.error_samples
+    return summary
+
+
+def print_summary(summary):
+    total = summary['total']
+    print(f"\n=== Load Test Summary ({summary['elapsed_seconds']:.1f}s) ===")
+    print(f"📊 {total['requests']} requests, {total['requests_per_second']:.1f} req/s, "
+          f"{total['error_rate']:.2%} errors")
+    print(f"⏱️  p50 {total['p50_ms']:.1f} ms | p95 {total['p95_ms']:.1f} ms | p99 {total['p99_ms']:.1f} ms")
+    print(f"\n{'operation':<12} {'reqs':>6} {'errors':>7} {'cached':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for operation, stats in summary['operations'].items():
+        print(f"{operation:<12} {stats['requests']:>6} {stats['error_rate']:>7.1%} {stats['cached']:>7} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+    for sample in summary['error_samples']:
+        print(f"❌ {sample}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test GET /api/admin/legacy-clients on a local dev server')
+    parser.add_argument('--url', default=DEFAULT_URL, help='endpoint URL (plain http)')
+    parser.add_argument('--concurrency', type=int, default=10, help='concurrent connections')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run (0 = until --requests)')
+    parser.add_argument('--requests', type=int, default=0, help='stop after this many requests (0 = no limit)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--limit', type=int, default=100, help='page size requested')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='CSV used for the row count and search terms')
+    parser.add_argument('--header', action='append', default=[],
+                        help="extra request header, e.g. 'Cookie: sb-access-token=...' (repeatable)")
+    parser.add_argument('--seed', type=int, help='random seed for a reproducible request sequence')
+    parser.add_argument('--json', help='also write the summary as JSON to this path')
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error('give --duration or --requests')
+    row_count, search_terms = load_workload(args.csv)
+    extra_headers = [tuple(part.strip() for part in header.split(':', 1)) for header in args.header]
+    test_workload = Workload(row_count, args.limit, search_terms, random.Random(args.seed))
+
+    load_results, load_elapsed = asyncio.run(run_load_test(
+        args.url, args.concurrency, args.duration, args.requests, parse_mix(args.mix), test_workload, extra_headers
+    ))
+    load_summary = summarize(load_results, load_elapsed)
+    print_summary(load_summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(load_summary, output, indent=2)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Refresh companies_with_legacy_materialized
+Claims the company ids queued in companies_with_legacy_delta by the triggers
+on companies and legacy_clients, then in one transaction either rewrites only
+those rows from the companies_with_legacy view, or, when the change set is a
+large share of the table (after a full import or a bulk link), diffs the whole
+table against the view the way REFRESH MATERIALIZED VIEW CONCURRENTLY does:
+rows that changed are replaced and rows that did not are left alone, so readers
+are never blocked. The view is c.* plus the legacy columns and is recreated by
+every swap, so when its columns no longer match the table's (a column added to
+companies) the table is rebuilt from the view with the same indexes instead.
+See 20261018_120000_companies_with_legacy_materialized.sql.
+"""
+import argparse
+import time
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION
+
+DEFAULT_FULL_THRESHOLD = 0.2
+
+# Ids queued after this statement stay queued for the next refresh
+CLAIM_DELTA_SQL = """
+    CREATE TEMP TABLE claimed_companies ON COMMIT DROP AS
+    WITH claimed AS (
+        DELETE FROM public.companies_with_legacy_delta RETURNING company_id
+    )
+    SELECT company_id FROM claimed
+"""
+
+DELTA_DELETE_SQL = """
+    DELETE FROM public.companies_with_legacy_materialized AS m
+    USING claimed_companies AS d
+    WHERE m.id = d.company_id
+"""
+
+DELTA_INSERT_SQL = """
+    INSERT INTO public.companies_with_legacy_materialized
+    SELECT v.*
+    FROM public.companies_with_legacy AS v
+    JOIN claimed_companies AS d ON d.company_id = v.id
+"""
+
+FULL_DELETE_SQL = """
+    DELETE FROM public.companies_with_legacy_materialized AS m
+    WHERE NOT EXISTS (
+        SELECT 1 FROM public.companies_with_legacy AS v
+        WHERE v.id = m.id AND ROW(v.*) IS NOT DISTINCT FROM ROW(m.*)
+    )
+"""
+
+# Column names and types in order, for the table and the view alike
+COLUMNS_SQL = """
+    SELECT attname, format_type(atttypid, atttypmod)
+    FROM pg_attribute
+    WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+    ORDER BY attnum
+"""
+
+REBUILD_SQL = """
+    CREATE TABLE public.companies_with_legacy_materialized_rebuild AS
+    SELECT * FROM public.companies_with_legacy;
+    DROP TABLE public.companies_with_legacy_materialized;
+    ALTER TABLE public.companies_with_legacy_materialized_rebuild RENAME TO companies_with_legacy_materialized;
+"""
+
+FULL_INSERT_SQL = """
+    INSERT INTO public.companies_with_legacy_materialized
+    SELECT v.*
+    FROM public.companies_with_legacy AS v
+    WHERE NOT EXISTS (SELECT 1 FROM public.companies_with_legacy_materialized AS m WHERE m.id = v.id)
+"""
+
+
+def table_columns(cursor, relation):
+    cursor.execute(COLUMNS_SQL, (relation,))
+    return cursor.fetchall()
+
+
+def rebuild_table(cursor):
+    """Recreate the table from the view, keeping its indexes and comment; returns the row count"""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'companies_with_legacy_materialized'"
+    )
+    index_definitions = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT obj_description('public.companies_with_legacy_materialized'::regclass, 'pg_class')")
+    comment = cursor.fetchone()[0]
+
+    cursor.execute(REBUILD_SQL)
+    for index_definition in index_definitions:
+        cursor.execute(index_definition)
+    if comment:
+        cursor.execute("COMMENT ON TABLE public.companies_with_legacy_materialized IS %s", (comment,))
+    cursor.execute("SELECT COUNT(*) FROM public.companies_with_legacy_materialized")
+    return cursor.fetchone()[0]
+
+
+def refresh_companies_with_legacy(full=False, full_threshold=DEFAULT_FULL_THRESHOLD, quiet=False):
+    """Bring companies_with_legacy_materialized up to date; returns (mode, claimed, deleted, inserted) or None"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        cursor.execute(CLAIM_DELTA_SQL)
+        claimed = cursor.rowcount
+        cursor.execute("SELECT COUNT(*) FROM public.companies")
+        company_count = cursor.fetchone()[0]
+
+        if (table_columns(cursor, 'public.companies_with_legacy_materialized')
+                != table_columns(cursor, 'public.companies_with_legacy')):
+            mode = 'rebuild'
+            cursor.execute("SELECT COUNT(*) FROM public.companies_with_legacy_materialized")
+            deleted = cursor.fetchone()[0]
+            inserted = rebuild_table(cursor)
+        elif full or claimed > full_threshold * company_count:
+            mode = 'full'
+            cursor.execute(FULL_DELETE_SQL)
+            deleted = cursor.rowcount
+            cursor.execute(FULL_INSERT_SQL)
+            inserted = cursor.rowcount
+        else:
+            mode = 'delta'
+            cursor.execute(DELTA_DELETE_SQL)
+            deleted = cursor.rowcount
+            cursor.execute(DELTA_INSERT_SQL)
+            inserted = cursor.rowcount
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error refreshing companies_with_legacy_materialized, nothing was changed: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not quiet:
+        print(f"\n=== Companies With Legacy Refresh Summary ===")
+        print(f"🔄 Mode: {mode} ({claimed} queued of {company_count} companies)")
+        print(f"🗑️  Rows removed: {deleted}")
+        print(f"📥 Rows written: {inserted}")
+        print(f"⏱️  {time.perf_counter() - started:.2f}s")
+    return mode, claimed, deleted, inserted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Refresh the materialized companies_with_legacy table')
+    parser.add_argument('--full', action='store_true', help='diff the whole table whatever the queue size')
+    parser.add_argument('--full-threshold', type=float, default=DEFAULT_FULL_THRESHOLD,
+                        help='share of companies queued above which the whole table is diffed')
+    args = parser.parse_args()
+
+    if refresh_companies_with_legacy(args.full, args.full_threshold):
+        print("🎉 companies_with_legacy_materialized refreshed successfully!")
+    else:
+        print("💥 Refreshing companies_with_legacy_materialized failed!")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Stratified sample of the legacy clients CSV for quick test imports
+One streaming pass keeps a uniform reservoir of the sample size, one row per
+(UF, PAIS, GRUPO1, PESSOA, ATIVO) stratum and the edge-case rows (longest OBS,
+most empty fields), so it holds at most size + strata rows whatever the export.
+The requested size is then split across strata: when there are more strata
+than slots, strata are picked greedily by how many new column values they
+add; otherwise every stratum gets one row and the rest is proportional.
+Writes a CSV fixture or an INSERT script.
+"""
+import argparse
+import csv
+import heapq
+import os
+import random
+
+from legacy_clients_common import (
+    DEFAULT_CSV_FILE,
+    INSERT_COLUMNS_SQL,
+    SUPABASE_DIR,
+    convert_row,
+    parse_integer,
+    read_csv_rows,
+    sql_literal
+)
+
+STRATA_FIELDS = ('UF', 'PAIS', 'GRUPO1', 'PESSOA', 'ATIVO')
+DEFAULT_OUTPUTS = {
+    'csv': os.path.join(SUPABASE_DIR, 'sample_clients.csv'),
+    'sql': os.path.join(SUPABASE_DIR, 'sample_import.sql')
+}
+
+
+def stratum_of(row):
+    return tuple((row.get(field) or '').strip().upper() for field in STRATA_FIELDS)
+
+
+def empty_field_count(row):
+    return sum(1 for key, value in row.items() if key is not None and not (value or '').strip())
+
+
+class Reservoir:
+    """Uniform sample of fixed capacity over a stream (Algorithm R)"""
+
+    def __init__(self, capacity, rng):
+        self.capacity = capacity
+        self.rng = rng
+        self.seen = 0
+        self.items = []
+
+    def offer(self, item):
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.items[slot] = item
+
+
+class EdgeCases:
+    """The rows with the highest score for each edge-case rule, kept in small heaps"""
+
+    RULES = {
+        'longest_obs': lambda row: len(row.get('OBS') or ''),
+        'most_empty_fields': empty_field_count
+    }
+
+    def __init__(self, per_rule):
+        self.per_rule = per_rule
+        self.heaps = {rule: [] for rule in self.RULES}
+
+    def offer(self, position, row):
+        for rule, score_of in self.RULES.items():
+            entry = (score_of(row), -position, row)
+            heap = self.heaps[rule]
+            if len(heap) < self.per_rule:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+    def rows(self):
+        """(position, row, rule) for every kept edge case, strongest first"""
+        for rule, heap in self.heaps.items():
+            for score, negative_position, row in sorted(heap, key=lambda entry: entry[:2], reverse=True):
+                if score:
+                    yield -negative_position, row, rule
+
+
+def allocate(strata_sizes, slots):
+    """Rows to draw per stratum so that slots rows cover as many distinct column values as possible"""
+    if slots <= 0 or not strata_sizes:
+        return {}
+
+    if slots < len(strata_sizes):
+        covered = set()
+        remaining = dict(strata_sizes)
+        allocation = {}
+        while len(allocation) < slots:
+            stratum = max(remaining, key=lambda s: (
+                sum((i, value) not in covered for i, value in enumerate(s)), remaining[s]))
+            covered.update(enumerate(stratum))
+            allocation[stratum] = 1
+            del remaining[stratum]
+        return allocation
+
+    allocation = {stratum: 1 for stratum in strata_sizes}
+    extra = slots - len(strata_sizes)
+    spare = {stratum: size - 1 for stratum, size in strata_sizes.items() if size > 1}
+    total_spare = sum(spare.values())
+    if extra and total_spare:
+        extra = min(extra, total_spare)
+        shares = {stratum: extra * size / total_spare for stratum, size in spare.items()}
+        for stratum, share in shares.items():
+            allocation[stratum] += int(share)
+        leftover = extra - sum(int(share) for share in shares.values())
+        for stratum in sorted(shares, key=lambda s: shares[s] - int(shares[s]), reverse=True)[:leftover]:
+            allocation[stratum] += 1
+    return allocation
+
+
+def sample_legacy_clients(csv_file_path, size, edge_rows=2, seed=None):
+    """One pass over the CSV; returns (header, [(position, row, reason), ...] in file order, stats)"""
+    rng = random.Random(seed)
+    # the overall reservoir carries each stratum's proportional share, the
+    # one-row reservoirs make sure every stratum has a candidate
+    overall = Reservoir(size, rng)
+    reservoirs = {}
+    edges = EdgeCases(edge_rows)
+    header = None
+    total = 0
+
+    for position, row in enumerate(read_csv_rows(csv_file_path)):
+        if header is None:
+            header = [key for key in row if key is not None]
+        if parse_integer(row.get('idCLIENTES')) is None:
+            continue
+        total += 1
+        stratum = stratum_of(row)
+        if stratum not in reservoirs:
+            reservoirs[stratum] = Reservoir(1, rng)
+        reservoirs[stratum].offer((position, row))
+        overall.offer((position, row))
+        edges.offer(position, row)
+
+    chosen = {}
+    for position, row, rule in edges.rows():
+        if len(chosen) < size:
+            chosen.setdefault(position, (row, rule))
+
+    pools = {stratum: dict(reservoir.items) for stratum, reservoir in reservoirs.items()}
+    for position, row in overall.items:
+        pools[stratum_of(row)][position] = row
+
+    strata_sizes = {stratum: reservoir.seen for stratum, reservoir in reservoirs.items()}
+    for stratum, count in allocate(strata_sizes, size - len(chosen)).items():
+        candidates = [item for item in pools[stratum].items() if item[0] not in chosen]
+        for position, row in rng.sample(candidates, min(count, len(candidates))):
+            chosen[position] = (row, 'stratum')
+
+    # strata short of candidates (edge cases, a small overall draw) leave a few slots; fill them from any pool
+    leftovers = [item for pool in pools.values() for item in pool.items() if item[0] not in chosen]
+    for position, row in rng.sample(leftovers, min(size - len(chosen), len(leftovers))):
+        chosen[position] = (row, 'stratum')
+
+    sample = [(position, row, reason) for position, (row, reason) in sorted(chosen.items())]
+    sampled_strata = {stratum_of(row) for _, row, _ in sample}
+    stats = {
+        'rows': total,
+        'strata': len(reservoirs),
+        'strata_sampled': len(sampled_strata),
+        'coverage': {
+            field: (len({stratum[i] for stratum in sampled_strata}), len({stratum[i] for stratum in reservoirs}))
+            for i, field in enumerate(STRATA_FIELDS)
+        }
+    }
+    return header or [], sample, stats
+
+
+def write_csv_fixture(output_file, header, sample):
+    with open(output_file, 'w', encoding='utf-8', newline='') as output:
+        writer = csv.DictWriter(output, fieldnames=header, extrasaction='ignore')
+        writer.writeheader()
+        for _, row, _ in sample:
+            writer.writerow(row)
+
+
+def write_sql_fixture(output_file, sample):
+    with open(output_file, 'w', encoding='utf-8') as output:
+        output.write(f"-- Stratified sample of {len(sample)} legacy clients\n")
+        output.write("-- Generated by scripts/sample_legacy_clients.py\n")
+        if not sample:
+            output.write("-- No rows sampled\n")
+            return
+        output.write("BEGIN;\n\n")
+        output.write(f"INSERT INTO public.legacy_clients (\n    {INSERT_COLUMNS_SQL}\n) VALUES\n")
+        output.write(",\n".join(
+            '(' + ', '.join(sql_literal(value) for value in convert_row(row)) + ')' for _, row, _ in sample
+        ))
+        output.write("\nON CONFLICT (legacy_client_id) DO NOTHING;\n\nCOMMIT;\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write a stratified sample of the legacy clients CSV')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--size', type=int, default=50, help='rows in the sample')
+    parser.add_argument('--format', choices=['csv', 'sql'], default='sql', help='fixture format')
+    parser.add_argument('--output', help='output file (default: supabase/sample_import.sql or sample_clients.csv)')
+    parser.add_argument('--edge-rows', type=int, default=2, help='rows kept per edge-case rule')
+    parser.add_argument('--seed', type=int, help='random seed for a reproducible sample')
+    args = parser.parse_args()
+    if args.size < 1:
+        parser.error('--size must be at least 1')
+
+    output_path = args.output or DEFAULT_OUTPUTS[args.format]
+    csv_header, sampled, sample_stats = sample_legacy_clients(args.csv, args.size, args.edge_rows, args.seed)
+    if args.format == 'csv':
+        write_csv_fixture(output_path, csv_header, sampled)
+    else:
+        write_sql_fixture(output_path, sampled)
+
+    print(f"\n=== Sample Summary ===")
+    print(f"📊 Sampled {len(sampled)} of {sample_stats['rows']} rows "
+          f"from {sample_stats['strata_sampled']} of {sample_stats['strata']} strata")
+    for field, (in_sample, in_export) in sample_stats['coverage'].items():
+        print(f"   {field}: {in_sample}/{in_export} distinct values")
+    for _, row, reason in sampled:
+        if reason != 'stratum':
+            print(f"   edge case ({reason}): idCLIENTES={row.get('idCLIENTES')}")
+    print(f"✅ Wrote {output_path}")
@@ -1,13 +1,272 @@
 #!/usr/bin/env python3
 """
 Create SQL migration file for importing all legacy clients via Supabase migrations
+
+Strategies:
+  delete - clear legacy_clients in place and re-insert everything
+  swap   - load an UNLOGGED staging table, index it, and swap it in atomically;
+           written as a new migration stamped with the current time, because it
+           relies on objects the 20261018_* migrations create. State that does
+           not come from the CSV is carried over from the live rows, and so are
+           the --skip-columns (e.g. the logo columns ingest_legacy_logos.py wrote)
 """
+import argparse
 import csv
+import os
+from datetime import datetime
+
+from legacy_clients_common import COLUMN_NAMES, DEFAULT_CSV_FILE, SUPABASE_DIR
+
+MIGRATIONS_DIR = os.path.join(SUPABASE_DIR, 'migrations')
+DEFAULT_MIGRATION_FILE = os.path.join(MIGRATIONS_DIR, '20250825_import_all_legacy_clients.sql')
+
+
+SWAP_PREPARE_SQL = """-- Full reload: build the new table next to the live one so readers never see it empty
+BEGIN;
+
+DROP TABLE IF EXISTS public.legacy_clients_reload;
+
+-- No indexes yet and no WAL while loading
+CREATE UNLOGGED TABLE public.legacy_clients_reload (
+    LIKE public.legacy_clients INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+);
+
+"""
+
+SWAP_DEDUPE_SQL = """-- The staging table has no UNIQUE constraint yet; keep the last row for duplicate ids
+DELETE FROM public.legacy_clients_reload AS a
+USING public.legacy_clients_reload AS b
+WHERE a.legacy_client_id = b.legacy_client_id
+  AND a.id < b.id;
+
+"""
 
-def create_sql_migration():
+# State that does not come from the CSV: surrogate ids, links, coordinates, logo thumbnails and audit timestamps
+CARRY_OVER_COLUMNS = ('id', 'company_id', 'latitude', 'longitude', 'geo_precision', 'geocoded_at',
+                      'logo_thumbnails', 'created_at', 'updated_at')
+
+
+def carry_over_sql(skip_columns=()):
+    """UPDATE copying the carried-over columns, and the CSV columns the reload must not overwrite, from the live rows"""
+    columns = list(CARRY_OVER_COLUMNS) + [c for c in COLUMN_NAMES[1:] if c in skip_columns]
+    assignments = ",\n    ".join(f"{column} = lc.{column}" for column in columns)
+    return (
+        "-- Carry over state that does not come from the CSV"
+        + (f", and {', '.join(sorted(skip_columns))} (--skip-columns)" if skip_columns else "") + "\n"
+        "UPDATE public.legacy_clients_reload AS r\n"
+        f"SET {assignments}\n"
+        "FROM public.legacy_clients AS lc\n"
+        "WHERE lc.legacy_client_id = r.legacy_client_id;\n\n"
+    )
+
+
+SWAP_CARRY_OVER_SQL = """-- Keep rows still referenced by companies or client_matches so the foreign keys stay valid
+DO $$
+DECLARE
+    kept_count INTEGER;
+BEGIN
+    INSERT INTO public.legacy_clients_reload
+    SELECT lc.*
+    FROM public.legacy_clients AS lc
+    WHERE NOT EXISTS (
+        SELECT 1 FROM public.legacy_clients_reload AS r WHERE r.legacy_client_id = lc.legacy_client_id
+    )
+    AND (
+        EXISTS (SELECT 1 FROM public.companies AS c WHERE c.legacy_client_id = lc.legacy_client_id)
+        OR EXISTS (SELECT 1 FROM public.client_matches AS cm WHERE cm.legacy_client_id = lc.legacy_client_id)
+    );
+    GET DIAGNOSTICS kept_count = ROW_COUNT;
+    IF kept_count > 0 THEN
+        RAISE NOTICE 'Kept % referenced legacy clients missing from the reload', kept_count;
+    END IF;
+END
+$$;
+
+-- One sequential WAL write of the finished heap, then build indexes on it
+ALTER TABLE public.legacy_clients_reload SET LOGGED;
+
+ALTER TABLE public.legacy_clients_reload
+    ADD CONSTRAINT legacy_clients_reload_pkey PRIMARY KEY (id),
+    ADD CONSTRAINT legacy_clients_reload_legacy_client_id_key UNIQUE (legacy_client_id),
+    ADD CONSTRAINT legacy_clients_reload_company_id_fkey
+        FOREIGN KEY (company_id) REFERENCES public.companies(id);
+
+-- Every secondary index of the live table, from the catalog so indexes added by later migrations
+-- come along, except plain ones a unique index already covers (the rule legacy_clients_indexes.py
+-- uses for full loads). Built as <name>_reload and renamed after the swap
+DO $$
+DECLARE
+    idx RECORD;
+BEGIN
+    FOR idx IN
+        SELECT i.relname AS name, pg_get_indexdef(x.indexrelid) AS definition
+        FROM pg_index AS x
+        JOIN pg_class AS i ON i.oid = x.indexrelid
+        WHERE x.indrelid = 'public.legacy_clients'::regclass
+          AND NOT x.indisunique
+          AND NOT (
+              x.indpred IS NULL AND x.indexprs IS NULL
+              AND EXISTS (
+                  SELECT 1
+                  FROM pg_index AS u
+                  JOIN pg_class AS ui ON ui.oid = u.indexrelid
+                  WHERE u.indrelid = x.indrelid
+                    AND u.indisunique
+                    AND ui.relam = i.relam
+                    AND (string_to_array(u.indkey::TEXT, ' '))[1:x.indnatts] = string_to_array(x.indkey::TEXT, ' ')
+              )
+          )
+    LOOP
+        EXECUTE regexp_replace(
+            idx.definition,
+            '^CREATE INDEX \\S+ ON public\\.legacy_clients ',
+            format('CREATE INDEX %I ON public.legacy_clients_reload ', idx.name || '_reload')
+        );
+    END LOOP;
+END
+$$;
+
+ANALYZE public.legacy_clients_reload;
+
+COMMIT;
+
+"""
+
+SWAP_SQL = """-- Swap: a brief ACCESS EXCLUSIVE lock, then readers see the complete new table
+BEGIN;
+
+LOCK TABLE public.legacy_clients IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE public.companies DROP CONSTRAINT IF EXISTS companies_legacy_client_id_fkey;
+ALTER TABLE public.client_matches DROP CONSTRAINT IF EXISTS client_matches_legacy_client_id_fkey;
+DROP VIEW IF EXISTS public.companies_with_legacy;
+
+-- The id sequence is owned by the old table and would be dropped with it
+ALTER SEQUENCE public.legacy_clients_id_seq OWNED BY NONE;
+SELECT setval(
+    'public.legacy_clients_id_seq',
+    GREATEST((SELECT COALESCE(MAX(id), 0) FROM public.legacy_clients_reload), 1)
+);
+
+-- The new table was loaded without the change feed triggers; record the difference instead
+SELECT pg_advisory_xact_lock(hashtext('public.legacy_client_changes'));
+INSERT INTO public.legacy_client_changes (legacy_client_id, operation, changed_columns, row_data, source)
+SELECT COALESCE(r.legacy_client_id, lc.legacy_client_id),
+       public.legacy_client_change_operation(images.old_row, images.new_row),
+       diff.changed_columns,
+       COALESCE(images.new_row, images.old_row),
+       'supabase_sql_import:swap'
+FROM public.legacy_clients AS lc
+FULL JOIN public.legacy_clients_reload AS r ON r.legacy_client_id = lc.legacy_client_id
+CROSS JOIN LATERAL (
+    SELECT CASE WHEN lc.id IS NULL THEN NULL ELSE to_jsonb(lc) END AS old_row,
+           CASE WHEN r.id IS NULL THEN NULL ELSE to_jsonb(r) END AS new_row
+) AS images
+CROSS JOIN LATERAL (
+    SELECT public.legacy_client_changed_columns(images.old_row, images.new_row) AS changed_columns
+) AS diff
+WHERE diff.changed_columns IS NULL OR cardinality(diff.changed_columns) > 0
+ORDER BY 1;
+
+ALTER TABLE public.legacy_clients RENAME TO legacy_clients_old;
+ALTER TABLE public.legacy_clients_reload RENAME TO legacy_clients;
+DROP TABLE public.legacy_clients_old;
+
+ALTER SEQUENCE public.legacy_clients_id_seq OWNED BY public.legacy_clients.id;
+ALTER TABLE public.legacy_clients RENAME CONSTRAINT legacy_clients_reload_pkey TO legacy_clients_pkey;
+ALTER TABLE public.legacy_clients
+    RENAME CONSTRAINT legacy_clients_reload_legacy_client_id_key TO legacy_clients_legacy_client_id_key;
+ALTER TABLE public.legacy_clients
+    RENAME CONSTRAINT legacy_clients_reload_company_id_fkey TO legacy_clients_company_id_fkey;
+DO $$
+DECLARE
+    idx RECORD;
+BEGIN
+    FOR idx IN
+        SELECT i.relname AS name
+        FROM pg_index AS x
+        JOIN pg_class AS i ON i.oid = x.indexrelid
+        WHERE x.indrelid = 'public.legacy_clients'::regclass
+          AND i.relname LIKE '%\\_reload'
+    LOOP
+        EXECUTE format('ALTER INDEX public.%I RENAME TO %I', idx.name, left(idx.name, -length('_reload')));
+    END LOOP;
+END
+$$;
+
+-- Re-point the foreign keys at the new table; validated after commit without blocking writes
+ALTER TABLE public.companies ADD CONSTRAINT companies_legacy_client_id_fkey
+    FOREIGN KEY (legacy_client_id) REFERENCES public.legacy_clients(legacy_client_id) NOT VALID;
+ALTER TABLE public.client_matches ADD CONSTRAINT client_matches_legacy_client_id_fkey
+    FOREIGN KEY (legacy_client_id) REFERENCES public.legacy_clients(legacy_client_id) NOT VALID;
+
+CREATE VIEW public.companies_with_legacy AS
+SELECT
+    c.*,
+    lc.descricao as legacy_name,
+    lc.descricao_fantasia as legacy_fantasy_name,
+    lc.cidade as legacy_city,
+    lc.email as legacy_email,
+    lc.pessoa as legacy_type,
+    lc.grupo1 as legacy_group1,
+    lc.grupo2 as legacy_group2,
+    lc.ativo as legacy_active
+FROM public.companies c
+LEFT JOIN public.legacy_clients lc ON c.legacy_client_id = lc.legacy_client_id;
+
+COMMENT ON VIEW public.companies_with_legacy IS 'Companies with their linked legacy client information';
+
+-- Triggers are not copied by LIKE; the new table must keep invalidating the listing snapshots,
+-- queueing companies_with_legacy_materialized deltas and recording row changes
+CREATE TRIGGER legacy_clients_invalidate_snapshots
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.legacy_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION public.invalidate_legacy_clients_snapshots();
+UPDATE public.legacy_clients_import_versions SET invalidated_at = NOW() WHERE invalidated_at IS NULL;
+CREATE TRIGGER legacy_clients_queue_delta_insert
+    AFTER INSERT ON public.legacy_clients REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+CREATE TRIGGER legacy_clients_queue_delta_update
+    AFTER UPDATE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+CREATE TRIGGER legacy_clients_queue_delta_delete
+    AFTER DELETE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+CREATE TRIGGER legacy_clients_lock_changes
+    BEFORE INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.legacy_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION public.lock_legacy_client_changes();
+CREATE TRIGGER legacy_clients_record_changes_insert
+    AFTER INSERT ON public.legacy_clients REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+CREATE TRIGGER legacy_clients_record_changes_update
+    AFTER UPDATE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+CREATE TRIGGER legacy_clients_record_changes_delete
+    AFTER DELETE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+CREATE TRIGGER legacy_clients_record_changes_truncate
+    AFTER TRUNCATE ON public.legacy_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+-- Every linked company may see different legacy data; the next refresh diffs the whole table
+INSERT INTO public.companies_with_legacy_delta (company_id)
+SELECT id FROM public.companies WHERE legacy_client_id IS NOT NULL
+ON CONFLICT (company_id) DO NOTHING;
+
+COMMIT;
+
+ALTER TABLE public.companies VALIDATE CONSTRAINT companies_legacy_client_id_fkey;
+ALTER TABLE public.client_matches VALIDATE CONSTRAINT client_matches_legacy_client_id_fkey;
+
+"""
+
+
+def swap_migration_file(now=None):
+    """New migration that sorts after every existing one"""
+    return os.path.join(MIGRATIONS_DIR, f"{(now or datetime.now()):%Y%m%d_%H%M%S}_reload_legacy_clients.sql")
+
+
+def create_sql_migration(csv_file=DEFAULT_CSV_FILE, migration_file=None, strategy='delete', skip_columns=()):
     """Create a SQL migration file with all legacy client data"""
-    
-    csv_file = "/Users/danielwolthers/Documents/GitHub/wolthers-travel-app/supabase/clients.csv"
+    migration_file = migration_file or (swap_migration_file() if strategy == 'swap' else DEFAULT_MIGRATION_FILE)
     
     def clean_value(value):
         if not value or value.strip() == '':
@@ -28,21 +287,36 @@ def create_sql_migration():
         except ValueError:
             return 'NULL'
     
-    migration_file = "/Users/danielwolthers/Documents/GitHub/wolthers-travel-app/supabase/migrations/20250825_import_all_legacy_clients.sql"
+    target_table = 'public.legacy_clients_reload' if strategy == 'swap' else 'public.legacy_clients'
+
+    def write_batch(f, label, values):
+        f.write(f"-- {label} ({len(values)} records)\n")
+        f.write(f"INSERT INTO {target_table} (\n")
+        f.write("    legacy_client_id, descricao, descricao_fantasia, endereco, numero, complemento,\n")
+        f.write("    bairro, cidade, pais, uf, cep, telefone1, telefone2, telefone3, telefone4,\n")
+        f.write("    email, email_contratos, pessoa, grupo1, grupo2, referencias, obs,\n")
+        f.write("    documento1, documento2, documento3, ativo, id_usuario, id_usuario_ultimo,\n")
+        f.write("    logo, logo_altura, logo_largura, auto_size\n")
+        f.write(") VALUES\n")
+        f.write(",\n".join(values))
+        f.write(";\n\n")
     
     records_processed = 0
     
     try:
         with open(migration_file, 'w', encoding='utf-8') as f:
             f.write("-- Migration: Import All Legacy Clients\n")
-            f.write("-- Created: 2025-08-25\n")
+            f.write(f"-- Created: {datetime.now():%Y-%m-%d}\n" if strategy == 'swap' else "-- Created: 2025-08-25\n")
             f.write("-- Description: Complete import of 1866 legacy client records\n\n")
             
-            f.write("-- Clear any existing partial data\n")
-            f.write("DELETE FROM public.legacy_clients;\n\n")
+            if strategy == 'swap':
+                f.write(SWAP_PREPARE_SQL)
+            else:
+                f.write("-- Clear any existing partial data\n")
+                f.write("DELETE FROM public.legacy_clients;\n\n")
             
-            f.write("-- Reset the sequence to start from 1\n")
-            f.write("ALTER SEQUENCE public.legacy_clients_id_seq RESTART WITH 1;\n\n")
+                f.write("-- Reset the sequence to start from 1\n")
+                f.write("ALTER SEQUENCE public.legacy_clients_id_seq RESTART WITH 1;\n\n")
             
             f.write("-- Import all legacy client records\n")
             
@@ -78,18 +352,7 @@ def create_sql_migration():
                         # Write batch when we reach batch_size or end of file
                         if len(values) >= batch_size:
                             batch_count += 1
-                            
-                            f.write(f"-- Batch {batch_count} ({len(values)} records)\n")
-                            f.write("INSERT INTO public.legacy_clients (\n")
-                            f.write("    legacy_client_id, descricao, descricao_fantasia, endereco, numero, complemento,\n")
-                            f.write("    bairro, cidade, pais, uf, cep, telefone1, telefone2, telefone3, telefone4,\n")
-                            f.write("    email, email_contratos, pessoa, grupo1, grupo2, referencias, obs,\n")
-                            f.write("    documento1, documento2, documento3, ativo, id_usuario, id_usuario_ultimo,\n")
-                            f.write("    logo, logo_altura, logo_largura, auto_size\n")
-                            f.write(") VALUES\n")
-                            f.write(",\n".join(values))
-                            f.write(";\n\n")
-                            
+                            write_batch(f, f"Batch {batch_count}", values)
                             values = []  # Clear for next batch
                     
                     except Exception as e:
@@ -99,17 +362,13 @@ def create_sql_migration():
                 # Write final batch if there are remaining values
                 if values:
                     batch_count += 1
+                    write_batch(f, f"Final batch {batch_count}", values)
                     
-                    f.write(f"-- Final batch {batch_count} ({len(values)} records)\n")
-                    f.write("INSERT INTO public.legacy_clients (\n")
-                    f.write("    legacy_client_id, descricao, descricao_fantasia, endereco, numero, complemento,\n")
-                    f.write("    bairro, cidade, pais, uf, cep, telefone1, telefone2, telefone3, telefone4,\n")
-                    f.write("    email, email_contratos, pessoa, grupo1, grupo2, referencias, obs,\n")
-                    f.write("    documento1, documento2, documento3, ativo, id_usuario, id_usuario_ultimo,\n")
-                    f.write("    logo, logo_altura, logo_largura, auto_size\n")
-                    f.write(") VALUES\n")
-                    f.write(",\n".join(values))
-                    f.write(";\n\n")
+            if strategy == 'swap':
+                f.write(SWAP_DEDUPE_SQL)
+                f.write(carry_over_sql(skip_columns))
+                f.write(SWAP_CARRY_OVER_SQL)
+                f.write(SWAP_SQL)
             
             f.write("-- Verify import\n")
             f.write("SELECT COUNT(*) as total_imported FROM public.legacy_clients;\n")
@@ -124,12 +383,33 @@ def create_sql_migration():
         return None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create a Supabase SQL migration for legacy clients')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--output', help='migration file to write (default: delete rewrites '
+                        '20250825_import_all_legacy_clients.sql, swap writes a new <now>_reload_legacy_clients.sql)')
+    parser.add_argument('--strategy', choices=['delete', 'swap'], default='delete',
+                        help='delete: clear and re-insert in place; swap: load an UNLOGGED copy and swap it in')
+    parser.add_argument('--skip-columns', default='',
+                        help='swap: comma separated columns kept from the live table instead of the CSV '
+                             '(e.g. logo,logo_altura,logo_largura after ingest_legacy_logos.py)')
+    args = parser.parse_args()
+    skip_columns = {c.strip() for c in args.skip_columns.split(',') if c.strip()}
+    unknown = sorted(skip_columns - set(COLUMN_NAMES[1:]))
+    if unknown:
+        parser.error(f"unknown column(s) for --skip-columns: {', '.join(unknown)}")
+    if skip_columns and args.strategy != 'swap':
+        parser.error("--skip-columns only applies to --strategy swap")
+
     print("Creating Supabase SQL migration for legacy clients...")
-    migration_file = create_sql_migration()
+    migration_file = create_sql_migration(args.csv, args.output, args.strategy, skip_columns)
     
     if migration_file:
         print(f"\n🎯 Next step: Apply the migration using:")
-        print(f"npx supabase db reset --local")
-        print("This will apply all migrations including the new import.")
+        if args.strategy == 'swap':
+            print(f"npx supabase migration up --local")
+            print("This will apply the new reload migration to the running database.")
+        else:
+            print(f"npx supabase db reset --local")
+            print("This will apply all migrations including the new import.")
     else:
-        print("❌ Failed to create migration file")
\ No newline at end of file
+        print("❌ Failed to create migration file")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Pre-flight validation of the legacy clients CSV
+Checks the whole export against the legacy_clients column types and
+constraints in one column-wise pass, without touching the database, and
+prints per-rule counts with sample record numbers.
+
+Errors are values the importers would reject, silently drop or silently
+change (e.g. overflowing INTEGER, duplicate idCLIENTES swallowed by
+ON CONFLICT DO NOTHING, non-numeric ids turned into NULL). Warnings are
+values that load but are probably wrong (e.g. malformed EMAIL lists).
+Exits with status 1 when any error rule fires.
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+
+from legacy_clients_common import DEFAULT_CSV_FILE, LEGACY_CLIENT_COLUMNS
+
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+SAMPLE_SIZE = 10
+
+INTEGER_PATTERN = re.compile(r'^\s*[+-]?\d+\s*$')
+BOOLEAN_VALUES = {'T', 'F', 't', 'f'}
+EMAIL_SPLIT_PATTERN = re.compile(r'[\s,;/]+')
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+$')
+EMAIL_FIELDS = ('EMAIL', 'EMAILCONTRATOS')
+
+# rule -> (severity, description)
+RULES = {
+    'missing_header': ('error', 'expected CSV column is missing from the header'),
+    'field_count': ('error', 'record has a different number of fields than the header'),
+    'missing_id': ('error', 'idCLIENTES is empty (legacy_client_id is NOT NULL, row is skipped)'),
+    'duplicate_id': ('error', 'idCLIENTES appears more than once (later rows are dropped by ON CONFLICT)'),
+    'invalid_integer': ('error', 'integer column holds a non-numeric value (importers turn it into NULL)'),
+    'integer_out_of_range': ('error', 'value does not fit the Postgres INTEGER range'),
+    'invalid_boolean': ('error', 'boolean column is not T/F (importers turn it into false)'),
+    'nul_character': ('error', 'text contains a NUL character, which Postgres text cannot store'),
+    'malformed_email': ('warning', 'EMAIL/EMAILCONTRATOS entry is not an address'),
+    'multiple_emails': ('warning', 'EMAIL/EMAILCONTRATOS holds several addresses in one field')
+}
+
+
+class ValidationReport:
+    """Per-rule counts and sample record numbers"""
+
+    def __init__(self):
+        self.counts = {rule: 0 for rule in RULES}
+        self.samples = {rule: [] for rule in RULES}
+
+    def add(self, rule, record_number, detail):
+        self.counts[rule] += 1
+        if len(self.samples[rule]) < SAMPLE_SIZE:
+            self.samples[rule].append({'record': record_number, 'detail': detail})
+
+    def has_errors(self):
+        return any(self.counts[rule] for rule, (severity, _) in RULES.items() if severity == 'error')
+
+    def to_dict(self):
+        return {
+            rule: {
+                'severity': RULES[rule][0],
+                'description': RULES[rule][1],
+                'count': self.counts[rule],
+                'samples': self.samples[rule]
+            }
+            for rule in RULES
+            if self.counts[rule]
+        }
+
+
+def read_columns(csv_file_path, report):
+    """Read the CSV once into column lists; records with a bad field count are reported and left out"""
+    with open(csv_file_path, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        columns = {name: [] for name in header}
+        record_numbers = []
+        for record_number, record in enumerate(reader, start=1):
+            if len(record) != len(header):
+                report.add('field_count', record_number, f"{len(record)} fields, expected {len(header)}")
+                continue
+            record_numbers.append(record_number)
+            for name, value in zip(header, record):
+                columns[name].append(value)
+    return header, columns, record_numbers
+
+
+def check_integers(name, values, record_numbers, report):
+    for record_number, value in zip(record_numbers, values):
+        if not value.strip():
+            continue
+        if not INTEGER_PATTERN.match(value):
+            report.add('invalid_integer', record_number, f"{name}={value[:40]!r}")
+        elif not INT32_MIN <= int(value) <= INT32_MAX:
+            report.add('integer_out_of_range', record_number, f"{name}={value.strip()}")
+
+
+def check_booleans(name, values, record_numbers, report):
+    for record_number, value in zip(record_numbers, values):
+        if value.strip() and value.strip() not in BOOLEAN_VALUES:
+            report.add('invalid_boolean', record_number, f"{name}={value[:40]!r}")
+
+
+def check_texts(name, values, record_numbers, report):
+    for record_number, value in zip(record_numbers, values):
+        if '\x00' in value:
+            report.add('nul_character', record_number, name)
+
+
+def check_emails(name, values, record_numbers, report):
+    for record_number, value in zip(record_numbers, values):
+        parts = [part for part in EMAIL_SPLIT_PATTERN.split(value.strip()) if part]
+        if len(parts) > 1:
+            report.add('multiple_emails', record_number, f"{name}: {len(parts)} entries")
+        malformed = [part for part in parts if not EMAIL_PATTERN.match(part)]
+        if malformed:
+            report.add('malformed_email', record_number, f"{name}={value.strip()[:60]!r}")
+
+
+def check_ids(values, record_numbers, report):
+    first_seen = {}
+    for record_number, value in zip(record_numbers, values):
+        key = value.strip()
+        if not key:
+            report.add('missing_id', record_number, 'idCLIENTES empty')
+            continue
+        if key in first_seen:
+            report.add('duplicate_id', record_number, f"idCLIENTES={key} first at record {first_seen[key]}")
+        else:
+            first_seen[key] = record_number
+
+
+def validate_csv(csv_file_path):
+    """Run every rule over the CSV and return (report, record_count)"""
+    report = ValidationReport()
+    header, columns, record_numbers = read_columns(csv_file_path, report)
+
+    for field, column, kind in LEGACY_CLIENT_COLUMNS:
+        if field not in columns:
+            report.add('missing_header', 0, f"{field} ({column})")
+            continue
+        values = columns[field]
+        if kind == 'integer':
+            check_integers(field, values, record_numbers, report)
+        elif kind == 'boolean':
+            check_booleans(field, values, record_numbers, report)
+        else:
+            check_texts(field, values, record_numbers, report)
+        if field in EMAIL_FIELDS:
+            check_emails(field, values, record_numbers, report)
+
+    if 'idCLIENTES' in columns:
+        check_ids(columns['idCLIENTES'], record_numbers, report)
+
+    return report, len(record_numbers) + report.counts['field_count']
+
+
+def print_report(report, record_count, elapsed):
+    print(f"Validated {record_count} records in {elapsed:.2f}s\n")
+    findings = report.to_dict()
+    if not findings:
+        print("✅ No problems found")
+        return
+    for rule, finding in sorted(findings.items(), key=lambda item: (item[1]['severity'], item[0])):
+        icon = '❌' if finding['severity'] == 'error' else '⚠️ '
+        print(f"{icon} {rule}: {finding['count']} — {finding['description']}")
+        for sample in finding['samples']:
+            print(f"     record {sample['record']}: {sample['detail']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Validate the legacy clients CSV without touching the database')
+    parser.add_argument('--csv', default=DEFAULT_CSV_FILE, help='legacy clients CSV export')
+    parser.add_argument('--json', help='also write the report as JSON to this path')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report, record_count = validate_csv(args.csv)
+    print_report(report, record_count, time.perf_counter() - started)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({'records': record_count, 'rules': report.to_dict()}, output, indent=2)
+
+    sys.exit(1 if report.has_errors() else 0)
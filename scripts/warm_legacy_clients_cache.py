@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Warm the /admin/legacy-clients listing cache after an import
+Publishes a new legacy_clients_import_versions row and precomputes, as JSON
+snapshots under that version, the responses GET /api/admin/legacy-clients
+would build for: the first default listing pages, the first pages per
+initial letter and per top city, and the letter / city facet counts.
+Each family is one set-based INSERT ... SELECT with window functions.
+The route serves these until the next write to legacy_clients invalidates
+the version (see 20261018_110000_legacy_clients_listing_snapshots.sql).
+"""
+import argparse
+
+import psycopg2
+
+from legacy_clients_common import DB_CONNECTION
+
+KEEP_VERSIONS = 2
+
+# Keep in sync with the select list of src/app/api/admin/legacy-clients/route.ts
+LISTING_COLUMNS = """lc.id, lc.legacy_client_id, lc.descricao, lc.descricao_fantasia,
+               lc.cidade, lc.email, lc.telefone1, lc.ativo, lc.company_id"""
+
+# Initial letter, with names that do not start with A-Z (or are NULL) under '#';
+# matches public.legacy_clients_facet_counts() and the route's ?letter= filter
+LETTER_SQL = "CASE WHEN left(lc.descricao, 1) ~ '^[A-Za-z]$' THEN upper(left(lc.descricao, 1)) ELSE '#' END"
+TOP_CITIES_SQL = """lc.cidade IN (
+            SELECT cidade FROM public.legacy_clients
+            WHERE cidade IS NOT NULL
+            GROUP BY cidade
+            ORDER BY COUNT(*) DESC, cidade
+            LIMIT %(top_cities)s
+        )"""
+
+# One snapshot per (facet value, page); cache keys mirror snapshotKey() in the route
+PAGE_SNAPSHOTS_SQL = """
+    INSERT INTO public.legacy_clients_listing_snapshots (version, cache_key, payload)
+    SELECT %(version)s,
+           {key_prefix} || 'page:' || r.page || ':limit:' || %(limit)s,
+           jsonb_build_object(
+               'data', jsonb_agg(to_jsonb(r) - 'facet' - 'page' - 'total' ORDER BY r.legacy_client_id),
+               'count', MAX(r.total),
+               'page', r.page,
+               'limit', %(limit)s
+           )
+    FROM (
+        SELECT {columns},
+               {facet} AS facet,
+               (row_number() OVER (PARTITION BY {facet} ORDER BY lc.legacy_client_id) - 1) / %(limit)s + 1 AS page,
+               COUNT(*) OVER (PARTITION BY {facet}) AS total
+        FROM public.legacy_clients AS lc
+        WHERE {where}
+    ) AS r
+    WHERE r.page <= %(pages)s
+    GROUP BY r.facet, r.page
+"""
+
+PAGE_FAMILIES = {
+    'listing': {'key_prefix': "''", 'facet': "''", 'where': 'TRUE', 'pages': 'pages'},
+    'letter': {'key_prefix': "'letter:' || r.facet || ':'", 'facet': LETTER_SQL,
+               'where': 'TRUE', 'pages': 'facet_pages'},
+    'city': {'key_prefix': "'city:' || r.facet || ':'", 'facet': 'lc.cidade',
+             'where': TOP_CITIES_SQL, 'pages': 'facet_pages'}
+}
+
+# Same function the route falls back to, so cached and live counts agree
+FACET_COUNTS_SQL = """
+    INSERT INTO public.legacy_clients_listing_snapshots (version, cache_key, payload)
+    VALUES (%(version)s, 'facets:' || %(facet)s,
+            jsonb_build_object('facets', public.legacy_clients_facet_counts(%(facet)s)))
+"""
+
+FACETS = ('letters', 'cities')
+
+
+def warm_listing_cache(source_sha256=None, pages=5, limit=100, facet_pages=1, top_cities=50):
+    """Publish a new import version with its listing snapshots; returns (version, snapshot_count) or None"""
+
+    try:
+        conn = psycopg2.connect(**DB_CONNECTION)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+    cursor = conn.cursor()
+    params = {'limit': limit, 'pages': pages, 'facet_pages': facet_pages, 'top_cities': top_cities}
+    try:
+        cursor.execute(
+            "INSERT INTO public.legacy_clients_import_versions (source_sha256, row_count) "
+            "SELECT %s, COUNT(*) FROM public.legacy_clients RETURNING version, row_count",
+            (source_sha256,)
+        )
+        version, row_count = cursor.fetchone()
+        params['version'] = version
+
+        counts = {}
+        for family, parts in PAGE_FAMILIES.items():
+            sql = PAGE_SNAPSHOTS_SQL.format(columns=LISTING_COLUMNS, key_prefix=parts['key_prefix'],
+                                            facet=parts['facet'], where=parts['where'])
+            cursor.execute(sql, dict(params, pages=params[parts['pages']]))
+            counts[family] = cursor.rowcount
+        for facet in FACETS:
+            cursor.execute(FACET_COUNTS_SQL, dict(params, facet=facet))
+            counts[f'facets:{facet}'] = cursor.rowcount
+
+        cursor.execute(
+            "DELETE FROM public.legacy_clients_import_versions WHERE version <= %s",
+            (version - KEEP_VERSIONS,)
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error warming the listing cache, nothing was published: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+    snapshot_count = sum(counts.values())
+    print(f"\n=== Listing Cache Summary ===")
+    print(f"🏷️  Version: {version} ({row_count} legacy clients)")
+    print(f"📄 Listing pages: {counts['listing']} (limit {limit})")
+    print(f"🔤 Letter pages: {counts['letter']}")
+    print(f"🏙️  City pages: {counts['city']} (top {top_cities} cities)")
+    print(f"📊 Facet snapshots: {counts['facets:letters'] + counts['facets:cities']}")
+    return version, snapshot_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute the admin legacy clients listing after an import')
+    parser.add_argument('--pages', type=int, default=5, help='default listing pages to precompute')
+    parser.add_argument('--limit', type=int, default=100, help='page size (the route default is 100)')
+    parser.add_argument('--facet-pages', type=int, default=1, help='pages per letter and per city')
+    parser.add_argument('--top-cities', type=int, default=50, help='cities that get precomputed pages')
+    parser.add_argument('--source-sha256', help='hash of the imported CSV, recorded with the version')
+    args = parser.parse_args()
+
+    if warm_listing_cache(args.source_sha256, args.pages, args.limit, args.facet_pages, args.top_cities):
+        print("🎉 Listing cache warmed successfully!")
+    else:
+        print("💥 Warming the listing cache failed!")
@@ -7,6 +7,65 @@ const supabase = createClient(
   process.env.SUPABASE_SERVICE_ROLE_KEY!
 );
 
+// Keep in sync with LISTING_COLUMNS in scripts/warm_legacy_clients_cache.py
+const LISTING_COLUMNS = `
+  id,
+  legacy_client_id,
+  descricao,
+  descricao_fantasia,
+  cidade,
+  email,
+  telefone1,
+  ativo,
+  company_id
+`;
+
+type FacetName = 'letters' | 'cities';
+
+interface ListingParams {
+  page: number;
+  limit: number;
+  letter: string;
+  city: string;
+}
+
+// Mirrors the cache keys written by scripts/warm_legacy_clients_cache.py,
+// which warms letter and city pages separately, never combined
+function snapshotKey({ page, limit, letter, city }: ListingParams): string {
+  const prefix = letter ? `letter:${letter}:` : city ? `city:${city}:` : '';
+  return `${prefix}page:${page}:limit:${limit}`;
+}
+
+/**
+ * Read a precomputed response of the current import version.
+ * Returns null when nothing was warmed for this key or a write to
+ * legacy_clients has invalidated the version since the last import.
+ */
+async function readSnapshot(cacheKey: string) {
+  const { data, error } = await supabase
+    .from('legacy_clients_current_snapshots')
+    .select('version, payload')
+    .eq('cache_key', cacheKey)
+    .maybeSingle();
+
+  if (error) {
+    console.warn('Legacy clients snapshot lookup failed, querying live:', error.message);
+    return null;
+  }
+  return data;
+}
+
+// Counted in SQL (public.legacy_clients_facet_counts) so the counts cover
+// every row, not just the first max_rows PostgREST would return
+async function countFacets(facet: FacetName) {
+  const { data, error } = await supabase.rpc('legacy_clients_facet_counts', { p_facet: facet });
+
+  if (error) {
+    return { error };
+  }
+  return { facets: (data || []) as { value: string; count: number }[] };
+}
+
 export async function GET(request: NextRequest) {
   try {
     // Get legacy clients with pagination support
@@ -14,26 +73,62 @@ export async function GET(request: NextRequest) {
     const page = parseInt(searchParams.get('page') || '1');
     const limit = parseInt(searchParams.get('limit') || '100');
     const search = searchParams.get('search') || '';
-    
+    const letter = (searchParams.get('letter') || '').toUpperCase();
+    const city = searchParams.get('city') || '';
+    const facets = searchParams.get('facets');
+
+    // One letter A-Z, or '#' for names starting with anything else (as in the letter facet)
+    if (letter && !/^[A-Z#]$/.test(letter)) {
+      return NextResponse.json(
+        { error: 'Invalid letter filter, expected A-Z or #' },
+        { status: 400 }
+      );
+    }
+
+    // Letter / city facet counts
+    if (facets === 'letters' || facets === 'cities') {
+      const snapshot = await readSnapshot(`facets:${facets}`);
+      if (snapshot) {
+        return NextResponse.json({ ...snapshot.payload, version: snapshot.version, cached: true });
+      }
+
+      const { facets: counted, error } = await countFacets(facets);
+      if (error) {
+        console.error('Error counting legacy client facets:', error);
+        return NextResponse.json(
+          { error: 'Failed to count legacy client facets', details: error.message },
+          { status: 500 }
+        );
+      }
+      return NextResponse.json({ facets: counted, cached: false });
+    }
+
+    // Listings without free-text search, filtered by at most one of letter / city,
+    // are precomputed after each import; letter + city together always go live
+    if (!search && !(letter && city)) {
+      const snapshot = await readSnapshot(snapshotKey({ page, limit, letter, city }));
+      if (snapshot) {
+        return NextResponse.json({ ...snapshot.payload, version: snapshot.version, cached: true });
+      }
+    }
+
     let query = supabase
       .from('legacy_clients')
-      .select(`
-        id,
-        legacy_client_id,
-        descricao,
-        descricao_fantasia,
-        cidade,
-        email,
-        telefone1,
-        ativo,
-        company_id
-      `)
+      .select(LISTING_COLUMNS, { count: 'exact' })
       .order('legacy_client_id');
 
     // Add search filter if provided
     if (search) {
       query = query.or(`descricao.ilike.%${search}%,cidade.ilike.%${search}%,email.ilike.%${search}%`);
     }
+    if (letter === '#') {
+      query = query.or('descricao.is.null,descricao.not.imatch.^[a-z]');
+    } else if (letter) {
+      query = query.ilike('descricao', `${letter}%`);
+    }
+    if (city) {
+      query = query.eq('cidade', city);
+    }
 
     // Add pagination
     const from = (page - 1) * limit;
@@ -54,7 +149,8 @@ export async function GET(request: NextRequest) {
       data: data || [],
       count,
       page,
-      limit
+      limit,
+      cached: false
     });
 
   } catch (error) {
@@ -64,4 +160,4 @@ export async function GET(request: NextRequest) {
       { status: 500 }
     );
   }
-}
\ No newline at end of file
+}
@@ -0,0 +1,16 @@
+-- Add offline geocoding results to legacy_clients
+-- Filled by scripts/geocode_legacy_clients.py from a local CEP table / gazetteer,
+-- so trip planning can place legacy clients without per-request Maps calls
+
+ALTER TABLE public.legacy_clients ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+ALTER TABLE public.legacy_clients ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+ALTER TABLE public.legacy_clients ADD COLUMN IF NOT EXISTS geo_precision TEXT
+    CHECK (geo_precision IN ('cep', 'city', 'state'));
+ALTER TABLE public.legacy_clients ADD COLUMN IF NOT EXISTS geocoded_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_legacy_clients_geo_precision ON public.legacy_clients(geo_precision) WHERE geo_precision IS NOT NULL;
+
+COMMENT ON COLUMN public.legacy_clients.latitude IS 'Latitude resolved offline from CEP prefix, city+UF or state fallback';
+COMMENT ON COLUMN public.legacy_clients.longitude IS 'Longitude resolved offline from CEP prefix, city+UF or state fallback';
+COMMENT ON COLUMN public.legacy_clients.geo_precision IS 'How the coordinates were resolved: cep (postal code prefix), city (city + UF), state (coffee region / UF centroid)';
+COMMENT ON COLUMN public.legacy_clients.geocoded_at IS 'Timestamp when coordinates were last resolved';
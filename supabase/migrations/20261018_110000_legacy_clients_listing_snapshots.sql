@@ -0,0 +1,76 @@
+-- Precomputed /admin/legacy-clients listing snapshots
+-- scripts/warm_legacy_clients_cache.py publishes a new version after each import;
+-- GET /api/admin/legacy-clients serves matching requests from the current version
+-- and any write to legacy_clients invalidates it until the next warm-up
+
+CREATE TABLE IF NOT EXISTS public.legacy_clients_import_versions (
+    version BIGSERIAL PRIMARY KEY,
+    source_sha256 TEXT,
+    row_count INTEGER NOT NULL,
+    published_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    invalidated_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS public.legacy_clients_listing_snapshots (
+    version BIGINT NOT NULL REFERENCES public.legacy_clients_import_versions(version) ON DELETE CASCADE,
+    cache_key TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    PRIMARY KEY (version, cache_key)
+);
+
+-- Snapshots of the newest version that no write has invalidated yet
+CREATE OR REPLACE VIEW public.legacy_clients_current_snapshots AS
+SELECT s.version, s.cache_key, s.payload
+FROM public.legacy_clients_listing_snapshots s
+JOIN (
+    SELECT version
+    FROM public.legacy_clients_import_versions
+    WHERE invalidated_at IS NULL
+    ORDER BY version DESC
+    LIMIT 1
+) current_version USING (version);
+
+-- Letter / city facet counts as the route returns them: one JSON array, so
+-- PostgREST's max_rows never truncates it. Letters group names that do not
+-- start with A-Z (and NULL names) under '#'; cities skip NULL.
+CREATE OR REPLACE FUNCTION public.legacy_clients_facet_counts(p_facet TEXT)
+RETURNS JSONB AS $$
+    SELECT COALESCE(
+        jsonb_agg(jsonb_build_object('value', f.value, 'count', f.count)
+                  ORDER BY CASE WHEN p_facet = 'cities' THEN f.count END DESC, f.value),
+        '[]'::jsonb
+    )
+    FROM (
+        SELECT CASE p_facet
+                   WHEN 'letters' THEN CASE WHEN left(lc.descricao, 1) ~ '^[A-Za-z]$'
+                                            THEN upper(left(lc.descricao, 1)) ELSE '#' END
+                   WHEN 'cities' THEN lc.cidade
+               END AS value,
+               COUNT(*) AS count
+        FROM public.legacy_clients AS lc
+        GROUP BY 1
+    ) AS f
+    WHERE f.value IS NOT NULL;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION public.invalidate_legacy_clients_snapshots()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE public.legacy_clients_import_versions
+    SET invalidated_at = NOW()
+    WHERE invalidated_at IS NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level, so a bulk load pays for one small UPDATE per statement, not per row
+DROP TRIGGER IF EXISTS legacy_clients_invalidate_snapshots ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_invalidate_snapshots
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.legacy_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION public.invalidate_legacy_clients_snapshots();
+
+COMMENT ON TABLE public.legacy_clients_import_versions IS 'One row per published legacy clients listing cache version';
+COMMENT ON COLUMN public.legacy_clients_import_versions.invalidated_at IS 'Set by the legacy_clients write trigger; snapshots of an invalidated version are no longer served';
+COMMENT ON TABLE public.legacy_clients_listing_snapshots IS 'Precomputed JSON responses of GET /api/admin/legacy-clients, keyed by import version and request';
+COMMENT ON FUNCTION public.legacy_clients_facet_counts(TEXT) IS 'Letter or city facet counts of GET /api/admin/legacy-clients?facets=; also used to warm the facet snapshots';
+COMMENT ON VIEW public.legacy_clients_current_snapshots IS 'Listing snapshots of the current (newest, not invalidated) import version';
@@ -0,0 +1,89 @@
+-- Materialized companies_with_legacy
+-- A table with the rows of the companies_with_legacy view, for listings that should
+-- not repeat the companies / legacy_clients join on every read. Statement-level
+-- triggers queue the ids of companies whose row may have changed in
+-- companies_with_legacy_delta; scripts/refresh_companies_with_legacy.py rewrites
+-- just those rows, or diffs the whole table when the queue is large, or rebuilds
+-- it when the view's columns no longer match (the view is c.* plus legacy columns)
+
+CREATE TABLE IF NOT EXISTS public.companies_with_legacy_materialized AS
+SELECT * FROM public.companies_with_legacy;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_companies_with_legacy_materialized_id
+    ON public.companies_with_legacy_materialized(id);
+CREATE INDEX IF NOT EXISTS idx_companies_with_legacy_materialized_legacy_client_id
+    ON public.companies_with_legacy_materialized(legacy_client_id);
+CREATE INDEX IF NOT EXISTS idx_companies_with_legacy_materialized_name
+    ON public.companies_with_legacy_materialized(name);
+
+CREATE TABLE IF NOT EXISTS public.companies_with_legacy_delta (
+    company_id UUID PRIMARY KEY,
+    queued_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Transition tables are only available to single-event triggers, so each event
+-- gets its own trigger; new_rows / old_rows exist only for the events that have them
+CREATE OR REPLACE FUNCTION public.queue_companies_with_legacy_delta()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'companies' THEN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO public.companies_with_legacy_delta (company_id)
+            SELECT id FROM new_rows
+            ON CONFLICT (company_id) DO NOTHING;
+        END IF;
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO public.companies_with_legacy_delta (company_id)
+            SELECT id FROM old_rows
+            ON CONFLICT (company_id) DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    -- legacy_clients: the companies pointing at a changed row, either way round
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO public.companies_with_legacy_delta (company_id)
+        SELECT company_id FROM new_rows WHERE company_id IS NOT NULL
+        UNION
+        SELECT c.id FROM public.companies AS c JOIN new_rows AS r USING (legacy_client_id)
+        ON CONFLICT (company_id) DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO public.companies_with_legacy_delta (company_id)
+        SELECT company_id FROM old_rows WHERE company_id IS NOT NULL
+        UNION
+        SELECT c.id FROM public.companies AS c JOIN old_rows AS r USING (legacy_client_id)
+        ON CONFLICT (company_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS companies_queue_delta_insert ON public.companies;
+CREATE TRIGGER companies_queue_delta_insert
+    AFTER INSERT ON public.companies REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+DROP TRIGGER IF EXISTS companies_queue_delta_update ON public.companies;
+CREATE TRIGGER companies_queue_delta_update
+    AFTER UPDATE ON public.companies REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+DROP TRIGGER IF EXISTS companies_queue_delta_delete ON public.companies;
+CREATE TRIGGER companies_queue_delta_delete
+    AFTER DELETE ON public.companies REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+
+DROP TRIGGER IF EXISTS legacy_clients_queue_delta_insert ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_queue_delta_insert
+    AFTER INSERT ON public.legacy_clients REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+DROP TRIGGER IF EXISTS legacy_clients_queue_delta_update ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_queue_delta_update
+    AFTER UPDATE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+DROP TRIGGER IF EXISTS legacy_clients_queue_delta_delete ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_queue_delta_delete
+    AFTER DELETE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.queue_companies_with_legacy_delta();
+
+COMMENT ON TABLE public.companies_with_legacy_materialized IS 'Materialized rows of companies_with_legacy, kept current by scripts/refresh_companies_with_legacy.py';
+COMMENT ON TABLE public.companies_with_legacy_delta IS 'Companies whose companies_with_legacy_materialized row may be stale, queued by triggers on companies and legacy_clients';
@@ -0,0 +1,111 @@
+-- Normalized contact reverse lookup for legacy clients
+-- scripts/legacy_clients_contacts.py splits EMAIL / EMAILCONTRATOS and TELEFONE1..4
+-- into one row per lowercased email, email domain and E.164 phone number, so
+-- resolving an incoming sender or caller is one probe of the primary key instead
+-- of ilike scans. The table is rebuilt in bulk after every import, so it has no
+-- foreign key to legacy_clients (which the swap import drops and recreates)
+
+CREATE TABLE IF NOT EXISTS public.legacy_client_contacts (
+    kind TEXT NOT NULL CHECK (kind IN ('email', 'domain', 'phone')),
+    value TEXT NOT NULL,
+    legacy_client_id INTEGER NOT NULL,
+    source_column TEXT NOT NULL,
+    PRIMARY KEY (kind, value, legacy_client_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_legacy_client_contacts_legacy_client_id
+    ON public.legacy_client_contacts(legacy_client_id);
+
+-- SQL twins of normalize_phone() and normalize_emails() in
+-- scripts/legacy_clients_contacts.py; keep them in sync so a lookup normalizes
+-- its input exactly as the loader normalized the stored values.
+-- Phone: E.164, or NULL when the number cannot be read reliably. Brazilian
+-- numbers need a known area code and 10 / 11 national digits; pre-2016 8 digit
+-- mobiles (6-9) get their leading 9; + or 00 with another country code keeps
+-- 7 to 15 digits ('(35) 3212-6334' and '0055 35 3212 6334' -> '+553532126334')
+CREATE OR REPLACE FUNCTION public.normalize_legacy_client_phone(p_value TEXT)
+RETURNS TEXT AS $$
+DECLARE
+    raw TEXT := btrim(p_value);
+    digits TEXT := regexp_replace(p_value, '\D', '', 'g');
+    area_code TEXT;
+    subscriber TEXT;
+BEGIN
+    IF raw IS NULL OR raw = '' THEN
+        RETURN NULL;
+    END IF;
+    IF raw LIKE '+%' OR raw LIKE '00%' THEN
+        IF raw LIKE '00%' THEN
+            digits := substr(digits, 3);
+        END IF;
+        IF digits NOT LIKE '55%' THEN
+            RETURN CASE WHEN length(digits) BETWEEN 7 AND 15 THEN '+' || digits END;
+        END IF;
+        digits := substr(digits, 3);
+    ELSE
+        digits := ltrim(digits, '0');
+    END IF;
+
+    -- a lookup has no client to borrow an area code from
+    IF length(digits) IN (8, 9) THEN
+        RETURN NULL;
+    END IF;
+    area_code := left(digits, 2);
+    subscriber := substr(digits, 3);
+    IF area_code <> ALL (ARRAY[
+        '11', '12', '13', '14', '15', '16', '17', '18', '19',
+        '21', '22', '24', '27', '28', '31', '32', '33', '34',
+        '35', '37', '38', '41', '42', '43', '44', '45', '46',
+        '47', '48', '49', '51', '53', '54', '55', '61', '62',
+        '63', '64', '65', '66', '67', '68', '69', '71', '73',
+        '74', '75', '77', '79', '81', '82', '83', '84', '85',
+        '86', '87', '88', '89', '91', '92', '93', '94', '95',
+        '96', '97', '98', '99'
+    ]) THEN
+        RETURN NULL;
+    END IF;
+    IF length(subscriber) = 8 AND left(subscriber, 1) IN ('6', '7', '8', '9') THEN
+        subscriber := '9' || subscriber;
+    END IF;
+    IF length(subscriber) = 9 AND left(subscriber, 1) <> '9' THEN
+        RETURN NULL;
+    END IF;
+    IF length(subscriber) NOT IN (8, 9) OR left(subscriber, 1) IN ('0', '1') THEN
+        RETURN NULL;
+    END IF;
+    RETURN '+55' || area_code || subscriber;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Email: the first address found in the text, lowercased (the whole trimmed
+-- text when none is found, as find_legacy_clients() does)
+CREATE OR REPLACE FUNCTION public.normalize_legacy_client_email(p_value TEXT)
+RETURNS TEXT AS $$
+    SELECT COALESCE(
+        btrim(substring(lower(p_value) FROM '[a-z0-9._%+''-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}\y'), '.'),
+        lower(btrim(p_value))
+    );
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Lookup helper: normalizes the value like the Python loader does, so
+-- '0055 35 3212 6334', '(35) 3212-6334' and '+553532126334' find the same rows
+CREATE OR REPLACE FUNCTION public.lookup_legacy_client_contact(p_kind TEXT, p_value TEXT)
+RETURNS TABLE (legacy_client_id INTEGER, descricao TEXT, source_column TEXT) AS $$
+    WITH normalized AS (
+        SELECT CASE p_kind
+            WHEN 'email' THEN public.normalize_legacy_client_email(p_value)
+            WHEN 'domain' THEN regexp_replace(lower(btrim(p_value)), '^(@|www\.)', '')
+            WHEN 'phone' THEN public.normalize_legacy_client_phone(p_value)
+        END AS value
+    )
+    SELECT c.legacy_client_id, lc.descricao, c.source_column
+    FROM normalized AS n
+    JOIN public.legacy_client_contacts AS c ON c.kind = p_kind AND c.value = n.value
+    LEFT JOIN public.legacy_clients AS lc ON lc.legacy_client_id = c.legacy_client_id
+    ORDER BY c.legacy_client_id;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON TABLE public.legacy_client_contacts IS 'Normalized emails, email domains and E.164 phones of legacy clients, rebuilt by scripts/legacy_clients_contacts.py';
+COMMENT ON FUNCTION public.lookup_legacy_client_contact(TEXT, TEXT) IS 'Legacy clients with this email, domain or phone (one primary key probe)';
+COMMENT ON FUNCTION public.normalize_legacy_client_phone(TEXT) IS 'E.164 form of a phone as scripts/legacy_clients_contacts.py normalize_phone() stores it, or NULL';
+COMMENT ON FUNCTION public.normalize_legacy_client_email(TEXT) IS 'First lowercased address in the text, as scripts/legacy_clients_contacts.py normalize_emails() stores it';
@@ -0,0 +1,34 @@
+-- Import run history
+-- One row per legacy clients import (scripts/direct_psql_import.py and
+-- scripts/import_pipeline.py record themselves unless --no-history is given):
+-- what was imported, how, what came out and how long each stage took.
+-- scripts/import_run_history.py report compares a run with the trailing median
+-- of earlier runs of the same backend and configuration
+
+CREATE TABLE IF NOT EXISTS public.import_runs (
+    id BIGSERIAL PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    backend TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('succeeded', 'failed')),
+    input_file TEXT,
+    input_sha256 TEXT,
+    config JSONB NOT NULL DEFAULT '{}'::jsonb,
+    rows_read INTEGER NOT NULL DEFAULT 0,
+    rows_imported INTEGER NOT NULL DEFAULT 0,
+    rows_updated INTEGER NOT NULL DEFAULT 0,
+    rows_skipped INTEGER NOT NULL DEFAULT 0,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+    stage_seconds JSONB NOT NULL DEFAULT '{}'::jsonb,
+    duration_seconds NUMERIC(12, 3) NOT NULL,
+    rows_per_second NUMERIC(14, 1),
+    host TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_import_runs_backend_started_at
+    ON public.import_runs(backend, started_at DESC);
+
+COMMENT ON TABLE public.import_runs IS 'History of legacy clients imports: counts, per-stage durations and throughput, see scripts/import_run_history.py';
+COMMENT ON COLUMN public.import_runs.rows_read IS 'Input rows the run read, including skipped and rejected ones';
+COMMENT ON COLUMN public.import_runs.rows_per_second IS 'rows_read / duration_seconds; NULL when the rows were not read in this run (cached pipeline parse)';
@@ -0,0 +1,184 @@
+-- Row-level change feed for legacy clients
+-- Statement-level triggers append one row per inserted, updated, deactivated or
+-- deleted legacy client to public.legacy_client_changes, in a single increasing
+-- seq. Downstream jobs keep their position in legacy_client_change_cursors and
+-- read only what changed since (scripts/legacy_client_changes.py, or the
+-- read_legacy_client_changes / ack_legacy_client_changes functions over RPC).
+--
+-- Writers take a transaction-scoped advisory lock, so seq order is commit
+-- order: a consumer that has read up to seq N never finds a change below N
+-- committed later. The lock is taken by a BEFORE STATEMENT trigger, ahead of
+-- the statement's row locks, and held until commit. Every transaction writing
+-- legacy_clients, app writes included (admin linking, apply_client_matches.py),
+-- therefore serializes with imports from its first write to legacy_clients:
+-- keep such transactions short, and do not lock legacy_clients rows
+-- (SELECT ... FOR UPDATE) before the first write, or the lock order inverts.
+-- Imports are one transaction per batch.
+--
+-- Updates that change nothing but updated_at / created_at are not recorded (the
+-- merge import already skips unchanged rows). An update that changes
+-- legacy_client_id is recorded as a delete of the old id followed by the update
+-- (the swap, which matches rows on legacy_client_id, records a delete and an
+-- insert). The swap import replaces the table
+-- without firing these triggers and records the diff itself; TRUNCATE records a
+-- single 'truncate' row (legacy_client_id NULL) after which consumers must resync.
+
+CREATE TABLE IF NOT EXISTS public.legacy_client_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    legacy_client_id INTEGER,
+    operation TEXT NOT NULL CHECK (operation IN ('insert', 'update', 'deactivate', 'delete', 'truncate')),
+    changed_columns TEXT[],
+    row_data JSONB,
+    source TEXT,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_legacy_client_changes_legacy_client_id
+    ON public.legacy_client_changes(legacy_client_id, seq);
+
+CREATE TABLE IF NOT EXISTS public.legacy_client_change_cursors (
+    consumer TEXT PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Columns whose value differs between two row images (bookkeeping columns ignored);
+-- NULL for inserts and deletes
+CREATE OR REPLACE FUNCTION public.legacy_client_changed_columns(p_old JSONB, p_new JSONB)
+RETURNS TEXT[] AS $$
+    SELECT CASE WHEN p_old IS NULL OR p_new IS NULL THEN NULL ELSE COALESCE(ARRAY(
+        SELECT n.key
+        FROM jsonb_each(p_new) AS n
+        WHERE n.key NOT IN ('updated_at', 'created_at')
+          AND n.value IS DISTINCT FROM p_old -> n.key
+        ORDER BY n.key
+    ), '{}') END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION public.legacy_client_change_operation(p_old JSONB, p_new JSONB)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN p_old IS NULL THEN 'insert'
+        WHEN p_new IS NULL THEN 'delete'
+        WHEN (p_old ->> 'ativo')::BOOLEAN IS TRUE AND (p_new ->> 'ativo')::BOOLEAN IS NOT TRUE THEN 'deactivate'
+        ELSE 'update'
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION public.legacy_client_change_source()
+RETURNS TEXT AS $$
+    SELECT COALESCE(
+        NULLIF(current_setting('legacy_clients.change_source', true), ''),
+        NULLIF(current_setting('application_name', true), ''),
+        current_user
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Transition tables are only available to single-event triggers, so each event
+-- gets its own trigger (as for companies_with_legacy_delta)
+CREATE OR REPLACE FUNCTION public.record_legacy_client_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- the feed lock is already held, taken by legacy_clients_lock_changes
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.legacy_client_changes (legacy_client_id, operation, row_data, source)
+        SELECT n.legacy_client_id, 'insert', to_jsonb(n), public.legacy_client_change_source()
+        FROM new_rows AS n
+        ORDER BY n.legacy_client_id;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- A row whose legacy_client_id changes is first recorded as a delete of the old
+        -- id, so consumers keyed on the id drop what they derived from it; every such
+        -- delete comes before the updates, as when two rows swap ids
+        INSERT INTO public.legacy_client_changes (legacy_client_id, operation, changed_columns, row_data, source)
+        SELECT changes.legacy_client_id, changes.operation, changes.changed_columns, changes.row_data,
+               public.legacy_client_change_source()
+        FROM (
+            SELECT 0 AS pass, o.legacy_client_id, 'delete' AS operation, NULL::TEXT[] AS changed_columns,
+                   to_jsonb(o) AS row_data
+            FROM new_rows AS n
+            JOIN old_rows AS o ON o.id = n.id
+            WHERE o.legacy_client_id IS DISTINCT FROM n.legacy_client_id
+            UNION ALL
+            SELECT 1, n.legacy_client_id,
+                   public.legacy_client_change_operation(images.old_row, images.new_row),
+                   diff.changed_columns,
+                   images.new_row
+            FROM new_rows AS n
+            JOIN old_rows AS o ON o.id = n.id
+            CROSS JOIN LATERAL (SELECT to_jsonb(o) AS old_row, to_jsonb(n) AS new_row) AS images
+            CROSS JOIN LATERAL (
+                SELECT public.legacy_client_changed_columns(images.old_row, images.new_row) AS changed_columns
+            ) AS diff
+            WHERE cardinality(diff.changed_columns) > 0
+        ) AS changes
+        ORDER BY changes.pass, changes.legacy_client_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO public.legacy_client_changes (legacy_client_id, operation, row_data, source)
+        SELECT o.legacy_client_id, 'delete', to_jsonb(o), public.legacy_client_change_source()
+        FROM old_rows AS o
+        ORDER BY o.legacy_client_id;
+    ELSE
+        INSERT INTO public.legacy_client_changes (operation, source)
+        VALUES ('truncate', public.legacy_client_change_source());
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Serialize writers on the feed before the statement takes any row lock
+CREATE OR REPLACE FUNCTION public.lock_legacy_client_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('public.legacy_client_changes'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS legacy_clients_lock_changes ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_lock_changes
+    BEFORE INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.legacy_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION public.lock_legacy_client_changes();
+DROP TRIGGER IF EXISTS legacy_clients_record_changes_insert ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_record_changes_insert
+    AFTER INSERT ON public.legacy_clients REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+DROP TRIGGER IF EXISTS legacy_clients_record_changes_update ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_record_changes_update
+    AFTER UPDATE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+DROP TRIGGER IF EXISTS legacy_clients_record_changes_delete ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_record_changes_delete
+    AFTER DELETE ON public.legacy_clients REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+DROP TRIGGER IF EXISTS legacy_clients_record_changes_truncate ON public.legacy_clients;
+CREATE TRIGGER legacy_clients_record_changes_truncate
+    AFTER TRUNCATE ON public.legacy_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION public.record_legacy_client_changes();
+
+-- Consumer API: changes after the consumer's cursor, oldest first
+CREATE OR REPLACE FUNCTION public.read_legacy_client_changes(p_consumer TEXT, p_limit INTEGER DEFAULT 1000)
+RETURNS SETOF public.legacy_client_changes AS $$
+    SELECT ch.*
+    FROM public.legacy_client_changes AS ch
+    WHERE ch.seq > COALESCE(
+        (SELECT c.last_seq FROM public.legacy_client_change_cursors AS c WHERE c.consumer = p_consumer), 0
+    )
+    ORDER BY ch.seq
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Move a consumer's cursor forward (never back); returns the stored position
+CREATE OR REPLACE FUNCTION public.ack_legacy_client_changes(p_consumer TEXT, p_seq BIGINT)
+RETURNS BIGINT AS $$
+    INSERT INTO public.legacy_client_change_cursors AS c (consumer, last_seq)
+    VALUES (p_consumer, p_seq)
+    ON CONFLICT (consumer) DO UPDATE
+        SET last_seq = GREATEST(c.last_seq, EXCLUDED.last_seq),
+            updated_at = NOW()
+    RETURNING last_seq;
+$$ LANGUAGE sql;
+
+COMMENT ON TABLE public.legacy_client_changes IS 'Ordered row-level changes of legacy_clients (insert, update, deactivate, delete, truncate), see scripts/legacy_client_changes.py';
+COMMENT ON TABLE public.legacy_client_change_cursors IS 'Last legacy_client_changes.seq each downstream consumer has processed';
+COMMENT ON FUNCTION public.read_legacy_client_changes(TEXT, INTEGER) IS 'Changes after the consumer''s cursor, oldest first';
+COMMENT ON FUNCTION public.ack_legacy_client_changes(TEXT, BIGINT) IS 'Advance a consumer''s cursor to seq (never backwards)';
@@ -0,0 +1,7 @@
+-- Record the logo thumbnails next to the original
+-- Filled by scripts/ingest_legacy_logos.py, which stores the original and one PNG
+-- per thumbnail size in the documents bucket and writes the paths back here
+
+ALTER TABLE public.legacy_clients ADD COLUMN IF NOT EXISTS logo_thumbnails JSONB;
+
+COMMENT ON COLUMN public.legacy_clients.logo_thumbnails IS 'Storage paths of the logo thumbnails by bounding box size in pixels, e.g. {"64": "legacy-logos/ab/<hash>/thumb_64.png"}';